@@ -0,0 +1,253 @@
+"""
+Offline end-to-end benchmark of POST /audio-recording.
+
+Starts the fake OpenAI and Google Calendar servers of benchmarks/fake_servers.py, runs the app
+with uvicorn against them in headless Chromium (or against the fake Calendar REST API with
+--calendar-backend api), then posts a sample recording at increasing
+concurrency levels. Reports the throughput and p50/p95/p99 of each pipeline stage, read from
+the Server-Timing header of every response.
+
+Usage:
+    python3 -m benchmarks.end_to_end --levels 1,2,4,8 --requests 16
+    python3 -m benchmarks.end_to_end --extraction rules --output results.json
+    python3 -m benchmarks.end_to_end --calendar-backend api
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import subprocess
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fake_servers import (
+    FakeCalendarApiHandler,
+    FakeCalendarHandler,
+    FakeOpenAIHandler,
+    start_server,
+)
+
+DEFAULT_AUDIO = os.path.join(ROOT_DIR, "benchmarks", "fixtures", "sample_recording.webm")
+STARTUP_TIMEOUT_SECONDS = 120
+
+
+def percentile(values: list, ratio: float):
+    if not values:
+        return None
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(ratio * len(values)))]
+
+
+def parse_server_timing(header: str):
+    # "transcription;dur=812.3, extraction_llm;dur=501.0" -> [("transcription", 812.3), ...]
+    timings = []
+
+    for metric in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, *params = [param.strip() for param in metric.split(";")]
+
+        for param in params:
+            if param.startswith("dur="):
+                timings.append((name, float(param[4:])))
+
+    return timings
+
+
+def start_app(port: int, openai_url: str, calendar_url: str, calendar_api_url: str = None):
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": openai_url,
+        "OPENAI_API_KEY": "fake",
+        "GOOGLE_CALENDAR_URL": calendar_url,
+        "BROWSER_HEADLESS": "true",
+    }
+
+    if calendar_api_url is not None:
+        env["CALENDAR_BACKEND"] = "api"
+        env["GOOGLE_CALENDAR_API_URL"] = f"{calendar_api_url}/calendar/v3"
+        env["GOOGLE_OAUTH_TOKEN_URL"] = f"{calendar_api_url}/token"
+        env["GOOGLE_CALENDAR_ACCESS_TOKEN"] = FakeCalendarApiHandler.access_token
+
+    # Defaults that keep runs comparable, each can still be overridden from the environment.
+    env.setdefault("BROWSER_CHANNEL", "")  # Playwright's bundled Chromium.
+    env.setdefault("AGENDA_PREFETCH_DAYS", "0")
+    env.setdefault("LOG_LEVEL", "WARNING")
+
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT_DIR,
+        env=env,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, app: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+
+    while time.monotonic() < deadline:
+        if app.poll() is not None:
+            raise RuntimeError(f"The app exited with code {app.returncode}.")
+
+        try:
+            if (await client.get("/readyz")).status_code == 200:
+                return
+
+        except httpx.TransportError:
+            pass
+
+        await asyncio.sleep(0.5)
+
+    raise TimeoutError("The app did not start in time.")
+
+
+async def run_level(client: httpx.AsyncClient, audio: bytes, concurrency: int, total: int):
+    limiter = asyncio.Semaphore(concurrency)
+    stages = {"client": []}  # Stage -> durations in ms.
+    statuses = {}
+
+    async def one():
+        async with limiter:
+            # A unique tail per upload, otherwise the transcription cache would answer.
+            files = {"audio_blob": ("recording.webm", audio + uuid.uuid4().bytes, "audio/webm")}
+            headers = {"X-Session-Id": uuid.uuid4().hex}  # One client per upload.
+            started = time.perf_counter()
+            response = await client.post("/audio-recording", files=files, headers=headers)
+            stages["client"].append((time.perf_counter() - started) * 1000)
+
+        try:
+            status = response.json().get("status", "unknown")
+
+        except ValueError:
+            status = f"http_{response.status_code}"
+
+        statuses[status] = statuses.get(status, 0) + 1
+
+        for stage, duration in parse_server_timing(response.headers.get("Server-Timing")):
+            stages.setdefault(stage, []).append(duration)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "elapsed_s": elapsed,
+        "throughput": total / elapsed,
+        "statuses": statuses,
+        "stages": {
+            stage: {
+                "count": len(durations),
+                "p50_ms": percentile(durations, 0.5),
+                "p95_ms": percentile(durations, 0.95),
+                "p99_ms": percentile(durations, 0.99),
+            }
+            for stage, durations in stages.items()
+        },
+    }
+
+
+async def run(args: argparse.Namespace, app_url: str, app: subprocess.Popen):
+    with open(args.audio, "rb") as file:
+        audio = file.read()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    results = []
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=None) as client:
+        await wait_until_ready(client, app)
+
+        for _ in range(args.warmup):
+            await client.post(
+                "/audio-recording",
+                files={"audio_blob": ("recording.webm", audio + uuid.uuid4().bytes, "audio/webm")},
+                headers={"X-Session-Id": uuid.uuid4().hex},
+            )
+
+        for concurrency in levels:
+            results.append(await run_level(client, audio, concurrency, args.requests))
+
+        stats = (await client.get("/stats")).json()
+
+    return results, stats
+
+
+def print_results(results: list):
+    for result in results:
+        print(
+            f"\nconcurrency {result['concurrency']}: {result['throughput']:.2f} req/s, "
+            f"{result['requests']} requests in {result['elapsed_s']:.1f}s, statuses: {result['statuses']}"
+        )
+        print(f"{'stage':>22} {'count':>6} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10}")
+
+        for stage, summary in result["stages"].items():
+            print(
+                f"{stage:>22} {summary['count']:>6} {summary['p50_ms']:>10.0f} "
+                f"{summary['p95_ms']:>10.0f} {summary['p99_ms']:>10.0f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default="1,2,4,8")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per level.")
+    parser.add_argument("--warmup", type=int, default=2, help="Requests sent before measuring.")
+    parser.add_argument("--openai-latency", type=float, default=0.8)
+    parser.add_argument("--transcription-latency", type=float, default=1.5)
+    parser.add_argument("--calendar-latency", type=float, default=0.05)
+    parser.add_argument("--extraction", choices=("llm", "rules"), default="llm")
+    parser.add_argument("--calendar-backend", choices=("playwright", "api"), default="playwright")
+    parser.add_argument("--audio", default=DEFAULT_AUDIO)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    FakeOpenAIHandler.latency = args.openai_latency
+    FakeOpenAIHandler.transcription_latency = args.transcription_latency
+    FakeOpenAIHandler.extraction = args.extraction
+    FakeCalendarHandler.latency = args.calendar_latency
+    FakeCalendarApiHandler.latency = args.calendar_latency
+    openai_server = start_server(FakeOpenAIHandler)
+    calendar_server = start_server(
+        FakeCalendarApiHandler if args.calendar_backend == "api" else FakeCalendarHandler
+    )
+    calendar_url = f"http://127.0.0.1:{calendar_server.server_port}"
+
+    app = start_app(
+        port=args.port,
+        openai_url=f"http://127.0.0.1:{openai_server.server_port}/v1",
+        calendar_url=f"{calendar_url}/",
+        calendar_api_url=calendar_url if args.calendar_backend == "api" else None,
+    )
+
+    try:
+        results, stats = asyncio.run(run(args, f"http://127.0.0.1:{args.port}", app))
+
+    finally:
+        app.terminate()
+        app.wait()
+        openai_server.shutdown()
+        calendar_server.shutdown()
+
+    print(
+        f"openai latency: {args.openai_latency}s, transcription latency: {args.transcription_latency}s, "
+        f"calendar latency: {args.calendar_latency}s, extraction: {args.extraction}, "
+        f"calendar backend: {args.calendar_backend}"
+    )
+    print_results(results)
+    saved = FakeCalendarApiHandler.events if args.calendar_backend == "api" else FakeCalendarHandler.saved
+    print(f"\nevents saved by the fake calendar: {len(saved)}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "results": results, "stats": stats}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
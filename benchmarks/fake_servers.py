@@ -0,0 +1,417 @@
+"""
+Local stand-ins for OpenAI and Google Calendar, so benchmarks run offline on a plain Linux box.
+
+FakeOpenAIHandler answers transcriptions and chat completions after a configurable latency.
+Completions asked with stream=True come as server-sent chunks, the first one after half of it.
+It can also act overloaded: 429s with Retry-After past a number of calls in flight, and 500s
+at random.
+Every transcription is a new utterance whose event lands in a free slot of the calendar,
+so each request goes through the whole pipeline up to the save click without conflicts.
+
+FakeCalendarHandler serves the HTML fixtures of benchmarks/fixtures/calendar, which mimic
+the agenda and eventedit pages closely enough for the Playwright helpers to drive them.
+
+FakeCalendarApiHandler answers the few Calendar REST calls of CALENDAR_BACKEND=api: the token
+refresh, events.list over a time range, events.insert and the multipart batch endpoint.
+"""
+
+import os
+import json
+import uuid
+import time
+import random
+import html
+import threading
+import urllib.parse
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "calendar")
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 40  # 08:00 to 18:00, clear of the events in the agenda fixture.
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "application/javascript",
+    ".css": "text/css",
+    ".png": "image/png",
+}
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.5  # Seconds per chat completion.
+    transcription_latency = None  # Seconds per transcription, the chat latency when None.
+    extraction = "llm"  # "llm" utterances need the model, "rules" ones the rule-based path reads.
+    capacity = 0  # Calls served at once, the others get a 429. 0 is unlimited.
+    error_rate = 0.0  # Share of calls answered with a 500.
+    retry_after = 0.2  # Seconds, sent with the 429s.
+
+    lock = threading.Lock()
+    in_flight = 0
+    utterances = 0
+    events = {}  # Utterance -> event the model "extracts" from it.
+
+    @classmethod
+    def next_utterance(cls):
+        with cls.lock:
+            number = cls.utterances
+            cls.utterances += 1
+
+        start = datetime.combine(
+            date.today() + timedelta(days=1 + number // SLOTS_PER_DAY), datetime.min.time()
+        ) + timedelta(hours=8, minutes=(number % SLOTS_PER_DAY) * SLOT_MINUTES)
+        end = start + timedelta(minutes=SLOT_MINUTES)
+
+        if cls.extraction == "rules":
+            text = f"{start.month}月{start.day}日 {start:%H:%M} 到 {end:%H:%M} benchmark sync {number}"
+        else:
+            text = f"Benchmark sync {number}, whenever the calendar is free"
+
+        cls.events[text] = {
+            "title": f"benchmark sync {number}",
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+        }
+
+        return text
+
+    def get_chat_content(self, request: dict):
+        messages = request.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = next((m["content"] for m in messages if m["role"] == "user"), "")
+
+        if not system:
+            return {"conflict": False, "reason": "No conflict"}  # Conflict check prompt.
+
+        event = self.events.get(
+            user,
+            {
+                "title": "开会",
+                "start_time": "2025-01-01T10:00:00",
+                "end_time": "2025-01-01T11:00:00",
+            },
+        )
+
+        if '"events"' in system:
+            return {"events": [event]}
+
+        return event
+
+    def send_error_payload(self, status: int, message: str, headers: dict = None):
+        payload = {"error": {"message": message, "type": "fake_error", "code": None}}
+        send(self, status, "application/json", json.dumps(payload).encode("utf-8"), headers=headers)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        with self.lock:
+            overloaded = self.capacity and FakeOpenAIHandler.in_flight >= self.capacity
+
+            if not overloaded:
+                FakeOpenAIHandler.in_flight += 1
+
+        if overloaded:
+            return self.send_error_payload(
+                429, "Rate limit reached.", headers={"Retry-After": str(self.retry_after)}
+            )
+
+        try:
+            self.answer(body)
+
+        finally:
+            with self.lock:
+                FakeOpenAIHandler.in_flight -= 1
+
+    def answer(self, body: bytes):
+        if random.random() < self.error_rate:
+            time.sleep(self.latency)
+
+            return self.send_error_payload(500, "The server had an error.")
+
+        request = {} if self.path.endswith("/audio/transcriptions") else json.loads(body or b"{}")
+
+        if self.path.endswith("/audio/transcriptions"):
+            latency = self.transcription_latency
+            time.sleep(self.latency if latency is None else latency)
+            payload = {"text": self.next_utterance()}
+        elif request.get("stream"):
+            return self.stream(json.dumps(self.get_chat_content(request), ensure_ascii=False))
+        else:
+            time.sleep(self.latency)  # Simulate upstream processing time.
+            payload = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "fake",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {
+                            "role": "assistant",
+                            "content": json.dumps(
+                                self.get_chat_content(request), ensure_ascii=False
+                            ),
+                        },
+                    }
+                ],
+            }
+
+        send(self, 200, "application/json", json.dumps(payload).encode("utf-8"))
+
+    def stream(self, content: str, chunks: int = 8):
+        # Half of the latency before the first token, the rest spread over the chunks.
+        time.sleep(self.latency / 2)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")  # The end of the body is the end of the stream.
+        self.end_headers()
+
+        size = max(1, -(-len(content) // chunks))
+        deltas = [{"role": "assistant", "content": ""}]
+        deltas += [{"content": content[i : i + size]} for i in range(0, len(content), size)]
+
+        for index, delta in enumerate(deltas):
+            if index > 1:
+                time.sleep(self.latency / 2 / (len(deltas) - 1))
+
+            last = index == len(deltas) - 1
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "fake",
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": "stop" if last else None}
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass  # Keep the benchmark output readable.
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    latency = 0.05  # Seconds per page load and save.
+
+    lock = threading.Lock()
+    saved = []  # Form fields of the saved events.
+
+    def render(self, name: str, values: dict):
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as file:
+            content = file.read()
+
+        for key, value in values.items():
+            content = content.replace("{{" + key + "}}", html.escape(value))
+
+        send(self, 200, CONTENT_TYPES[".html"], content.encode("utf-8"))
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+
+        if url.path.startswith("/static/"):
+            filename = os.path.basename(url.path)
+            path = os.path.join(FIXTURES_DIR, filename)
+            extension = os.path.splitext(filename)[1]
+
+            if not os.path.isfile(path) or extension not in CONTENT_TYPES:
+                return send(self, 404, "text/plain", b"Not found")
+
+            with open(path, "rb") as file:
+                return send(
+                    self, 200, CONTENT_TYPES[extension], file.read(), cache_control="max-age=3600"
+                )
+
+        time.sleep(self.latency)
+
+        if url.path.startswith("/calendar/u/0/r/eventedit"):
+            query = urllib.parse.parse_qs(url.query)
+
+            return self.render(
+                "eventedit.html",
+                {"title": query.get("text", [""])[0], "dates": query.get("dates", [""])[0]},
+            )
+
+        day = date.today()
+        parts = url.path.rstrip("/").split("/")
+
+        if url.path.startswith("/calendar/u/0/r/agenda/") and len(parts) >= 3:
+            try:
+                day = date(*(int(part) for part in parts[-3:]))
+
+            except ValueError:
+                return send(self, 404, "text/plain", b"Not found")
+
+        # e.g. "Sunday, October 18, 2026", a header the agenda parser understands.
+        self.render("agenda.html", {"day_header": f"{day:%A, %B} {day.day}, {day.year}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+        time.sleep(self.latency)
+
+        if not self.path.startswith("/calendar/u/0/r/save"):
+            return send(self, 404, "text/plain", b"Not found")
+
+        with self.lock:
+            self.saved.append({key: values[0] for key, values in form.items()})
+
+        send(self, 200, "application/json", b'{"ok": true}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeCalendarApiHandler(BaseHTTPRequestHandler):
+    latency = 0.05  # Seconds per API call, a batch call included.
+    access_token = "fake-calendar-token"
+
+    lock = threading.Lock()
+    events = []  # Inserted event resources, with an id.
+
+    @staticmethod
+    def to_datetime(value: dict):
+        # Aware datetimes, naive times with a timeZone are taken as the server's own zone.
+        if "date" in value:
+            return datetime.combine(date.fromisoformat(value["date"]), datetime.min.time()).astimezone()
+
+        parsed = datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+
+        return parsed if parsed.tzinfo is not None else parsed.astimezone()
+
+    @classmethod
+    def insert(cls, resource: dict):
+        with cls.lock:
+            event = {**resource, "id": uuid.uuid4().hex, "status": "confirmed"}
+            cls.events.append(event)
+
+        return event
+
+    def is_authorized(self):
+        return self.headers.get("Authorization") == f"Bearer {self.access_token}"
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        time.sleep(self.latency)
+
+        if not url.path.startswith("/calendar/v3/calendars/") or not url.path.endswith("/events"):
+            return send(self, 404, "application/json", b'{"error": "not found"}')
+        elif not self.is_authorized():
+            return send(self, 401, "application/json", b'{"error": "unauthorized"}')
+
+        query = urllib.parse.parse_qs(url.query)
+        time_min = self.to_datetime({"dateTime": query["timeMin"][0]})
+        time_max = self.to_datetime({"dateTime": query["timeMax"][0]})
+
+        with self.lock:
+            items = [
+                event
+                for event in self.events
+                if self.to_datetime(event["start"]) < time_max
+                and self.to_datetime(event["end"]) > time_min
+            ]
+
+        items.sort(key=lambda event: self.to_datetime(event["start"]))
+        send(self, 200, "application/json", json.dumps({"items": items}).encode("utf-8"))
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        time.sleep(self.latency)
+
+        if url.path == "/token":
+            payload = {"access_token": self.access_token, "expires_in": 3600}
+
+            return send(self, 200, "application/json", json.dumps(payload).encode("utf-8"))
+        elif not self.is_authorized():
+            return send(self, 401, "application/json", b'{"error": "unauthorized"}')
+        elif url.path.startswith("/calendar/v3/calendars/") and url.path.endswith("/events"):
+            event = self.insert(json.loads(body))
+
+            return send(self, 200, "application/json", json.dumps(event).encode("utf-8"))
+        elif url.path == "/batch/calendar/v3":
+            return self.answer_batch(body)
+
+        send(self, 404, "application/json", b'{"error": "not found"}')
+
+    def answer_batch(self, body: bytes):
+        # Each part is a whole HTTP request, answered by a part holding a whole HTTP response.
+        content_type = self.headers.get("Content-Type", "")
+        boundary = content_type.partition("boundary=")[2].strip('"')
+        answers = []
+
+        for chunk in body.decode("utf-8").split(f"--{boundary}")[1:]:
+            if chunk.startswith("--"):
+                break
+
+            head, _, request = chunk.strip("\r\n").replace("\r\n", "\n").partition("\n\n")
+            content_id = ""
+
+            for line in head.split("\n"):
+                key, _, value = line.partition(":")
+
+                if key.strip().lower() == "content-id":
+                    content_id = value.strip().strip("<>")
+
+            request_line, _, payload = request.partition("\n\n")
+
+            if request_line.startswith("POST ") and request_line.split()[1].endswith("/events"):
+                event = self.insert(json.loads(payload))
+                answer = f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(event)}"
+            else:
+                answer = "HTTP/1.1 404 Not Found\r\n\r\n"
+
+            answers += [
+                f"--{boundary}",
+                "Content-Type: application/http",
+                f"Content-ID: <response-{content_id}>",
+                "",
+                answer,
+            ]
+
+        answers.append(f"--{boundary}--")
+        send(
+            self,
+            200,
+            f"multipart/mixed; boundary={boundary}",
+            "\r\n".join(answers).encode("utf-8"),
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+def send(
+    handler: BaseHTTPRequestHandler,
+    status: int,
+    content_type: str,
+    payload: bytes,
+    cache_control: str = "no-store",
+    headers: dict = None,
+):
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(payload)))
+    handler.send_header("Cache-Control", cache_control)
+
+    for key, value in (headers or {}).items():
+        handler.send_header(key, value)
+
+    handler.end_headers()
+    handler.wfile.write(payload)
+
+
+def start_server(handler: type):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
@@ -0,0 +1,47 @@
+// Stand-in for the calendar's client-side router and event editor, enough for the helpers to drive.
+
+async function render(url) {
+  const response = await fetch(url);
+  const next = new DOMParser().parseFromString(await response.text(), "text/html");
+
+  document.title = next.title;
+  document.querySelector("div[role='main']").replaceWith(next.querySelector("div[role='main']"));
+  bind();
+}
+
+function showToast(text) {
+  const toast = document.createElement("div");
+  toast.setAttribute("role", "alert");
+  toast.textContent = text;
+  document.body.appendChild(toast);
+  setTimeout(() => toast.remove(), 3000);
+}
+
+function bind() {
+  const save = document.querySelector("button[data-action='save']");
+
+  if (!save) {
+    return;
+  }
+
+  save.addEventListener("click", async () => {
+    save.disabled = true;
+    const form = new URLSearchParams(new FormData(save.form));
+    const response = await fetch("/calendar/u/0/r/save", { method: "POST", body: form });
+
+    if (!response.ok) {
+      save.disabled = false;
+      return;
+    }
+
+    showToast("Event saved");
+    window.history.pushState({}, "", "/calendar/u/0/r/agenda");
+    await render(window.location.href);
+  });
+
+  // The real editor enables Save once its scripts have initialized.
+  requestAnimationFrame(() => { save.disabled = false; });
+}
+
+window.addEventListener("popstate", () => render(window.location.href));
+bind();
@@ -0,0 +1,130 @@
+"""
+Load test for OpenAIHelper against a stubbed OpenAI-compatible endpoint.
+
+Starts a local HTTP server that answers chat completions and transcriptions after a fixed
+latency, points the helper at it and measures throughput at increasing concurrency levels.
+With non-blocking calls the throughput grows with concurrency until OPENAI_MAX_CONCURRENCY.
+With --capacity and --error-rate the stub pushes back with 429s and 500s, to compare the
+errors and tail latency with retries against --max-retries 0.
+
+Usage:
+    python3 -m benchmarks.openai_load_test --latency 0.5 --requests 32 --levels 1,2,4,8,16
+    python3 -m benchmarks.openai_load_test --capacity 4 --error-rate 0.05 --max-retries 0
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_servers import FakeOpenAIHandler, start_server
+
+
+def percentile(values: list, ratio: float):
+    if not values:
+        return None
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(ratio * len(values)))]
+
+
+async def run_level(helper, concurrency: int, total: int):
+    from helpers.upstream_helper import UpstreamHelper
+
+    limiter = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+
+        async with limiter:
+            UpstreamHelper.set_deadline()  # Each call is a request of its own.
+            started = time.perf_counter()
+
+            try:
+                await helper.text_to_event(text="明天上午十点到11点开会")
+
+            except Exception:
+                errors += 1
+
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+
+    return time.perf_counter() - started, errors, latencies
+
+
+async def run(levels: list, total: int):
+    from helpers.open_ai_helper import OpenAIHelper
+    from helpers.upstream_helper import UpstreamHelper
+
+    results = []
+
+    try:
+        for concurrency in levels:
+            retries = UpstreamHelper.stats()["openai_chat"]["retries"]
+            elapsed, errors, latencies = await run_level(OpenAIHelper, concurrency, total)
+            retries = UpstreamHelper.stats()["openai_chat"]["retries"] - retries
+            results.append((concurrency, elapsed, total / elapsed, errors, retries, latencies))
+
+    finally:
+        await OpenAIHelper.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--levels", default="1,2,4,8,16")
+    parser.add_argument("--capacity", type=int, default=0, help="Stub calls at once, 0 is unlimited.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub 500s.")
+    parser.add_argument("--max-retries", type=int, help="OPENAI_MAX_RETRIES, 0 fails at once.")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    FakeOpenAIHandler.latency = args.latency
+    FakeOpenAIHandler.capacity = args.capacity
+    FakeOpenAIHandler.error_rate = args.error_rate
+    server = start_server(FakeOpenAIHandler)
+
+    # Must be set before the helper module creates its client.
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ.setdefault("OPENAI_MAX_CONCURRENCY", str(max(levels)))
+    os.environ.setdefault("OPENAI_MAX_CONNECTIONS", str(max(levels)))
+
+    if args.max_retries is not None:
+        os.environ["OPENAI_MAX_RETRIES"] = str(args.max_retries)
+
+    results = asyncio.run(run(levels, args.requests))
+    server.shutdown()
+
+    print(
+        f"stub latency: {args.latency}s, requests per level: {args.requests}, "
+        f"capacity: {args.capacity or 'unlimited'}, error rate: {args.error_rate}"
+    )
+    print(
+        f"{'concurrency':>12} {'elapsed (s)':>12} {'req/s':>10} {'speedup':>8} "
+        f"{'errors':>7} {'retries':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8}"
+    )
+
+    baseline = results[0][2]
+
+    for concurrency, elapsed, throughput, errors, retries, latencies in results:
+        print(
+            f"{concurrency:>12} {elapsed:>12.2f} {throughput:>10.2f} {throughput / baseline:>7.1f}x "
+            f"{errors:>7} {retries:>8} {percentile(latencies, 0.5):>8.2f} "
+            f"{percentile(latencies, 0.95):>8.2f} {percentile(latencies, 0.99):>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+from datetime import date, datetime, timedelta
+from helpers.cache_helper import TTLCache
+from helpers.interval_index_helper import AgendaEntry, IntervalIndex
+from helpers.storage_helper import DEFAULT_ACCOUNT
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+AGENDA_CACHE_TTL_SECONDS = float(os.environ.get("AGENDA_CACHE_TTL_SECONDS", "60"))
+AGENDA_CACHE_MAX_ENTRIES = int(os.environ.get("AGENDA_CACHE_MAX_ENTRIES", "256"))
+
+agenda_cache = TTLCache(
+    max_size=AGENDA_CACHE_MAX_ENTRIES, ttl_seconds=AGENDA_CACHE_TTL_SECONDS
+)
+
+
+class AgendaCacheHelper:
+    def get_key(day: date, account_id: str = DEFAULT_ACCOUNT):
+        return (account_id, day.isoformat())
+
+    def get(day: date, account_id: str = DEFAULT_ACCOUNT):
+        return agenda_cache.get(AgendaCacheHelper.get_key(day, account_id))
+
+    def expires_in(day: date, account_id: str = DEFAULT_ACCOUNT):
+        # Seconds until the cached agenda expires, None when it is not cached.
+        return agenda_cache.expires_in(AgendaCacheHelper.get_key(day, account_id))
+
+    def generation(day: date, account_id: str = DEFAULT_ACCOUNT):
+        return agenda_cache.generation(AgendaCacheHelper.get_key(day, account_id))
+
+    def put(
+        day: date,
+        snapshot: dict,
+        account_id: str = DEFAULT_ACCOUNT,
+        generation: int = None,
+    ):
+        return agenda_cache.put(
+            AgendaCacheHelper.get_key(day, account_id),
+            snapshot,
+            generation=generation,
+        )
+
+    def record_event(event_data: object, account_id: str = DEFAULT_ACCOUNT):
+        # Called once the event is saved, so a failure is only logged: the save still succeeded.
+        try:
+            AgendaCacheHelper.write_through(event_data, account_id)
+
+        except Exception as e:
+            logger.warning(f"AgendaCacheHelper record_event() event_data: {event_data}, e: {e}")
+
+    def write_through(event_data: object, account_id: str = DEFAULT_ACCOUNT):
+        # Write the new event through to the cached agenda of its start date, invalidate the others.
+        if not event_data.get("start_time"):
+            return  # No date to place it on, e.g. the model gave only a title.
+
+        start_dt = datetime.fromisoformat(event_data.get("start_time")).replace(
+            tzinfo=None
+        )
+        end_dt = datetime.fromisoformat(
+            event_data.get("end_time", event_data.get("start_time"))
+        ).replace(tzinfo=None)
+        key = AgendaCacheHelper.get_key(start_dt.date(), account_id)
+        snapshot = agenda_cache.peek(key)
+
+        if snapshot is not None and snapshot.get("index") is not None:
+            index = IntervalIndex(snapshot["index"].entries)
+            index.add(AgendaEntry(start_dt, end_dt, event_data.get("title", "")))
+
+            if agenda_cache.replace(key, dict(snapshot, index=index)):
+                logger.debug(f"AgendaCacheHelper record_event() updated day: {start_dt.date()}")
+                start_dt += timedelta(days=1)
+
+        day = start_dt.date()
+
+        while day <= end_dt.date():  # Every other date the event touches.
+            logger.debug(f"AgendaCacheHelper record_event() invalidated day: {day}")
+            agenda_cache.invalidate(AgendaCacheHelper.get_key(day, account_id))
+            day += timedelta(days=1)
+
+    def stats():
+        return agenda_cache.stats()
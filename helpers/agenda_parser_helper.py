@@ -0,0 +1,282 @@
+import os
+import re
+from datetime import date, datetime, timedelta
+from helpers.interval_index_helper import AgendaEntry, IntervalIndex
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+MONTHS = {
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "may": 5,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+}
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# e.g. "10am – 11am", "10 – 11:30am", "10:00 – 11:00", "11pm – 1am"
+REGEX_TIME_RANGE = re.compile(
+    r"^(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?\s*[–—-]\s*(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?\s*(.*)$",
+    re.IGNORECASE,
+)
+REGEX_TIME_LIKE = re.compile(
+    r"\d{1,2}(:\d{2})?\s*([ap]\.?m\.?)\b|\d{1,2}:\d{2}", re.IGNORECASE
+)
+REGEX_DAY_NUMBER = re.compile(r"^(\d{1,2})$")
+REGEX_NAME = re.compile(r"[a-z]+", re.IGNORECASE)
+ALL_DAY_LINES = ("all day",)
+EMPTY_DAY_LINES = ("no events", "nothing planned", "nothing planned for today")
+SEARCH_DAYS = 62  # How far past the requested date the agenda headers are resolved.
+# Hours around a new event whose agenda rows the conflict prompt still gets.
+AGENDA_PROMPT_WINDOW_HOURS = float(os.environ.get("AGENDA_PROMPT_WINDOW_HOURS", "3"))
+AGENDA_PROMPT_MAX_ROWS = 40
+AGENDA_PROMPT_MAX_ROW_CHARS = 200  # Descriptions and attendee lists are cut short.
+
+
+class AgendaParserHelper:
+    def get_names(line: str):
+        return [name.lower()[:3] for name in REGEX_NAME.findall(line)]
+
+    def is_calendar_names(line: str):
+        names = AgendaParserHelper.get_names(line)
+
+        return bool(names) and all(name in MONTHS or name in WEEKDAYS for name in names)
+
+    def parse_header(lines: list, position: int):
+        # Returns (day_of_month, month or None, consumed_lines) for a day header, otherwise None.
+        line = lines[position]
+        lower = line.lower()
+
+        if lower in ("today", "tomorrow"):
+            return (lower, None, 1)
+
+        match = REGEX_DAY_NUMBER.match(line)
+
+        if match and position + 1 < len(lines):
+            following = lines[position + 1]
+
+            if AgendaParserHelper.is_calendar_names(following):
+                names = AgendaParserHelper.get_names(following)
+                month = next((MONTHS[name] for name in names if name in MONTHS), None)
+
+                return (int(match.group(1)), month, 2)
+
+        # e.g. "Sunday, October 18" or "Sun, Oct 18, 2026"
+        numbers = re.findall(r"\d+", line)
+
+        if numbers and AgendaParserHelper.is_calendar_names(line):
+            names = AgendaParserHelper.get_names(line)
+            month = next((MONTHS[name] for name in names if name in MONTHS), None)
+
+            if month is not None:
+                return (int(numbers[0]), month, 1)
+
+        return None
+
+    def resolve_header(header: tuple, day: date, previous: date):
+        day_of_month, month, _ = header
+        today = datetime.now().date()
+
+        if day_of_month == "today":
+            return today
+        elif day_of_month == "tomorrow":
+            return today + timedelta(days=1)
+
+        candidate = previous or day
+
+        for _ in range(SEARCH_DAYS):
+            if candidate.day == day_of_month and month in (None, candidate.month):
+                return candidate
+
+            candidate += timedelta(days=1)
+
+        return None
+
+    def to_time(hour: str, minute: str, meridiem: str):
+        hour = int(hour)
+        minute = int(minute or 0)
+
+        if meridiem is not None:
+            if hour > 12:
+                raise ValueError(f"invalid 12-hour time: {hour}")
+
+            hour = hour % 12 + (12 if meridiem.lower().startswith("p") else 0)
+
+        if hour > 23 or minute > 59:
+            raise ValueError(f"invalid time: {hour}:{minute}")
+
+        return hour, minute
+
+    def parse_time_range(match: re.Match, day: date):
+        start_hour, start_minute, start_meridiem = match.group(1, 2, 3)
+        end_hour, end_minute, end_meridiem = match.group(4, 5, 6)
+
+        if not any((start_minute, end_minute, start_meridiem, end_meridiem)):
+            return None  # Bare numbers, e.g. a "1-1 with Bob" title, not a time range.
+        elif start_meridiem is None and end_meridiem is not None:
+            # "10 – 11am" shares the end's period unless that would put the start after the end.
+            start_meridiem = end_meridiem
+            start = AgendaParserHelper.to_time(start_hour, start_minute, start_meridiem)
+            end = AgendaParserHelper.to_time(end_hour, end_minute, end_meridiem)
+
+            if start > end:
+                start_meridiem = "am" if end_meridiem.lower().startswith("p") else "pm"
+        elif start_meridiem is not None and end_meridiem is None:
+            return None
+
+        start = AgendaParserHelper.to_time(start_hour, start_minute, start_meridiem)
+        end = AgendaParserHelper.to_time(end_hour, end_minute, end_meridiem)
+        start_dt = datetime(day.year, day.month, day.day, *start)
+        end_dt = datetime(day.year, day.month, day.day, *end)
+
+        if end_dt == start_dt:
+            return None  # Zero length, rather a misread than a 24 hour event.
+        elif end_dt < start_dt:
+            end_dt += timedelta(days=1)  # Ends after midnight.
+
+        return start_dt, end_dt
+
+    def parse(schedule_text: str, day: date):
+        """
+        Parse the agenda view text into the entries of `day`.
+        Returns an IntervalIndex, or None when the text cannot be understood with confidence.
+        """
+        if schedule_text is None:
+            return None
+
+        lines = [line.strip() for line in schedule_text.splitlines() if line.strip()]
+
+        if not lines:
+            return IntervalIndex()
+
+        entries = []
+        current_day = None
+        headers_found = False
+        position = 0
+
+        try:
+            while position < len(lines):
+                line = lines[position]
+                header = AgendaParserHelper.parse_header(lines, position)
+
+                if header is not None:
+                    resolved = AgendaParserHelper.resolve_header(header, day, current_day)
+
+                    if resolved is None:
+                        return None
+
+                    current_day = resolved
+                    headers_found = True
+                    position += header[2]
+                    continue
+
+                lower = line.lower()
+
+                if lower in ALL_DAY_LINES:
+                    position += 2  # All-day entries do not block a time range.
+                    continue
+                elif lower in EMPTY_DAY_LINES:
+                    position += 1
+                    continue
+
+                match = REGEX_TIME_RANGE.match(line)
+
+                if match is None:
+                    if REGEX_TIME_LIKE.search(line) and current_day is not None:
+                        return None  # A time we do not understand, let the model read it.
+
+                    position += 1  # Title details such as location or attendees.
+                    continue
+
+                if current_day is None:
+                    return None  # Entries before any day header cannot be placed.
+
+                time_range = AgendaParserHelper.parse_time_range(match, current_day)
+
+                if time_range is None:
+                    return None
+
+                title = match.group(7).strip(" ,")
+
+                if (
+                    not title
+                    and position + 1 < len(lines)
+                    and REGEX_TIME_RANGE.match(lines[position + 1]) is None
+                    and AgendaParserHelper.parse_header(lines, position + 1) is None
+                ):
+                    position += 1
+                    title = lines[position]
+
+                if current_day == day:
+                    entries.append(AgendaEntry(time_range[0], time_range[1], title))
+
+                position += 1
+
+        except ValueError as e:
+            logger.debug(f"AgendaParserHelper parse() e: {e}")
+
+            return None
+
+        if not headers_found:
+            return None
+
+        return IntervalIndex(entries)
+
+    def get_window(rows: list, day: date, start: datetime, end: datetime):
+        """
+        Compact agenda for the conflict prompt: the rows of `day` near [start, end), one per line.
+        `rows` are {"heading": str} or {"text": str} in page order, as read from the agenda's DOM.
+        Returns None when there are no rows to work with.
+        """
+        if not rows:
+            return None
+
+        window_start = start - timedelta(hours=AGENDA_PROMPT_WINDOW_HOURS)
+        window_end = end + timedelta(hours=AGENDA_PROMPT_WINDOW_HOURS)
+        current_day = None
+        headers_found = False
+        kept = []
+
+        for row in rows:
+            if "heading" in row:
+                lines = [line.strip() for line in row["heading"].splitlines() if line.strip()]
+                header = AgendaParserHelper.parse_header(lines, 0) if lines else None
+
+                if header is not None:
+                    current_day = AgendaParserHelper.resolve_header(header, day, current_day)
+                    headers_found = True
+
+                continue
+
+            if headers_found and current_day != day:
+                continue  # Another date of the agenda.
+
+            text = " ".join(row.get("text", "").split())[:AGENDA_PROMPT_MAX_ROW_CHARS]
+            match = REGEX_TIME_RANGE.match(text)
+
+            if match is not None:
+                try:
+                    time_range = AgendaParserHelper.parse_time_range(match, day)
+
+                except ValueError:
+                    time_range = None
+
+                if time_range is not None and (
+                    time_range[1] <= window_start or time_range[0] >= window_end
+                ):
+                    continue  # Too far from the new event to matter.
+
+            if text:
+                kept.append(text)  # Rows we cannot place stay, the model judges them.
+
+        kept = kept[:AGENDA_PROMPT_MAX_ROWS]
+
+        return "\n".join([f"{day:%A, %B} {day.day}, {day.year}"] + (kept or ["No events"]))
@@ -0,0 +1,87 @@
+import os
+import asyncio
+from datetime import datetime, timedelta
+from helpers.agenda_cache_helper import AgendaCacheHelper
+from helpers.calendar_backend_helper import CalendarBackendHelper
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+AGENDA_PREFETCH_DAYS = int(os.environ.get("AGENDA_PREFETCH_DAYS", "3"))  # 0 disables it.
+AGENDA_PREFETCH_INTERVAL_SECONDS = float(
+    os.environ.get("AGENDA_PREFETCH_INTERVAL_SECONDS", "45")
+)
+# At most one agenda load per this many seconds, so the calendar does not see a bot.
+AGENDA_PREFETCH_MIN_GAP_SECONDS = float(
+    os.environ.get("AGENDA_PREFETCH_MIN_GAP_SECONDS", "5")
+)
+
+prefetch_task = None
+prefetch_stats = {"refreshes": 0, "skipped": 0, "errors": 0}
+
+
+class AgendaPrefetchHelper:
+    def start():
+        global prefetch_task
+
+        if AGENDA_PREFETCH_DAYS <= 0 or (prefetch_task is not None and not prefetch_task.done()):
+            return
+
+        logger.info(f"AgendaPrefetchHelper start() days: {AGENDA_PREFETCH_DAYS}")
+
+        prefetch_task = asyncio.ensure_future(AgendaPrefetchHelper.run())
+
+    async def stop():
+        global prefetch_task
+
+        if prefetch_task is not None:
+            prefetch_task.cancel()
+
+            try:
+                await prefetch_task
+
+            except asyncio.CancelledError:
+                pass
+
+            prefetch_task = None
+
+    async def run():
+        while True:
+            today = datetime.now().date()
+
+            # Live accounts only, prefetching must not keep them alive.
+            for account_id in CalendarBackendHelper.get_live_accounts():
+                for offset in range(AGENDA_PREFETCH_DAYS):
+                    day = today + timedelta(days=offset)
+                    expires_in = AgendaCacheHelper.expires_in(day, account_id)
+
+                    if expires_in is not None and expires_in > AGENDA_PREFETCH_INTERVAL_SECONDS:
+                        prefetch_stats["skipped"] += 1  # Still warm until the next round.
+                        continue
+
+                    try:
+                        async with CalendarBackendHelper.acquire(
+                            account_id, touch=False, create=False
+                        ) as context:
+                            await CalendarBackendHelper.get_agenda(
+                                context=context, day=day, refresh=True, account_id=account_id
+                            )
+
+                        prefetch_stats["refreshes"] += 1
+
+                    except Exception as e:
+                        prefetch_stats["errors"] += 1
+                        logger.warning(
+                            f"AgendaPrefetchHelper run() account_id: {account_id}, day: {day}, e: {e}"
+                        )
+
+                    await asyncio.sleep(AGENDA_PREFETCH_MIN_GAP_SECONDS)
+
+            await asyncio.sleep(AGENDA_PREFETCH_INTERVAL_SECONDS)
+
+    def stats():
+        return {
+            **prefetch_stats,
+            "days": AGENDA_PREFETCH_DAYS,
+            "running": prefetch_task is not None and not prefetch_task.done(),
+        }
@@ -0,0 +1,196 @@
+import os
+import time
+import shutil
+import asyncio
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from helpers.log_helper import LogHelper
+from helpers.metrics_helper import MetricsHelper
+
+try:
+    import numpy as np  # Optional, preprocessing is skipped without it.
+except ImportError:
+    np = None
+
+logger = LogHelper.get_logger(__name__)
+
+# "auto" preprocesses when ffmpeg and NumPy are available, "off" sends uploads untouched.
+AUDIO_PREPROCESSING = os.environ.get("AUDIO_PREPROCESSING", "auto").lower()
+AUDIO_PREPROCESS_WORKERS = int(
+    os.environ.get("AUDIO_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+AUDIO_VAD_THRESHOLD_DBFS = float(os.environ.get("AUDIO_VAD_THRESHOLD_DBFS", "-45"))
+AUDIO_VAD_PADDING_MS = int(os.environ.get("AUDIO_VAD_PADDING_MS", "250"))  # Kept around speech.
+AUDIO_BITRATE = os.environ.get("AUDIO_BITRATE", "24k")  # Opus, plenty for speech at 16 kHz.
+FFMPEG_PATH = shutil.which("ffmpeg")
+FFMPEG_TIMEOUT_SECONDS = 30
+
+SAMPLE_RATE = 16000  # What Whisper works at, higher rates are only more bytes to upload.
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+NOISE_FLOOR_MARGIN_DB = 10  # Speech is at least this much louder than the quietest frames.
+
+process_pool = None  # Created on first use, the workers start with it.
+audio_stats = {
+    "processed": 0,
+    "skipped": 0,
+    "errors": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "duration_in_ms": 0,
+    "duration_out_ms": 0,
+}
+bytes_removed = MetricsHelper.counter(
+    "audio_bytes_removed_total", "Upload bytes removed by the audio preprocessing."
+)
+duration_removed = MetricsHelper.counter(
+    "audio_duration_removed_seconds_total", "Audio duration trimmed by the voice activity detection."
+)
+
+
+class AudioHelper:
+    def is_enabled():
+        return AUDIO_PREPROCESSING != "off" and FFMPEG_PATH is not None and np is not None
+
+    def run_ffmpeg(args: list, input: bytes):
+        completed = subprocess.run(
+            [FFMPEG_PATH, "-hide_banner", "-loglevel", "error", *args],
+            input=input,
+            capture_output=True,
+            timeout=FFMPEG_TIMEOUT_SECONDS,
+        )
+
+        if completed.returncode != 0:
+            raise RuntimeError(
+                f"AudioHelper run_ffmpeg() {completed.stderr.decode(errors='replace').strip()}"
+            )
+
+        return completed.stdout
+
+    def find_speech(samples: any):
+        """
+        Energy based voice activity detection over 30 ms frames.
+        Returns the (start, end) sample range holding the speech, or None when there is none.
+        """
+        frame_count = len(samples) // FRAME_SAMPLES
+
+        if frame_count == 0:
+            return None
+
+        frames = samples[: frame_count * FRAME_SAMPLES].reshape(frame_count, FRAME_SAMPLES)
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        dbfs = 20 * np.log10(np.maximum(rms, 1e-10))
+
+        # Above the absolute threshold and clearly above the recording's own noise floor.
+        noise_floor = np.percentile(dbfs, 10)
+        threshold = max(AUDIO_VAD_THRESHOLD_DBFS, noise_floor + NOISE_FLOOR_MARGIN_DB)
+        voiced = np.flatnonzero(dbfs > threshold)
+
+        if len(voiced) == 0:
+            return None
+
+        padding = AUDIO_VAD_PADDING_MS * SAMPLE_RATE // 1000
+        start = max(0, voiced[0] * FRAME_SAMPLES - padding)
+        end = min(len(samples), (voiced[-1] + 1) * FRAME_SAMPLES + padding)
+
+        return start, end
+
+    def process(audio_bytes: bytes):
+        """
+        Decode, downmix and resample to 16 kHz mono, trim the silence around the speech and
+        encode to Ogg Opus. Runs in the process pool, returns (bytes, report).
+        """
+        pcm = AudioHelper.run_ffmpeg(
+            ["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+            audio_bytes,
+        )
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        speech = AudioHelper.find_speech(samples.astype(np.float32) / 32768.0)
+        duration_in_ms = len(samples) * 1000 // SAMPLE_RATE
+
+        if speech is None:
+            return None, {"duration_in_ms": duration_in_ms, "reason": "no speech found"}
+
+        start, end = speech
+        trimmed = samples[start:end].tobytes()
+        encoded = AudioHelper.run_ffmpeg(
+            [
+                "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-i", "pipe:0",
+                "-c:a", "libopus", "-b:a", AUDIO_BITRATE, "-application", "voip",
+                "-f", "ogg", "pipe:1",
+            ],
+            trimmed,
+        )
+
+        return encoded, {
+            "duration_in_ms": duration_in_ms,
+            "duration_out_ms": (end - start) * 1000 // SAMPLE_RATE,
+        }
+
+    def get_pool():
+        global process_pool
+
+        if process_pool is None:
+            process_pool = ProcessPoolExecutor(max_workers=AUDIO_PREPROCESS_WORKERS)
+
+        return process_pool
+
+    async def preprocess(filename: str, audio_bytes: bytes):
+        # Returns (filename, audio_bytes, duration_ms or None) to transcribe, the upload itself
+        # when nothing is gained.
+        if not AudioHelper.is_enabled():
+            audio_stats["skipped"] += 1
+
+            return filename, audio_bytes, None
+
+        started = time.perf_counter()
+
+        try:
+            with MetricsHelper.span("audio_preprocess"):
+                encoded, report = await asyncio.get_running_loop().run_in_executor(
+                    AudioHelper.get_pool(), AudioHelper.process, audio_bytes
+                )
+
+        except Exception as e:
+            audio_stats["errors"] += 1
+            logger.warning(f"AudioHelper preprocess() filename: {filename}, e: {e}")
+
+            return filename, audio_bytes, None  # Whisper may still make sense of it.
+
+        if encoded is None or len(encoded) >= len(audio_bytes):
+            audio_stats["skipped"] += 1
+            logger.info(f"AudioHelper preprocess() filename: {filename}, kept as is, report: {report}")
+
+            return filename, audio_bytes, report["duration_in_ms"]
+
+        audio_stats["processed"] += 1
+        audio_stats["bytes_in"] += len(audio_bytes)
+        audio_stats["bytes_out"] += len(encoded)
+        audio_stats["duration_in_ms"] += report["duration_in_ms"]
+        audio_stats["duration_out_ms"] += report["duration_out_ms"]
+        bytes_removed.inc(len(audio_bytes) - len(encoded))
+        duration_removed.inc((report["duration_in_ms"] - report["duration_out_ms"]) / 1000)
+
+        logger.info(
+            f"AudioHelper preprocess() filename: {filename}, "
+            f"bytes: {len(audio_bytes)} -> {len(encoded)}, "
+            f"duration_ms: {report['duration_in_ms']} -> {report['duration_out_ms']}, "
+            f"elapsed_ms: {(time.perf_counter() - started) * 1000:.0f}"
+        )
+
+        return f"{os.path.splitext(filename)[0]}.ogg", encoded, report["duration_out_ms"]
+
+    def stats():
+        return {
+            **audio_stats,
+            "enabled": AudioHelper.is_enabled(),
+            "bytes_removed": audio_stats["bytes_in"] - audio_stats["bytes_out"],
+            "duration_removed_ms": audio_stats["duration_in_ms"] - audio_stats["duration_out_ms"],
+        }
+
+    def close():
+        global process_pool
+
+        if process_pool is not None:
+            process_pool.shutdown(wait=False)
+            process_pool = None
@@ -0,0 +1,121 @@
+import asyncio
+from helpers.calendar_backend_helper import CalendarBackendHelper
+from helpers.interval_index_helper import AgendaEntry, IntervalIndex
+from helpers.storage_helper import DEFAULT_ACCOUNT
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+
+class BatchHelper:
+    def get_status(results: list):
+        statuses = {result["status"] for result in results}
+
+        if statuses == {"success"}:
+            return "success"
+        elif "success" in statuses:
+            return "partial"
+
+        return "conflict" if statuses == {"conflict"} else "error"
+
+    async def process_events(
+        context: any, events: list, account_id: str = DEFAULT_ACCOUNT
+    ):
+        """
+        Check and create several events at once: each date's agenda is fetched once, conflicts
+        are checked together and the events are saved in one go by the calendar backend.
+        Returns one result per event, in the order given.
+        """
+        logger.debug("BatchHelper process_events() events: %s", events)
+
+        results = [None] * len(events)
+        valid = []  # (position, event_data, start_dt, end_dt)
+
+        for position, event_data in enumerate(events):
+            try:
+                start_dt, end_dt = CalendarBackendHelper.get_time_range(event_data)
+
+                if not event_data.get("title"):
+                    raise ValueError("title is missing")
+                elif end_dt <= start_dt:
+                    raise ValueError("end_time is not after start_time")
+
+                valid.append((position, event_data, start_dt, end_dt))
+
+            except Exception as e:
+                results[position] = {
+                    "status": "error",
+                    "message": f"Invalid event: {e}",
+                    "data": event_data,
+                }
+
+        # One agenda per date, all dates fetched together.
+        days = sorted({start_dt.date() for _, _, start_dt, _ in valid})
+        snapshots = await CalendarBackendHelper.get_agendas(
+            context=context, days=days, account_id=account_id
+        )
+
+        async def find_conflict(event_data: object, snapshot: any):
+            if isinstance(snapshot, Exception):
+                raise snapshot
+
+            return await CalendarBackendHelper.find_conflict(
+                context=context,
+                event_data=event_data,
+                snapshot=snapshot,
+                account_id=account_id,
+            )
+
+        reasons = await asyncio.gather(
+            *(
+                find_conflict(event_data, snapshots[start_dt.date()])
+                for _, event_data, start_dt, _ in valid
+            ),
+            return_exceptions=True,
+        )
+
+        # Events of the same batch must not overlap each other either, earlier ones win.
+        accepted = {}  # Date -> IntervalIndex of the events accepted so far.
+        to_create = []
+
+        for (position, event_data, start_dt, end_dt), reason in zip(valid, reasons):
+            if isinstance(reason, Exception):
+                results[position] = {"status": "error", "message": str(reason), "data": event_data}
+                continue
+
+            index = accepted.setdefault(start_dt.date(), IntervalIndex())
+            other = index.find_overlap(start_dt, end_dt)
+
+            if reason is None and other is not None:
+                reason = f"Overlaps with '{other.title}' of the same request."
+
+            if reason is not None:
+                logger.info(f"BatchHelper process_events() conflict reason: {reason}")
+                results[position] = {
+                    "status": "conflict",
+                    "message": "Conflict with existing agendas.",
+                    "reason": reason,
+                    "data": event_data,
+                }
+                continue
+
+            index.add(AgendaEntry(start_dt, end_dt, event_data.get("title")))
+            to_create.append((position, event_data))
+
+        latencies = await CalendarBackendHelper.append_events(
+            context=context,
+            events=[event_data for _, event_data in to_create],
+            account_id=account_id,
+        )
+
+        for (position, event_data), latency in zip(to_create, latencies):
+            if isinstance(latency, Exception):
+                results[position] = {"status": "error", "message": str(latency), "data": event_data}
+            else:
+                results[position] = {
+                    "status": "success",
+                    "data": event_data,
+                    "save_latency_ms": round(latency),
+                }
+
+        return results
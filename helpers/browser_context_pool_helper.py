@@ -0,0 +1,264 @@
+import os
+import json
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from helpers.google_calendar_helper import GoogleCalendarHelper, SignInRequiredError
+from helpers.page_pool_helper import PagePoolHelper
+from helpers.playwright_helper import PlaywrightHelper
+from helpers.storage_helper import DEFAULT_ACCOUNT, StorageHelper
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+MAX_BROWSER_CONTEXTS = int(os.environ.get("MAX_BROWSER_CONTEXTS", "8"))
+
+browser_context_pool = None
+
+
+class BrowserContextPool:
+    """One Chromium process with a lazily created context per account, least recently used first out."""
+
+    def __init__(self, max_contexts: int = MAX_BROWSER_CONTEXTS):
+        self.max_contexts = max_contexts
+        self.browser = None
+        self.contexts = OrderedDict()  # account_id -> BrowserContext, least recently used first.
+        self.leases = {}  # account_id -> number of requests using its context.
+        self.locks = {}  # account_id -> lock, so one context is created per account.
+        self.sign_ins = {}  # account_id -> task waiting for someone to sign the account in.
+        self.evictions = 0
+        self.restarts = 0
+
+    async def start(self):
+        if self.browser is None:
+            self.browser = await PlaywrightHelper.launch()
+
+    def is_connected(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    async def restart(self):
+        # The browser crashed or was killed: drop its contexts and launch a new one. Sessions
+        # come back from the storage states saved before the crash.
+        logger.warning(f"BrowserContextPool restart() live contexts: {len(self.contexts)}")
+
+        self.restarts += 1
+        browser, self.browser = self.browser, None
+
+        for account_id in list(self.contexts.keys()):
+            await self.close_context(account_id, save=False)
+
+        if browser is not None:
+            try:
+                await browser.close()
+
+            except Exception as e:
+                logger.warning(f"BrowserContextPool restart() e: {e}")
+
+        await self.start()
+
+    async def get_context(
+        self, account_id: str, touch: bool = True, create: bool = True, sign_in: bool = False
+    ):
+        context = self.contexts.get(account_id)
+
+        if context is None and not create:
+            raise LookupError(f"BrowserContextPool get_context() no live context: {account_id}")
+        elif context is None:
+            StorageHelper.check_account(account_id)
+            context = await self.new_context(account_id, sign_in=sign_in)
+
+        if touch:
+            self.contexts.move_to_end(account_id)
+
+        return context
+
+    async def new_context(self, account_id: str, sign_in: bool = False):
+        """
+        A context from the account's saved session. When the account has to sign in, only
+        sign_in=True waits for it, others get a SignInRequiredError at once: a request never
+        waits on someone at the browser window.
+        """
+        lock = self.locks.setdefault(account_id, asyncio.Lock())
+
+        async with lock:
+            context = self.contexts.get(account_id)
+
+            if context is not None:
+                return context
+            elif GoogleCalendarHelper.get_session_state(account_id) == "signing_in":
+                raise SignInRequiredError(
+                    f"BrowserContextPool new_context() waiting for a sign in: {account_id}"
+                )
+
+            await self.start()
+            context = await PlaywrightHelper.new_context(
+                browser=self.browser, account_id=account_id
+            )
+
+            try:
+                await GoogleCalendarHelper.init(context=context, account_id=account_id)
+                self.contexts[account_id] = context
+
+                return context
+
+            except SignInRequiredError:
+                if not sign_in:
+                    await context.close()
+
+                    if account_id != DEFAULT_ACCOUNT:
+                        self.start_sign_in(account_id)  # The default one signs in on warm-up.
+
+                    raise
+
+                GoogleCalendarHelper.set_session_state(account_id, "signing_in")
+
+            except BaseException:
+                await context.close()
+                raise
+
+        # Outside of the lock, the account's requests fail fast meanwhile.
+        try:
+            await GoogleCalendarHelper.init(context=context, account_id=account_id, sign_in=True)
+
+        except BaseException:
+            GoogleCalendarHelper.set_session_state(account_id, "signed_out")
+            await context.close()
+            raise
+
+        self.contexts[account_id] = context
+
+        return context
+
+    def start_sign_in(self, account_id: str):
+        task = self.sign_ins.get(account_id)
+
+        if task is None or task.done():
+            self.sign_ins[account_id] = asyncio.ensure_future(self.sign_in(account_id))
+
+    async def sign_in(self, account_id: str):
+        # Off the request path, for an account that has to sign in again.
+        try:
+            await self.get_context(account_id, touch=False, sign_in=True)
+
+        except Exception as e:
+            logger.warning(f"BrowserContextPool sign_in() account_id: {account_id}, e: {e}")
+
+    @asynccontextmanager
+    async def acquire(
+        self, account_id: str, touch: bool = True, create: bool = True, sign_in: bool = False
+    ):
+        # Background work passes touch=False and create=False, so it neither keeps an idle
+        # account alive nor brings an evicted one back.
+        context = await self.get_context(account_id, touch=touch, create=create, sign_in=sign_in)
+        self.leases[account_id] = self.leases.get(account_id, 0) + 1
+
+        try:
+            await self.evict_idle()
+
+            yield context
+
+        finally:
+            self.leases[account_id] -= 1
+
+            if self.leases[account_id] == 0:
+                del self.leases[account_id]
+                await self.evict_idle()
+
+    async def evict_idle(self):
+        # Contexts in use are never evicted, so the cap can be exceeded while they are busy.
+        while len(self.contexts) > self.max_contexts:
+            account_id = next(
+                (account_id for account_id in self.contexts if account_id not in self.leases),
+                None,
+            )
+
+            if account_id is None:
+                return
+
+            self.evictions += 1
+            await self.close_context(account_id)
+
+    async def save_state(self, account_id: str):
+        context = self.contexts.get(account_id)
+
+        if context is None:
+            return False
+
+        storage_state_path = StorageHelper.get_path("state", account_id)
+        os.makedirs(os.path.dirname(storage_state_path) or ".", exist_ok=True)
+        state = await context.storage_state()
+
+        # Written aside then renamed, a crash mid-write must not lose the saved session.
+        with open(f"{storage_state_path}.tmp", "w") as file:
+            json.dump(state, file)
+
+        os.replace(f"{storage_state_path}.tmp", storage_state_path)
+
+        return True
+
+    async def close_context(self, account_id: str, save: bool = True):
+        if account_id not in self.contexts:
+            return
+
+        logger.info(f"BrowserContextPool close_context() account_id: {account_id}, save: {save}")
+
+        if save:
+            try:
+                await self.save_state(account_id)  # Keep the session for next time.
+
+            except Exception as e:
+                logger.warning(f"BrowserContextPool close_context() e: {e}")
+
+        context = self.contexts.pop(account_id)
+        await PagePoolHelper.close(context)
+
+        try:
+            await context.close()
+
+        except Exception as e:
+            logger.warning(f"BrowserContextPool close_context() e: {e}")
+
+    async def close(self):
+        for task in self.sign_ins.values():
+            task.cancel()
+
+        for account_id in list(self.contexts.keys()):
+            await self.close_context(account_id)
+
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+
+    def stats(self):
+        return {
+            "live": len(self.contexts),
+            "max": self.max_contexts,
+            "in_use": len(self.leases),
+            "evictions": self.evictions,
+            "restarts": self.restarts,
+        }
+
+
+class BrowserContextPoolHelper:
+    def get():
+        global browser_context_pool
+
+        if browser_context_pool is None:
+            browser_context_pool = BrowserContextPool()
+
+        return browser_context_pool
+
+    def acquire(account_id: str, touch: bool = True, create: bool = True, sign_in: bool = False):
+        return BrowserContextPoolHelper.get().acquire(
+            account_id, touch=touch, create=create, sign_in=sign_in
+        )
+
+    def get_live_accounts():
+        return list(BrowserContextPoolHelper.get().contexts.keys())
+
+    async def close():
+        if browser_context_pool is not None:
+            await browser_context_pool.close()
+
+    def stats():
+        return BrowserContextPoolHelper.get().stats()
@@ -0,0 +1,124 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+
+class TTLCache:
+    """In-memory LRU cache whose entries also expire after a fixed time to live."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (expires_at, value), least recently used first.
+        self.generations = {}  # Bumped on invalidation so in-flight loads cannot store stale data.
+        self.inflight = {}  # key -> task of the load in progress, shared by concurrent callers.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.joins = 0
+
+    def get(self, key: any):
+        entry = self.entries.get(key)
+
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]  # Expired.
+
+            self.misses += 1
+
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return entry[1]
+
+    def peek(self, key: any):
+        # Like get() but without touching recency or the hit/miss counters.
+        entry = self.entries.get(key)
+
+        return None if entry is None or entry[0] <= time.monotonic() else entry[1]
+
+    def generation(self, key: any):
+        return self.generations.get(key, 0)
+
+    def put(self, key: any, value: any, generation: int = None):
+        if generation is not None and generation != self.generation(key):
+            return False  # Invalidated while the value was being loaded.
+
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+        return True
+
+    def replace(self, key: any, value: any):
+        # Update a live entry in place, keeping its expiry; in-flight loads become stale.
+        entry = self.entries.get(key)
+
+        if entry is None or entry[0] <= time.monotonic():
+            self.invalidate(key)
+
+            return False
+
+        self.generations[key] = self.generation(key) + 1
+        self.entries[key] = (entry[0], value)
+
+        return True
+
+    def invalidate(self, key: any):
+        self.generations[key] = self.generation(key) + 1
+        self.entries.pop(key, None)
+
+    def expires_in(self, key: any):
+        entry = self.entries.get(key)
+
+        return None if entry is None else entry[0] - time.monotonic()
+
+    async def get_or_load(self, key: any, loader: any):
+        """
+        Returns the cached value, otherwise awaits loader() and caches its result.
+        Concurrent callers of the same key share one load (single flight); a caller that is
+        cancelled does not cancel the load for the others.
+        """
+        value = self.get(key)
+
+        if value is not None:
+            return value
+
+        task = self.inflight.get(key)
+
+        if task is None:
+            generation = self.generation(key)
+            task = asyncio.ensure_future(loader())
+            self.inflight[key] = task
+
+            def finish(task: asyncio.Task):
+                if self.inflight.get(key) is task:
+                    del self.inflight[key]
+
+                if not task.cancelled() and task.exception() is None:
+                    self.put(key, task.result(), generation=generation)
+
+            task.add_done_callback(finish)
+        else:
+            self.joins += 1
+
+        return await asyncio.shield(task)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "single_flight_joins": self.joins,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
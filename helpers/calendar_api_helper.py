@@ -0,0 +1,471 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import urllib.parse
+from collections import deque
+from datetime import date, datetime, timedelta
+import httpx
+from helpers.agenda_cache_helper import AgendaCacheHelper
+from helpers.interval_index_helper import AgendaEntry, IntervalIndex
+from helpers.storage_helper import DEFAULT_ACCOUNT, StorageHelper
+from helpers.log_helper import LogHelper
+from helpers.metrics_helper import MetricsHelper
+
+logger = LogHelper.get_logger(__name__)
+
+GOOGLE_CALENDAR_API_URL = os.environ.get(
+    "GOOGLE_CALENDAR_API_URL", "https://www.googleapis.com/calendar/v3"
+).rstrip("/")
+GOOGLE_CALENDAR_ID = os.environ.get("GOOGLE_CALENDAR_ID", "primary")
+GOOGLE_OAUTH_TOKEN_URL = os.environ.get(
+    "GOOGLE_OAUTH_TOKEN_URL", "https://oauth2.googleapis.com/token"
+)
+# IANA name such as "Asia/Shanghai" the event times are in, the server's own zone when empty.
+CALENDAR_TIME_ZONE = os.environ.get("CALENDAR_TIME_ZONE") or None
+CALENDAR_API_MAX_CONNECTIONS = int(os.environ.get("CALENDAR_API_MAX_CONNECTIONS", "10"))
+CALENDAR_API_TIMEOUT_SECONDS = float(os.environ.get("CALENDAR_API_TIMEOUT_SECONDS", "10"))
+CALENDAR_API_BATCH_SIZE = 50  # Most requests one batch call may hold.
+TOKEN_REFRESH_MARGIN_SECONDS = 60  # Refresh access tokens this long before they expire.
+
+# e.g. https://www.googleapis.com/batch/calendar/v3 for https://www.googleapis.com/calendar/v3.
+api_url = urllib.parse.urlparse(GOOGLE_CALENDAR_API_URL)
+BATCH_URL = f"{api_url.scheme}://{api_url.netloc}/batch{api_url.path}"
+EVENTS_PATH = f"{api_url.path}/calendars/{urllib.parse.quote(GOOGLE_CALENDAR_ID)}/events"
+EVENTS_URL = f"{api_url.scheme}://{api_url.netloc}{EVENTS_PATH}"
+
+# One pooled keep-alive client for every account, like the OpenAI one.
+calendarHttpClient = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=CALENDAR_API_MAX_CONNECTIONS,
+        max_keepalive_connections=CALENDAR_API_MAX_CONNECTIONS,
+    ),
+    timeout=httpx.Timeout(CALENDAR_API_TIMEOUT_SECONDS, connect=5.0),
+)
+
+tokens = {}  # account_id -> (access_token, expires_at).
+token_locks = {}  # account_id -> lock, so one refresh runs per account.
+api_latencies_ms = deque(maxlen=500)  # Latest insert latencies for the stats.
+api_stats = {"agenda_reads": 0, "inserts": 0, "batches": 0, "token_refreshes": 0}
+
+
+class CalendarApiError(Exception):
+    pass
+
+
+class CalendarApiHelper:
+    def get_zone():
+        if CALENDAR_TIME_ZONE is None:
+            return None  # astimezone() then uses the server's zone.
+
+        from zoneinfo import ZoneInfo
+
+        return ZoneInfo(CALENDAR_TIME_ZONE)
+
+    def to_rfc3339(value: datetime):
+        zone = CalendarApiHelper.get_zone()
+
+        if zone is not None:
+            return value.replace(tzinfo=zone).isoformat()
+
+        return value.astimezone().isoformat()
+
+    def from_rfc3339(value: str):
+        # Naive local time, the way the rest of the app compares times.
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+        return parsed.astimezone(CalendarApiHelper.get_zone()).replace(tzinfo=None)
+
+    def get_credentials(account_id: str = DEFAULT_ACCOUNT):
+        """
+        {"access_token"} or {"client_id", "client_secret", "refresh_token"} of the account.
+        The default account reads them from the environment, others from a JSON file.
+        """
+        if account_id is None or account_id == DEFAULT_ACCOUNT:
+            return {
+                "access_token": os.environ.get("GOOGLE_CALENDAR_ACCESS_TOKEN"),
+                "client_id": os.environ.get("GOOGLE_CLIENT_ID"),
+                "client_secret": os.environ.get("GOOGLE_CLIENT_SECRET"),
+                "refresh_token": os.environ.get("GOOGLE_REFRESH_TOKEN"),
+            }
+
+        path = StorageHelper.get_path("credentials", account_id)
+
+        if not os.path.exists(path):
+            raise CalendarApiError(
+                f"CalendarApiHelper get_credentials() no credentials file: {path}"
+            )
+
+        with open(path) as file:
+            return json.load(file)
+
+    async def get_token(account_id: str = DEFAULT_ACCOUNT, refresh: bool = False):
+        token = tokens.get(account_id)
+
+        if token is not None and not refresh and token[1] > time.time():
+            return token[0]
+
+        async with token_locks.setdefault(account_id, asyncio.Lock()):
+            token = tokens.get(account_id)
+
+            if token is not None and not refresh and token[1] > time.time():
+                return token[0]
+
+            credentials = CalendarApiHelper.get_credentials(account_id)
+
+            if credentials.get("refresh_token"):
+                response = await calendarHttpClient.post(
+                    GOOGLE_OAUTH_TOKEN_URL,
+                    data={
+                        "grant_type": "refresh_token",
+                        "client_id": credentials.get("client_id"),
+                        "client_secret": credentials.get("client_secret"),
+                        "refresh_token": credentials["refresh_token"],
+                    },
+                )
+
+                if response.status_code != 200:
+                    raise CalendarApiError(
+                        f"CalendarApiHelper get_token() refresh failed: {response.status_code}"
+                    )
+
+                body = response.json()
+                expires_in = body.get("expires_in", 3600) - TOKEN_REFRESH_MARGIN_SECONDS
+                tokens[account_id] = (body["access_token"], time.time() + expires_in)
+                api_stats["token_refreshes"] += 1
+            elif credentials.get("access_token"):
+                tokens[account_id] = (credentials["access_token"], float("inf"))
+            else:
+                raise CalendarApiError(
+                    f"CalendarApiHelper get_token() no credentials for account: {account_id}"
+                )
+
+            return tokens[account_id][0]
+
+    async def request(method: str, url: str, account_id: str = DEFAULT_ACCOUNT, **kwargs):
+        # Retried once with a fresh token when the current one was revoked or expired early.
+        headers = kwargs.pop("headers", {})
+
+        for attempt in range(2):
+            token = await CalendarApiHelper.get_token(account_id, refresh=attempt > 0)
+            response = await calendarHttpClient.request(
+                method, url, headers={**headers, "Authorization": f"Bearer {token}"}, **kwargs
+            )
+
+            if response.status_code != 401:
+                break
+
+        if response.status_code >= 400:
+            raise CalendarApiError(
+                f"CalendarApiHelper request() {method} {url}: {response.status_code} {response.text}"
+            )
+
+        return response
+
+    async def init(account_id: str = DEFAULT_ACCOUNT):
+        # Fails early when the account has no usable credentials.
+        logger.info(f"CalendarApiHelper init() account_id: {account_id}")
+
+        await CalendarApiHelper.get_token(account_id)
+
+    def is_live(account_id: str):
+        return account_id in tokens
+
+    def get_live_accounts():
+        return list(tokens.keys())
+
+    def to_snapshot(day: date, entries: list, all_day_titles: list):
+        # Same shape as the snapshots scraped by GoogleCalendarHelper.get_agenda().
+        header = f"{day:%A, %B} {day.day}, {day.year}"
+        rows = [{"heading": header}]
+        rows += [{"text": f"All day {title}"} for title in all_day_titles]
+        rows += [
+            {"text": f"{entry.start:%H:%M} – {entry.end:%H:%M} {entry.title}"} for entry in entries
+        ]
+
+        lines = [row["text"] for row in rows[1:]] or ["No events"]
+
+        return {
+            "schedule_text": "\n".join([header] + lines),
+            "rows": rows,
+            "index": IntervalIndex(entries),
+        }
+
+    async def list_events(start: datetime, end: datetime, account_id: str = DEFAULT_ACCOUNT):
+        items = []
+        params = {
+            "timeMin": CalendarApiHelper.to_rfc3339(start),
+            "timeMax": CalendarApiHelper.to_rfc3339(end),
+            "singleEvents": "true",
+            "orderBy": "startTime",
+            "maxResults": "250",
+            "fields": "items(summary,start,end,status,transparency),nextPageToken",
+        }
+
+        while True:
+            response = await CalendarApiHelper.request(
+                "GET", EVENTS_URL, account_id=account_id, params=params
+            )
+            body = response.json()
+            items += body.get("items", [])
+
+            if not body.get("nextPageToken"):
+                return items
+
+            params["pageToken"] = body["nextPageToken"]
+
+    async def get_agendas(
+        days: list, refresh: bool = False, account_id: str = DEFAULT_ACCOUNT
+    ):
+        """
+        Returns {day: snapshot} of the given dates. The dates missing from the cache are read
+        with a single range request, whatever their number.
+        """
+        snapshots = {}
+
+        for day in days:
+            snapshot = None if refresh else AgendaCacheHelper.get(day, account_id)
+
+            if snapshot is not None:
+                snapshots[day] = snapshot
+
+        missing = sorted(set(days) - set(snapshots))
+
+        if not missing:
+            return snapshots
+
+        generations = {day: AgendaCacheHelper.generation(day, account_id) for day in missing}
+        range_start = datetime.combine(missing[0], datetime.min.time())
+        range_end = datetime.combine(missing[-1] + timedelta(days=1), datetime.min.time())
+
+        with MetricsHelper.span("agenda_api"):
+            items = await CalendarApiHelper.list_events(range_start, range_end, account_id)
+
+        api_stats["agenda_reads"] += 1
+        entries = {day: [] for day in missing}
+        all_day_titles = {day: [] for day in missing}
+
+        for item in items:
+            if item.get("status") == "cancelled" or item.get("transparency") == "transparent":
+                continue  # Free time does not block a slot.
+
+            title = item.get("summary", "")
+
+            if "date" in item.get("start", {}):
+                start_day = date.fromisoformat(item["start"]["date"])
+                end_day = date.fromisoformat(item["end"]["date"])  # Exclusive.
+
+                for day in missing:
+                    if start_day <= day < end_day:
+                        all_day_titles[day].append(title)
+
+                continue
+
+            start = CalendarApiHelper.from_rfc3339(item["start"]["dateTime"])
+            end = CalendarApiHelper.from_rfc3339(item["end"]["dateTime"])
+            day = start.date()
+
+            while day <= end.date():  # Listed under every date it touches.
+                if day in entries and (end > datetime.combine(day, datetime.min.time())):
+                    entries[day].append(AgendaEntry(start, end, title))
+
+                day += timedelta(days=1)
+
+        for day in missing:
+            snapshots[day] = CalendarApiHelper.to_snapshot(day, entries[day], all_day_titles[day])
+            AgendaCacheHelper.put(
+                day, snapshots[day], account_id=account_id, generation=generations[day]
+            )
+
+        return snapshots
+
+    def to_resource(event_data: object):
+        # The Calendar REST event format.
+        if event_data is None or "title" not in event_data:
+            raise ValueError(
+                f"CalendarApiHelper to_resource() invalid event_data: {event_data}"
+            )
+
+        def to_time(value: str):
+            value = datetime.fromisoformat(value).replace(tzinfo=None)
+
+            if CALENDAR_TIME_ZONE is not None:
+                return {"dateTime": value.isoformat(), "timeZone": CALENDAR_TIME_ZONE}
+
+            return {"dateTime": CalendarApiHelper.to_rfc3339(value)}
+
+        return {
+            "summary": event_data.get("title", ""),
+            "start": to_time(event_data["start_time"]),
+            "end": to_time(event_data.get("end_time") or event_data["start_time"]),
+        }
+
+    async def append_event(event_data: object, account_id: str = DEFAULT_ACCOUNT):
+        # Returns the time the calendar took to confirm the insert, in ms.
+        logger.debug("CalendarApiHelper append_event() event_data: %s", event_data)
+
+        resource = CalendarApiHelper.to_resource(event_data)
+        started = time.perf_counter()
+
+        with MetricsHelper.span("insert_api"):
+            await CalendarApiHelper.request(
+                "POST", EVENTS_URL, account_id=account_id, json=resource
+            )
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        api_stats["inserts"] += 1
+        api_latencies_ms.append(latency_ms)
+        AgendaCacheHelper.record_event(event_data, account_id)
+
+        return latency_ms
+
+    async def append_events(events: list, account_id: str = DEFAULT_ACCOUNT):
+        """
+        Insert several events with batch requests of up to CALENDAR_API_BATCH_SIZE inserts.
+        Returns one latency in ms or Exception per event, in the order given.
+        """
+        results = [None] * len(events)
+        parts = []  # (position, resource)
+
+        for position, event_data in enumerate(events):
+            try:
+                parts.append((position, CalendarApiHelper.to_resource(event_data)))
+
+            except Exception as e:
+                results[position] = e
+
+        for offset in range(0, len(parts), CALENDAR_API_BATCH_SIZE):
+            chunk = parts[offset : offset + CALENDAR_API_BATCH_SIZE]
+            boundary = f"batch_{uuid.uuid4().hex}"
+            body = CalendarApiHelper.encode_multipart(
+                [
+                    (
+                        f"item{position}",
+                        "application/http",
+                        f"POST {EVENTS_PATH}\r\nContent-Type: application/json\r\n\r\n"
+                        + json.dumps(resource, ensure_ascii=False),
+                    )
+                    for position, resource in chunk
+                ],
+                boundary,
+            )
+            started = time.perf_counter()
+
+            try:
+                with MetricsHelper.span("insert_api"):
+                    response = await CalendarApiHelper.request(
+                        "POST",
+                        BATCH_URL,
+                        account_id=account_id,
+                        content=body,
+                        headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+                    )
+
+            except Exception as e:
+                for position, _ in chunk:
+                    results[position] = e
+
+                continue
+
+            latency_ms = (time.perf_counter() - started) * 1000
+            api_stats["batches"] += 1
+            answers = {}
+
+            for headers, payload in CalendarApiHelper.split_multipart(
+                response.headers.get("Content-Type", ""), response.content
+            ):
+                content_id = headers.get("content-id", "").strip("<>").replace("response-", "")
+                answers[content_id] = CalendarApiHelper.parse_http_message(payload)
+
+            for position, _ in chunk:
+                status_line, _, answer = answers.get(f"item{position}", ("", {}, ""))
+                status = status_line.split(" ")[1] if status_line.count(" ") >= 1 else ""
+
+                if status.startswith("2"):
+                    api_stats["inserts"] += 1
+                    api_latencies_ms.append(latency_ms)
+                    AgendaCacheHelper.record_event(events[position], account_id)
+                    results[position] = latency_ms
+                else:
+                    results[position] = CalendarApiError(
+                        f"CalendarApiHelper append_events() {status_line or 'no answer'} {answer}"
+                    )
+
+        return results
+
+    def encode_multipart(parts: list, boundary: str):
+        # parts: (content_id, content_type, payload) in the multipart/mixed form of batch calls.
+        lines = []
+
+        for content_id, content_type, payload in parts:
+            lines += [
+                f"--{boundary}",
+                f"Content-Type: {content_type}",
+                f"Content-ID: <{content_id}>",
+                "",
+                payload,
+            ]
+
+        lines.append(f"--{boundary}--")
+
+        return "\r\n".join(lines).encode("utf-8")
+
+    def split_multipart(content_type: str, body: bytes):
+        # Returns [(lower-cased headers, payload)] of a multipart/mixed body.
+        boundary = None
+
+        for param in content_type.split(";")[1:]:
+            key, _, value = param.strip().partition("=")
+
+            if key.lower() == "boundary":
+                boundary = value.strip('"')
+
+        if boundary is None:
+            raise CalendarApiError(
+                f"CalendarApiHelper split_multipart() no boundary: {content_type}"
+            )
+
+        parts = []
+
+        for chunk in body.decode("utf-8").split(f"--{boundary}")[1:]:
+            if chunk.startswith("--"):
+                break  # Closing delimiter.
+
+            _, headers, payload = CalendarApiHelper.parse_http_message(
+                "start\r\n" + chunk.lstrip("\r\n")
+            )
+            parts.append((headers, payload))
+
+        return parts
+
+    def parse_http_message(message: str):
+        # Returns (start_line, lower-cased headers, body) of an HTTP message held in a batch part.
+        head, _, body = message.replace("\r\n", "\n").partition("\n\n")
+        lines = head.split("\n")
+        headers = {}
+
+        for line in lines[1:]:
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        return lines[0].strip(), headers, body.strip()
+
+    def stats():
+        latencies = sorted(api_latencies_ms)
+
+        def percentile(ratio: float):
+            if not latencies:
+                return None
+
+            return latencies[min(len(latencies) - 1, int(ratio * len(latencies)))]
+
+        return {
+            **api_stats,
+            "accounts": len(tokens),
+            "insert_p50_ms": percentile(0.5),
+            "insert_p95_ms": percentile(0.95),
+        }
+
+    async def close():
+        await calendarHttpClient.aclose()
@@ -0,0 +1,403 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from helpers.agenda_parser_helper import AgendaParserHelper
+from helpers.browser_context_pool_helper import BrowserContextPoolHelper
+from helpers.calendar_api_helper import CalendarApiHelper
+from helpers.google_calendar_helper import GoogleCalendarHelper
+from helpers.open_ai_helper import OpenAIHelper
+from helpers.page_pool_helper import PagePoolHelper
+from helpers.storage_helper import DEFAULT_ACCOUNT, StorageHelper
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+# "playwright" drives Google Calendar in Chrome, "api" talks to the Calendar REST API directly.
+CALENDAR_BACKEND = os.environ.get("CALENDAR_BACKEND", "playwright").lower()
+
+conflict_prompt_stats = {"requests": 0, "full_chars": 0, "compact_chars": 0}
+
+
+class ConflictError(Exception):
+    """The new event overlaps the agenda, as opposed to the check itself failing."""
+
+    def __init__(self, message: str, reason: str = None):
+        super().__init__(message)
+        self.reason = reason
+
+
+class PlaywrightCalendarBackend:
+    """The calendar's web pages in Chrome, one browser context per account."""
+
+    name = "playwright"
+
+    async def start(self):
+        # Launches the browser and waits for the default account to sign in if needed.
+        async with BrowserContextPoolHelper.acquire(DEFAULT_ACCOUNT, sign_in=True) as context:
+            await PagePoolHelper.init(context=context)  # Keep warm calendar tabs.
+
+    def acquire(self, account_id: str, touch: bool = True, create: bool = True):
+        return BrowserContextPoolHelper.acquire(account_id, touch=touch, create=create)
+
+    def get_live_accounts(self):
+        return BrowserContextPoolHelper.get_live_accounts()
+
+    async def get_agendas(
+        self, context: any, days: list, refresh: bool = False, account_id: str = DEFAULT_ACCOUNT
+    ):
+        # One page per date, loaded side by side on pooled pages.
+        snapshots = await asyncio.gather(
+            *(
+                GoogleCalendarHelper.get_agenda(
+                    context=context, day=day, refresh=refresh, account_id=account_id
+                )
+                for day in days
+            ),
+            return_exceptions=True,
+        )
+
+        return dict(zip(days, snapshots))
+
+    async def append_event(self, context: any, event_data: object, account_id: str):
+        return await GoogleCalendarHelper.append_event(
+            context=context, event_data=event_data, account_id=account_id
+        )
+
+    async def append_events(self, context: any, events: list, account_id: str):
+        return await asyncio.gather(
+            *(self.append_event(context, event_data, account_id) for event_data in events),
+            return_exceptions=True,
+        )
+
+    def is_ready(self):
+        return (
+            BrowserContextPoolHelper.get().is_connected()
+            and GoogleCalendarHelper.get_session_state(DEFAULT_ACCOUNT) == "signed_in"
+        )
+
+    def get_health(self):
+        pool = BrowserContextPoolHelper.get()
+
+        return {
+            "browser": {"connected": pool.is_connected(), "restarts": pool.restarts},
+            "sessions": {
+                account_id: GoogleCalendarHelper.get_session_state(account_id)
+                for account_id in [DEFAULT_ACCOUNT, *pool.contexts]
+            },
+            "page_pool": PagePoolHelper.get_state(),
+        }
+
+    async def check(self):
+        """
+        Relaunch a dead browser and drop the contexts whose session expired.
+        Returns True when the default account has to be warmed up again.
+        """
+        pool = BrowserContextPoolHelper.get()
+
+        if pool.browser is None:
+            return False  # Not launched yet, the warm-up does it.
+        elif not pool.is_connected():
+            await pool.restart()
+
+            return True
+
+        warm_up = False
+
+        for account_id, context in list(pool.contexts.items()):
+            if GoogleCalendarHelper.get_session_state(account_id) == "signing_in":
+                continue  # Someone is signing in right now.
+
+            try:
+                if await GoogleCalendarHelper.is_signed_in(context):
+                    continue
+
+            except Exception as e:
+                logger.warning(
+                    f"PlaywrightCalendarBackend check() account_id: {account_id}, e: {e}"
+                )
+                continue  # A network hiccup is no proof of an expired session.
+
+            logger.warning(
+                f"PlaywrightCalendarBackend check() session expired, account_id: {account_id}"
+            )
+            GoogleCalendarHelper.set_session_state(account_id, "expired")
+            await pool.close_context(account_id, save=False)
+            warm_up = warm_up or account_id == DEFAULT_ACCOUNT
+
+        return warm_up
+
+    async def save_states(self):
+        # Refresh the saved sessions, so a crash or a restart resumes from recent cookies.
+        pool = BrowserContextPoolHelper.get()
+        saved = 0
+
+        for account_id in list(pool.contexts.keys()):
+            if GoogleCalendarHelper.get_session_state(account_id) != "signed_in":
+                continue
+
+            try:
+                saved += 1 if await pool.save_state(account_id) else 0
+
+            except Exception as e:
+                logger.warning(
+                    f"PlaywrightCalendarBackend save_states() account_id: {account_id}, e: {e}"
+                )
+
+        return saved
+
+    def stats(self):
+        return {
+            "append_event": GoogleCalendarHelper.stats(),
+            "navigation": PagePoolHelper.stats(),
+            "browser_contexts": BrowserContextPoolHelper.stats(),
+        }
+
+    async def close(self):
+        await BrowserContextPoolHelper.close()  # Also saves each account's session.
+
+
+class ApiCalendarBackend:
+    """The Calendar REST API over pooled keep-alive connections, no browser at all."""
+
+    name = "api"
+
+    async def start(self):
+        await CalendarApiHelper.init(DEFAULT_ACCOUNT)
+
+    @asynccontextmanager
+    async def acquire(self, account_id: str, touch: bool = True, create: bool = True):
+        # The account id is all the API calls need, the token is looked up per call.
+        if not CalendarApiHelper.is_live(account_id):
+            if not create:
+                raise LookupError(f"ApiCalendarBackend acquire() no live account: {account_id}")
+
+            StorageHelper.check_account(account_id)
+            await CalendarApiHelper.init(account_id)
+
+        yield account_id
+
+    def get_live_accounts(self):
+        return CalendarApiHelper.get_live_accounts()
+
+    async def get_agendas(
+        self, context: any, days: list, refresh: bool = False, account_id: str = DEFAULT_ACCOUNT
+    ):
+        # Every date in a single range request.
+        try:
+            return await CalendarApiHelper.get_agendas(days, refresh=refresh, account_id=account_id)
+
+        except Exception as e:
+            return {day: e for day in days}
+
+    async def append_event(self, context: any, event_data: object, account_id: str):
+        return await CalendarApiHelper.append_event(event_data, account_id=account_id)
+
+    async def append_events(self, context: any, events: list, account_id: str):
+        return await CalendarApiHelper.append_events(events, account_id=account_id)
+
+    def is_ready(self):
+        return CalendarApiHelper.is_live(DEFAULT_ACCOUNT)
+
+    def get_health(self):
+        return {
+            "sessions": {
+                account_id: "signed_in" for account_id in CalendarApiHelper.get_live_accounts()
+            }
+        }
+
+    async def check(self):
+        # Refresh the tokens about to expire off the request path.
+        for account_id in CalendarApiHelper.get_live_accounts():
+            try:
+                await CalendarApiHelper.get_token(account_id)
+
+            except Exception as e:
+                logger.warning(f"ApiCalendarBackend check() account_id: {account_id}, e: {e}")
+
+        return False
+
+    async def save_states(self):
+        return 0  # Nothing to save, the credentials come from the environment or a file.
+
+    def stats(self):
+        return {"calendar_api": CalendarApiHelper.stats()}
+
+    async def close(self):
+        await CalendarApiHelper.close()
+
+
+calendar_backend = ApiCalendarBackend() if CALENDAR_BACKEND == "api" else PlaywrightCalendarBackend()
+
+
+class CalendarBackendHelper:
+    """
+    What the app needs from a calendar, whichever backend serves it: agendas of dates,
+    conflict checks and event inserts. `context` is the handle acquire() yields.
+    """
+
+    def get():
+        return calendar_backend
+
+    async def start():
+        logger.info(f"CalendarBackendHelper start() backend: {calendar_backend.name}")
+
+        await calendar_backend.start()
+
+    def acquire(account_id: str, touch: bool = True, create: bool = True):
+        # Background work passes touch=False and create=False, so it neither keeps an idle
+        # account alive nor brings an evicted one back.
+        return calendar_backend.acquire(account_id, touch=touch, create=create)
+
+    def get_live_accounts():
+        return calendar_backend.get_live_accounts()
+
+    def is_ready():
+        return calendar_backend.is_ready()
+
+    def get_health():
+        return {"backend": calendar_backend.name, **calendar_backend.get_health()}
+
+    async def check():
+        return await calendar_backend.check()
+
+    async def save_states():
+        return await calendar_backend.save_states()
+
+    async def get_agenda(
+        context: any, day: date, refresh: bool = False, account_id: str = DEFAULT_ACCOUNT
+    ):
+        # Returns {"schedule_text": str, "rows": list, "index": IntervalIndex or None} of the date.
+        snapshot = (
+            await calendar_backend.get_agendas(context, [day], refresh=refresh, account_id=account_id)
+        )[day]
+
+        if isinstance(snapshot, Exception):
+            raise snapshot
+
+        return snapshot
+
+    async def get_agendas(
+        context: any, days: list, refresh: bool = False, account_id: str = DEFAULT_ACCOUNT
+    ):
+        # Returns {day: snapshot or Exception}, so one failed date does not fail the others.
+        return await calendar_backend.get_agendas(
+            context, days, refresh=refresh, account_id=account_id
+        )
+
+    def get_time_range(event_data: object):
+        # Naive datetimes, the calendar shows wall-clock times.
+        start_dt = datetime.fromisoformat(event_data.get("start_time")).replace(tzinfo=None)
+        end_dt = datetime.fromisoformat(event_data.get("end_time")).replace(tzinfo=None)
+
+        return start_dt, end_dt
+
+    async def find_conflict(
+        context: any,
+        event_data: object,
+        snapshot: dict = None,
+        account_id: str = DEFAULT_ACCOUNT,
+    ):
+        """
+        Returns the reason why the new event conflicts with the agenda of its date, or None.
+        Answered locally from the parsed agenda, the model is only asked when parsing failed.
+        """
+        start_dt, end_dt = CalendarBackendHelper.get_time_range(event_data)
+
+        if snapshot is None:
+            snapshot = await CalendarBackendHelper.get_agenda(
+                context=context, day=start_dt.date(), account_id=account_id
+            )
+
+        if snapshot["index"] is not None:
+            conflict = snapshot["index"].find_overlap(start_dt, end_dt)
+
+            if conflict is None:
+                return None
+
+            return f"Overlaps with '{conflict.title}' ({conflict.start:%H:%M} - {conflict.end:%H:%M})."
+
+        logger.info("CalendarBackendHelper find_conflict() Agenda not parsed, asking the model.")
+
+        # Only the rows around the new event, not the whole page.
+        schedule_text = AgendaParserHelper.get_window(
+            snapshot.get("rows"), start_dt.date(), start_dt, end_dt
+        )
+
+        if schedule_text is None:
+            schedule_text = snapshot["schedule_text"]
+
+        conflict_prompt_stats["requests"] += 1
+        conflict_prompt_stats["full_chars"] += len(snapshot["schedule_text"])
+        conflict_prompt_stats["compact_chars"] += len(schedule_text)
+
+        conflict_data = await OpenAIHelper.get_conflict(
+            schedule_text=schedule_text, event_data=event_data
+        )
+
+        if not conflict_data.get("conflict"):
+            return None
+
+        return conflict_data.get("reason") or "Conflict with existing agendas."
+
+    async def check_conflict(
+        context: any,
+        event_data: object,
+        user_text: str,
+        result_json: object,
+        account_id: str = DEFAULT_ACCOUNT,
+    ):
+        logger.debug(
+            "CalendarBackendHelper check_conflict() event_data: %s, user_text: %s, result_json: %s",
+            event_data,
+            user_text,
+            result_json,
+        )
+
+        if context is None:
+            raise ValueError("CalendarBackendHelper check_conflict() calendar context is None.")
+        elif event_data is None:
+            raise ValueError("CalendarBackendHelper check_conflict() event_data is None.")
+
+        # Failures of the check itself, e.g. OpenAI being down, propagate as they are.
+        reason = await CalendarBackendHelper.find_conflict(
+            context=context, event_data=event_data, account_id=account_id
+        )
+
+        if reason is not None:
+            logger.info(f"CalendarBackendHelper check_conflict() conflict reason: {reason}")
+
+            raise ConflictError("Conflict with existing agendas.", reason=reason)
+
+        logger.info(
+            "CalendarBackendHelper check_conflict() No conflict detected. Proceeding to create event."
+        )
+
+    async def append_event(
+        context: any, event_data: object, account_id: str = DEFAULT_ACCOUNT
+    ):
+        # Returns the time the calendar took to confirm the new event, in ms.
+        return await calendar_backend.append_event(context, event_data, account_id)
+
+    async def append_events(context: any, events: list, account_id: str = DEFAULT_ACCOUNT):
+        # Returns one latency in ms or Exception per event, in the order given.
+        return await calendar_backend.append_events(context, events, account_id)
+
+    def stats():
+        requests = conflict_prompt_stats["requests"]
+
+        def average(key: str):
+            return conflict_prompt_stats[key] / requests if requests else None
+
+        return {
+            **calendar_backend.stats(),
+            # Agenda size sent to the conflict model, against the whole agenda.
+            "conflict_prompt": {
+                "requests": requests,
+                "avg_full_chars": average("full_chars"),
+                "avg_compact_chars": average("compact_chars"),
+            },
+        }
+
+    async def close():
+        await calendar_backend.close()
@@ -1,170 +1,517 @@
+import os
 import re
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+
+EXTRACTION_CONFIDENCE_THRESHOLD = float(
+    os.environ.get("EXTRACTION_CONFIDENCE_THRESHOLD", "0.8")
+)
+
+CN_DIGITS = {
+    "零": 0,
+    "〇": 0,
+    "一": 1,
+    "二": 2,
+    "两": 2,
+    "三": 3,
+    "四": 4,
+    "五": 5,
+    "六": 6,
+    "七": 7,
+    "八": 8,
+    "九": 9,
+}
+CN_UNITS = {"十": 10, "百": 100}
+WEEKDAYS_CN = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+WEEKDAYS_EN = {
+    "monday": 0,
+    "tuesday": 1,
+    "wednesday": 2,
+    "thursday": 3,
+    "friday": 4,
+    "saturday": 5,
+    "sunday": 6,
+}
+AM_PERIODS = ("凌晨", "早上", "早晨", "上午", "今早", "明早", "am", "a.m.")
+# Hours are pushed into the afternoon when one of these periods is in effect.
+PM_PERIODS = ("中午", "下午", "傍晚", "晚上", "夜里", "今晚", "明晚", "pm", "p.m.")
+# "晚上12点" is midnight at the end of the day, not noon.
+NIGHT_PERIODS = ("晚上", "夜里", "今晚", "明晚")
+
+NUM = r"[0-9０-９]+|[零〇一二两三四五六七八九十百]+"
+
+# Compiled once at import, every request reuses them.
+REGEX_RELATIVE_DATE = re.compile(
+    r"大后天|后天|明天|明日|明早|明晚|今天|今日|今早|今晚|day after tomorrow|tomorrow|today|tonight",
+    re.IGNORECASE,
+)
+REGEX_WEEKDAY_CN = re.compile(r"(下+)?(?:周|星期|礼拜)([一二三四五六日天])")
+REGEX_WEEKDAY_EN = re.compile(
+    r"\b(next\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    re.IGNORECASE,
+)
+REGEX_MONTH_DAY = re.compile(rf"(?:({NUM})\s*月\s*)?({NUM})\s*[日号]")
+REGEX_PERIOD = re.compile(
+    r"凌晨|早上|早晨|上午|中午|下午|傍晚|晚上|夜里|今早|明早|今晚|明晚"
+)
+# A number is only read as the minutes with 分 or right after the hour, "3点 2个人" is 3:00.
+REGEX_TIME_CN = re.compile(
+    rf"({NUM})\s*([点时:：])\s*(半|一刻|三刻|(?:{NUM})\s*分|(?<=[点时:：])(?:{NUM}))?"
+)
+# "at 10" only without minutes, "at 10:30" is the hh:mm alternative with its "at".
+REGEX_TIME_EN = re.compile(
+    r"\b(?:at\s+)?(\d{1,2})(?::(\d{2}))?\s*(a\.?m\.?|p\.?m\.?)(?![a-z])"
+    r"|\b(?:at\s+)?(\d{1,2}):(\d{2})\b"
+    r"|\bat\s+(\d{1,2})\b(?![:.]\d)",
+    re.IGNORECASE,
+)
+# e.g. "10–11" in "Monday 10–11 standup", not part of a date like "2026-10-20".
+REGEX_TIME_BARE_RANGE = re.compile(
+    r"(?<![\d\-–—:/.])(\d{1,2})\s*[–—-]\s*(\d{1,2})(?![\d\-–—:/.])"
+)
+REGEX_CLAUSE_SEPARATOR = re.compile(
+    r"[，,;；。\n]|然后|还有|另外|\band then\b|\bthen\b", re.IGNORECASE
+)
+# The end may carry its own period, e.g. "上午11点到下午1点".
+REGEX_RANGE_CONNECTOR = re.compile(
+    r"^\s*(?:到|至|-|–|—|~|～|to|until|till)\s*"
+    r"(?:凌晨|早上|早晨|上午|中午|下午|傍晚|晚上|夜里)?\s*$",
+    re.IGNORECASE,
+)
+REGEX_DURATION_CN = re.compile(
+    rf"(?:({NUM})\s*个?\s*(半)?\s*(?:小时|钟头)|(半)\s*(?:个)?\s*(?:小时|钟头)|({NUM})\s*分钟)"
+)
+REGEX_DURATION_EN = re.compile(
+    r"\bfor\s+(\d+(?:\.\d+)?|an?|one|two|three)\s*(hours?|hrs?|minutes?|mins?)\b",
+    re.IGNORECASE,
+)
+REGEX_FILLERS = re.compile(
+    r"给我的?.*?(?:加上|添加|加)(?:一个)?|帮我|请|提醒我|日程安排|安排一?个?|日程|"
+    r"\b(?:please|add|schedule|create|put|set up|an? event|on my calendar|to my calendar|for|from)\b",
+    re.IGNORECASE,
+)
+REGEX_TITLE_TRIM = re.compile(r"^[\s,，.。:：、!！?？的]+|[\s,，.。:：、!！?？的]+$")
+# Connectors left at the edges once the times are gone, e.g. "开会从" or "开会，大概".
+REGEX_TITLE_CONNECTORS = re.compile(
+    r"^(?:从|自|到|至|大概|大约|差不多)+"
+    r"|(?:从|自|到|至|大概|大约|约|差不多|左右|持续|一共|总共)+$|[，,、]\s*开$"
+)
+
+extraction_stats = {"fast_path": 0, "llm_fallback": 0}
 
 
 class ExtractionHelper:
-    # Convert Chinese numbers to Integers (Simple mapping for 0-99)
+    # Convert Chinese numbers to Integers, e.g. "十" -> 10, "二十三" -> 23, "一百零五" -> 105.
     def cn_to_int(cn_str):
         if cn_str is None:
             return 0
-        elif cn_str.isdigit():
+
+        cn_str = cn_str.strip().translate(str.maketrans("０１２３４５６７８９", "0123456789"))
+
+        if cn_str.isdigit():
             return int(cn_str)
 
-        cn_map = {
-            "一": 1,
-            "二": 2,
-            "三": 3,
-            "四": 4,
-            "五": 5,
-            "六": 6,
-            "七": 7,
-            "八": 8,
-            "九": 9,
-            "十": 10,
-            "两": 2,
-        }
-        if cn_str in cn_map:
-            return cn_map[cn_str]
-        # Handle '十一' to '十九'
-        if len(cn_str) > 1 and cn_str.startswith("十"):
-            return 10 + (cn_map.get(cn_str[1], 0) if len(cn_str) > 1 else 0)
-        # Handle '二十' to '二十X'
-        if len(cn_str) > 1 and cn_str.startswith("二") and "十" in cn_str:  # e.g. 二十
-            val = 20
-            if cn_str.endswith("十"):
-                return val
-
-            return val + cn_map.get(cn_str.split("十")[-1], 0)
-
-        return 0
-
-    def parse_text_to_event(user_text):
-        now = datetime.now()
-        # Note: Ignore scenario like 'reference_time' in Demo.
-        target_date = now.date()
-
-        if "明天" in user_text:
-            target_date += timedelta(days=1)
-        elif "大后天" in user_text:
-            target_date += timedelta(days=3)
-        elif "后天" in user_text:
-            target_date += timedelta(days=2)
-        elif "今天" in user_text:
-            pass  # Do nothing.
-
-        # 3. Extract Time Points (Looking for X点 or X:XX)
-        # Pattern looks for digits or Chinese numbers followed by "点" or ":"
-        regex_time = r"(上午|下午|晚上)?\s*([0-9]+|[一二三四五六七八九十]+)[:点]?([0-9]+)?"
-
-        # We scan the text specifically for "X点" or time formats to identify start/end
-        matches = list(re.finditer(regex_time, user_text))
-
-        start_hour = 9  # Default start if not found (9 AM)
-        end_hour = 10  # Default end
-        start_minute = 0
-        end_minute = 0
+        total = 0
+        digit = None
 
-        if matches:
-            # First match is Start Time
-            s_num = matches[0].group(1)
-            start_hour = ExtractionHelper.cn_to_int(s_num)
-
-            # Handle "PM" logic loosely (if '下午' or '晚上' appears before the number)
-            # A robust system would check the index of "下午" relative to the match
-            if "下午" in user_text and start_hour < 12:
-                start_hour += 12
-            elif "晚上" in user_text and start_hour < 12:
-                start_hour += 12
-
-            # Determine End Time
-            if len(matches) >= 2:
-                # Case A: "10点到11点" (Explicit End Time)
-                e_num = matches[1].group(1)
-                end_hour = ExtractionHelper.cn_to_int(e_num)
-
-                if (
-                    end_hour < start_hour
-                ):  # Assume PM if end is smaller (e.g. 10am to 2pm)
-                    end_hour += 12
+        for char in cn_str:
+            if char in CN_DIGITS:
+                digit = CN_DIGITS[char]
+            elif char in CN_UNITS:
+                total += (1 if digit is None else digit) * CN_UNITS[char]
+                digit = None
             else:
-                # Case B: Check for Duration (e.g. "一个小时", "2 hours")
-                dur_match = re.search(r"([0-9]+|[一二三四五六七八九十两]+)\s*个?小时", user_text)
-                if dur_match:
-                    duration = ExtractionHelper.cn_to_int(dur_match.group(1))
-                    end_hour = start_hour + duration
-                else:
-                    # Default to 1 hour duration if only start time is given
-                    end_hour = start_hour + 1
-
-        # 4. Construct Datetime Objects
-        start_dt = datetime(
-            target_date.year,
-            target_date.month,
-            target_date.day,
-            start_hour,
-            start_minute,
-        )
-        end_dt = datetime(
-            target_date.year, target_date.month, target_date.day, end_hour, end_minute
+                return 0
+
+        return total + (digit or 0)
+
+    def parse_minute(minute_str):
+        if not minute_str:
+            return 0
+        elif minute_str == "半":
+            return 30
+        elif minute_str == "一刻":
+            return 15
+        elif minute_str == "三刻":
+            return 45
+
+        return ExtractionHelper.cn_to_int(minute_str.rstrip("分").strip())
+
+    def parse_date(user_text: str, now: datetime, default_date: date = None):
+        # Returns (date, explicit, matched spans).
+        text = user_text.lower()
+        spans = []
+        target_date = None
+
+        match = REGEX_RELATIVE_DATE.search(text)
+
+        if match:
+            keyword = match.group(0)
+            offsets = {"大后天": 3, "后天": 2, "day after tomorrow": 2}
+            offset = offsets.get(keyword)
+
+            if offset is None:
+                offset = 1 if keyword.startswith("明") or keyword == "tomorrow" else 0
+
+            target_date = now.date() + timedelta(days=offset)
+            spans.append(match.span())
+
+        for match in list(REGEX_WEEKDAY_CN.finditer(user_text)) + list(
+            REGEX_WEEKDAY_EN.finditer(user_text)
+        ):
+            weekday_key = match.group(2)
+            weekday = WEEKDAYS_CN.get(weekday_key, WEEKDAYS_EN.get(weekday_key.lower()))
+            weeks_ahead = len(match.group(1).strip()) if match.group(1) else 0
+
+            if match.group(1) and match.group(1).lower().startswith("next"):
+                weeks_ahead = 1
+
+            if weeks_ahead:
+                monday = now.date() - timedelta(days=now.weekday())
+                candidate = monday + timedelta(weeks=weeks_ahead, days=weekday)
+            else:
+                candidate = now.date() + timedelta(days=(weekday - now.weekday()) % 7)
+
+            if target_date is not None and target_date != candidate:
+                return target_date, None, spans  # Conflicting date keywords.
+
+            target_date = candidate
+            spans.append(match.span())
+
+        match = REGEX_MONTH_DAY.search(user_text)
+
+        if match:
+            month = ExtractionHelper.cn_to_int(match.group(1)) if match.group(1) else now.month
+            day = ExtractionHelper.cn_to_int(match.group(2))
+
+            try:
+                candidate = now.date().replace(month=month, day=day)
+
+                if candidate < now.date():
+                    candidate = (
+                        candidate.replace(year=candidate.year + 1)
+                        if match.group(1)
+                        else (candidate + timedelta(days=31)).replace(day=day)
+                    )
+
+            except ValueError:
+                return target_date, None, spans
+
+            if target_date is not None and target_date != candidate:
+                return target_date, None, spans
+
+            target_date = candidate
+            spans.append(match.span())
+
+        if target_date is None:
+            if default_date is not None:
+                return default_date, True, spans  # Date of the previous event.
+
+            return now.date(), False, spans  # Default to today.
+
+        return target_date, True, spans
+
+    def find_times(user_text: str):
+        """
+        Returns [(start, end, hour, minute, meridiem or None, bare_minute)] ordered by position.
+        bare_minute is True for minutes read from a number without 分, e.g. "3点15".
+        """
+        times = []
+
+        # English first, so "1:30pm" keeps its meridiem instead of matching as a bare "1:30".
+        for match in REGEX_TIME_EN.finditer(user_text):
+            if match.group(1) is not None:
+                meridiem = "pm" if match.group(3).lower().startswith("p") else "am"
+                hour, minute = int(match.group(1)), int(match.group(2) or 0)
+            elif match.group(4) is not None:
+                meridiem = None
+                hour, minute = int(match.group(4)), int(match.group(5))
+            else:
+                meridiem = None
+                hour, minute = int(match.group(6)), 0
+
+            times.append((match.start(), match.end(), hour, minute, meridiem, False))
+
+        for match in REGEX_TIME_CN.finditer(user_text):
+            if any(start <= match.start() < end for start, end, *_ in times):
+                continue
+
+            hour = ExtractionHelper.cn_to_int(match.group(1))
+            minute = ExtractionHelper.parse_minute(match.group(3))
+            bare_minute = (
+                match.group(2) in "点时"
+                and match.group(3) is not None
+                and match.group(3) not in ("半", "一刻", "三刻")
+                and not match.group(3).endswith("分")
+            )
+            times.append((match.start(), match.end(), hour, minute, None, bare_minute))
+
+        for match in REGEX_TIME_BARE_RANGE.finditer(user_text):
+            for group in (1, 2):
+                if not any(start <= match.start(group) < end for start, end, *_ in times):
+                    hour = int(match.group(group))
+                    times.append((match.start(group), match.end(group), hour, 0, None, False))
+
+        return sorted(times)
+
+    def get_period(user_text: str, start: int, previous_end: int):
+        # The period marker closest before this time, not crossing the previous time expression.
+        periods = [
+            match
+            for match in REGEX_PERIOD.finditer(user_text, previous_end, start)
+            if match.end() <= start
+        ]
+
+        return periods[-1].group(0) if periods else None
+
+    def to_24_hour(hour: int, period: str):
+        if period is None:
+            return hour
+        elif period in AM_PERIODS:
+            return 0 if hour == 12 else hour
+        elif period == "中午":
+            return hour if hour >= 11 else hour + 12
+        elif period in NIGHT_PERIODS and hour == 12:
+            return 24  # Midnight, 00:00 of the next day.
+        elif period in PM_PERIODS:
+            return hour + 12 if hour < 12 else hour
+
+        return hour
+
+    def find_duration(user_text: str):
+        # Returns (minutes, span) or (None, None).
+        match = REGEX_DURATION_CN.search(user_text)
+
+        if match:
+            if match.group(3):
+                return 30, match.span()
+            elif match.group(4):
+                return ExtractionHelper.cn_to_int(match.group(4)), match.span()
+
+            hours = ExtractionHelper.cn_to_int(match.group(1))
+
+            return hours * 60 + (30 if match.group(2) else 0), match.span()
+
+        match = REGEX_DURATION_EN.search(user_text)
+
+        if match:
+            words = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3}
+            amount = words.get(match.group(1).lower())
+            amount = float(match.group(1)) if amount is None else amount
+            unit = 60 if match.group(2).lower().startswith("h") else 1
+
+            return int(amount * unit), match.span()
+
+        return None, None
+
+    def parse_text_to_event(user_text, now: datetime = None, default_date: date = None):
+        """
+        Rule-based extraction of a single event.
+        Returns the event dict with a "confidence" in [0, 1]; low values should go to the model.
+        """
+        now = now or datetime.now()
+        confidence = 0.0
+        spans = []
+
+        target_date, date_explicit, date_spans = ExtractionHelper.parse_date(
+            user_text, now, default_date
         )
+        spans += date_spans
+
+        if date_explicit is None:
+            confidence -= 0.4  # Contradicting date keywords.
+        else:
+            confidence += 0.3 if date_explicit else 0.15
 
-        # 5. Extract Title (Remove time keywords from text to leave the subject)
-        # This removes words like "明天", "10点", "到", etc. to clean up the title.
-        clean_text = user_text
-        remove_patterns = [
-            r"明天|后天|今天",
-            r"上午|下午|晚上",
-            r"[0-9一二三四五六七八九十两]+\s*(点|:|：|个?小时)",
-            r"\s*到\s*",
-            r"日程安排",
-            r"给我的.*加上",
+        times = ExtractionHelper.find_times(user_text)
+        # A time inside a duration ("一个半小时") or a date ("20号") is not a clock time.
+        times = [
+            time
+            for time in times
+            if not any(start <= time[0] < end for start, end in date_spans)
         ]
-        for p in remove_patterns:
-            clean_text = re.sub(p, "", clean_text)
 
-        # Clean up punctuation and whitespace
-        title = clean_text.strip(" ,，.。")
+        if not times:
+            return {"title": "", "start_time": None, "end_time": None, "confidence": 0.0}
+
+        # Start time, with the AM/PM marker that belongs to this match.
+        start_pos, start_end, start_hour, start_minute, start_meridiem, bare_minute = times[0]
+        start_period = start_meridiem or ExtractionHelper.get_period(user_text, start_pos, 0)
+
+        if start_period is None and len(times) >= 2 and times[1][4] is not None:
+            # "2–3pm" shares the end's meridiem unless that would put the start after the end.
+            start_period = times[1][4]
+
+            if (start_hour % 12) > (times[1][2] % 12):
+                start_period = "am" if start_period == "pm" else "pm"
+        spans.append((start_pos, start_end))
+
+        if start_period is not None or start_hour >= 13 or start_hour == 0:
+            confidence += 0.3
+        elif 8 <= start_hour <= 12:
+            confidence += 0.25  # Office hours without a marker are read as morning / noon.
+        else:
+            start_period = "下午"  # "3点" without a marker almost always means 3 PM.
+            confidence += 0.1
+
+        start_hour = ExtractionHelper.to_24_hour(start_hour, start_period)
+
+        # End time, either "X到Y" or a duration.
+        end_hour = None
+        end_minute = 0
+
+        if len(times) >= 2 and REGEX_RANGE_CONNECTOR.match(user_text[start_end : times[1][0]]):
+            end_pos, end_end, end_hour, end_minute, end_meridiem, end_bare_minute = times[1]
+            bare_minute = bare_minute or end_bare_minute
+            end_period = (
+                end_meridiem
+                or ExtractionHelper.get_period(user_text, end_pos, start_end)
+                or start_period  # "下午2点到4点" shares the start's period.
+            )
+            end_hour = ExtractionHelper.to_24_hour(end_hour, end_period)
+
+            if end_hour * 60 + end_minute <= start_hour * 60 + start_minute and end_hour < 12:
+                end_hour += 12  # "10点到2点" ends in the afternoon.
+
+                if end_period is None:
+                    confidence -= 0.1  # Guessed across noon without any marker.
+
+            spans.append((start_end, end_end))
+            confidence += 0.2
+            duration, duration_span = ExtractionHelper.find_duration(user_text)
+
+            if duration:
+                # "十点到十二点，开一个半小时": the range wins, the duration said otherwise.
+                spans.append(duration_span)
+
+                if duration != (end_hour * 60 + end_minute) - (start_hour * 60 + start_minute):
+                    confidence -= 0.3
+        else:
+            duration, duration_span = ExtractionHelper.find_duration(user_text)
+
+            if duration:
+                end_total = start_hour * 60 + start_minute + duration
+                end_hour, end_minute = divmod(end_total, 60)
+                spans.append(duration_span)
+                confidence += 0.2
+            else:
+                end_hour, end_minute = start_hour + 1, start_minute  # Default to one hour.
+                confidence += 0.05
+
+        if not (0 <= start_hour <= 24 and 0 <= start_minute <= 59 and end_minute <= 59):
+            return {"title": "", "start_time": None, "end_time": None, "confidence": 0.0}
 
-        # 6. Build Result
-        result = {
+        day_start = datetime(target_date.year, target_date.month, target_date.day)
+        start_dt = day_start + timedelta(hours=start_hour, minutes=start_minute)
+        end_dt = day_start + timedelta(hours=end_hour, minutes=end_minute)
+
+        if end_dt <= start_dt:
+            confidence -= 0.5
+
+        if bare_minute:
+            confidence -= 0.1  # "3点2" may as well be 3:00 followed by a number of something.
+
+        # A clock time that is neither the start nor the end, e.g. "下午两点开会到四点": the
+        # rules misread the sentence, let the model have it.
+        for time in times:
+            if not any(start <= time[0] < end for start, end in spans):
+                confidence -= 0.3
+
+        # Title: what is left after removing dates, times, durations and filler words.
+        remaining = list(user_text)
+
+        for start, end in spans:
+            for position in range(start, end):
+                remaining[position] = " "
+
+        clean_text = "".join(remaining)
+        clean_text = REGEX_PERIOD.sub(" ", clean_text)
+        clean_text = REGEX_DURATION_CN.sub(" ", clean_text)
+        clean_text = REGEX_DURATION_EN.sub(" ", clean_text)
+        clean_text = REGEX_FILLERS.sub(" ", clean_text)
+        clean_text = re.sub(r"\s*(?:到|至)\s*|\s+to\s+", " ", clean_text)
+        clean_text = re.sub(r"\s*([，,。、；;])\s*", r"\1", re.sub(r"\s+", " ", clean_text))
+        title = None
+
+        while title != clean_text:
+            title = clean_text
+            clean_text = REGEX_TITLE_CONNECTORS.sub("", REGEX_TITLE_TRIM.sub("", clean_text)).strip()
+
+        title = clean_text
+        title = re.sub(r"^(?:和|跟|与|去|要)?\s*", "", title) if len(title) > 2 else title
+
+        if len(title) >= 2:
+            confidence += 0.2
+        elif title:
+            confidence += 0.05
+
+        return {
             "title": title,
             "start_time": start_dt.isoformat(),  # Returns format 'YYYY-MM-DDTHH:MM:SS'
             "end_time": end_dt.isoformat(),
+            "confidence": round(max(0.0, min(1.0, confidence)), 2),
         }
 
-        return result
-
-
-# --- Testing the function ---
-
-# Test Case 1: Standard request
-# text1 = "给我的谷歌日历加上一个日程安排，明天上午十点到 11 点，和公司 CEO 会议。"
-# print(f"Input: {text1}")
-# print(
-#     json.dumps(
-#         ExtractionHelper.parse_text_to_event(text1), indent=2, ensure_ascii=False
-#     )
-# )
-
-# print("-" * 20)
-
-# # Test Case 2: Duration based ("One hour")
-# text2 = "明天十点开会一个小时，讨论产品架构"
-# print(f"Input: {text2}")
-# print(
-#     json.dumps(
-#         ExtractionHelper.parse_text_to_event(text2), indent=2, ensure_ascii=False
-#     )
-# )
-
-# print("-" * 20)
-
-# # Test Case 3: Informal / Mixed numbers ("明早十点")
-# text3 = "明早十点去见客户"
-# print(f"Input: {text3}")
-# print(
-#     json.dumps(
-#         ExtractionHelper.parse_text_to_event(text3), indent=2, ensure_ascii=False
-#     )
-# )
+    def parse_text_to_events(user_text, now: datetime = None):
+        """
+        Rule-based extraction of several events, e.g. "周一上午10点到11点站会，周二下午2点到3点评审".
+        The text is split into clauses, one per clock time; clauses without a time continue the
+        previous event. Events without a date inherit the date of the event before them.
+        """
+        now = now or datetime.now()
+        clauses = []
+        lead_in = ""
+
+        for clause in REGEX_CLAUSE_SEPARATOR.split(user_text):
+            if not clause or not clause.strip():
+                continue
+            elif ExtractionHelper.find_times(clause):
+                clauses.append(clause)
+            elif clauses:
+                clauses[-1] += f"，{clause}"  # The title goes on after a comma.
+            else:
+                lead_in += f"{clause} "  # e.g. "明天帮我加两个日程", only its date is used.
+
+        if not clauses:
+            return []
+
+        default_date, date_explicit, _ = ExtractionHelper.parse_date(lead_in, now)
+        default_date = default_date if date_explicit else None
+        events = []
+
+        for clause in clauses:
+            event = ExtractionHelper.parse_text_to_event(
+                clause, now=now, default_date=default_date
+            )
+            events.append(event)
+
+            if event.get("start_time"):
+                default_date = datetime.fromisoformat(event["start_time"]).date()
+
+        return events
+
+    def to_event_data(event: dict):
+        # Same shape as the model's answer, so the rest of the pipeline does not care who produced it.
+        return {key: event[key] for key in ("title", "start_time", "end_time")}
+
+    def to_result_json(event: dict):
+        return json.dumps(ExtractionHelper.to_event_data(event), ensure_ascii=False)
+
+    def is_confident(event: dict):
+        return event.get("confidence", 0.0) >= EXTRACTION_CONFIDENCE_THRESHOLD
+
+    def are_confident(events: list):
+        return bool(events) and all(ExtractionHelper.is_confident(event) for event in events)
+
+    def record(fast_path: bool):
+        extraction_stats["fast_path" if fast_path else "llm_fallback"] += 1
+
+    def stats():
+        total = extraction_stats["fast_path"] + extraction_stats["llm_fallback"]
+
+        return {
+            **extraction_stats,
+            "threshold": EXTRACTION_CONFIDENCE_THRESHOLD,
+            "fast_path_rate": extraction_stats["fast_path"] / total if total else 0.0,
+        }
@@ -1,15 +1,45 @@
-import shutil
+import os
+import uuid
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+AUDIO_MAX_BYTES = int(os.environ.get("AUDIO_MAX_BYTES", str(25 * 1024 * 1024)))  # Whisper's limit.
+AUDIO_READ_CHUNK_BYTES = 256 * 1024
 
 
 class FileHelper:
-    def save(blob: any):
+    async def read(blob: any):
+        # Read the upload into memory, nothing is written to the working directory.
         if blob is None:
-            return None
+            return None, None
+
+        if blob.size is not None and blob.size > AUDIO_MAX_BYTES:
+            raise ValueError(
+                f"FileHelper read() file too large: {blob.size} > {AUDIO_MAX_BYTES} bytes."
+            )
+
+        chunks = []
+        size = 0
+
+        while True:
+            chunk = await blob.read(AUDIO_READ_CHUNK_BYTES)
+
+            if not chunk:
+                break
+
+            size += len(chunk)
+
+            if size > AUDIO_MAX_BYTES:  # The declared size is not trusted.
+                raise ValueError(
+                    f"FileHelper read() file too large: more than {AUDIO_MAX_BYTES} bytes."
+                )
 
-        filename = f"temp_{blob.filename}"
-        print(f"FileHelper save() filename: {filename}")
+            chunks.append(chunk)
 
-        with open(filename, "wb") as buffer:
-            shutil.copyfileobj(blob.file, buffer)  # Save the uploaded file temporarily.
+        # Unique name per request, only the extension of the client's filename is kept.
+        extension = os.path.splitext(blob.filename or "")[1] or ".webm"
+        filename = f"recording_{uuid.uuid4().hex}{extension}"
+        logger.debug(f"FileHelper read() filename: {filename}, size: {size}")
 
-        return filename
+        return filename, b"".join(chunks)
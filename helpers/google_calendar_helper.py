@@ -1,96 +1,194 @@
+import os
+import re
+import time
 import asyncio
 import urllib.parse
-from datetime import datetime
-from helpers.open_ai_helper import OpenAIHelper
-from helpers.storage_helper import StorageHelper
-
-
-STORAGE_STATE_PATH = f"{StorageHelper.get_path('state')}"
+from collections import deque
+from datetime import date
+from helpers.agenda_cache_helper import AgendaCacheHelper
+from helpers.agenda_parser_helper import AgendaParserHelper
+from helpers.page_pool_helper import CALENDAR_HOSTNAME, CALENDAR_URL, PagePoolHelper
+from helpers.storage_helper import DEFAULT_ACCOUNT, StorageHelper
+from playwright.async_api import expect
+from helpers.log_helper import LogHelper
+from helpers.metrics_helper import MetricsHelper
+
+logger = LogHelper.get_logger(__name__)
+
+SAVE_TIMEOUT_MS = int(os.environ.get("SAVE_TIMEOUT_MS", "10000"))
+# The request that saves the event, matched on the path of POSTs to the calendar's host.
+SAVE_REQUEST_PATTERN = re.compile(
+    os.environ.get("SAVE_REQUEST_PATTERN", r"/calendar/u/\d+/r/save\b")
+)
+# The "Event saved" notice, only trusted with its text: an error notice has the same role.
+SAVED_TOAST_SELECTOR = os.environ.get("SAVED_TOAST_SELECTOR", "[role='alert']")
+SAVED_TOAST_TEXT = os.environ.get("SAVED_TOAST_TEXT", "")
+SEEN_ATTRIBUTE = "data-pool-seen"
+SESSION_CHECK_TIMEOUT_MS = 10000
+
+# Agenda rows in page order, day headings and events reduced to their text. Events are the
+# elements with an event id, or the list items when the page has none.
+AGENDA_ROWS_SCRIPT = """
+main => {
+    const eventSelector = main.querySelector("[data-eventid]") ? "[data-eventid]" : "[role='listitem']";
+    const rows = [];
+
+    for (const element of main.querySelectorAll(`[role='heading'], ${eventSelector}`)) {
+        const heading = element.matches("[role='heading']");
+
+        if (!heading && element.parentElement && element.parentElement.closest(eventSelector)) {
+            continue;  // Part of an event row already taken.
+        }
+
+        const text = element.innerText.trim();
+
+        if (text) {
+            rows.push(heading ? { heading: text } : { text: text });
+        }
+    }
+
+    return rows;
+}
+"""
+
+# Mark the notices already on the page, a pooled tab may still show the previous save's.
+MARK_TOASTS_SCRIPT = f"""
+selector => {{
+    document.querySelectorAll(selector).forEach(toast => toast.setAttribute("{SEEN_ATTRIBUTE}", ""));
+}}
+"""
+
+save_latencies_ms = deque(maxlen=500)  # Latest save latencies for the stats.
+session_states = {}  # account_id -> sign in state of its browser context.
+
+
+class SignInRequiredError(Exception):
+    """The account has no valid session, only someone at the browser window can sign it in."""
 
 
 class GoogleCalendarHelper:
-    async def init(context: any):
-        print(f"GoogleCalendarHelper init()")
+    def is_sign_in_url(url: str):
+        return "accounts.google.com" in url or "workspace.google.com" in url
 
-        page = await context.new_page()
-        calenaer_url = "https://calendar.google.com/"
+    async def init(context: any, account_id: str = DEFAULT_ACCOUNT, sign_in: bool = False):
+        """
+        Opens the calendar once to tell whether the context is signed in. Without a session,
+        sign_in=True waits for someone to sign in in the browser window for as long as it
+        takes, otherwise SignInRequiredError is raised at once.
+        """
+        logger.info(f"GoogleCalendarHelper init() account_id: {account_id}, sign_in: {sign_in}")
 
-        await page.goto(calenaer_url)
+        page = await context.new_page()
+        await page.goto(CALENDAR_URL)
 
         try:
             await page.wait_for_load_state(
                 "domcontentloaded"
             )  # Wait until the page was loaded completely.
 
-            signInRequired = (
-                "accounts.google.com" in page.url or "workspace.google.com" in page.url
-            )
-            print(f"initialize_google_calendar() signInRequired: {signInRequired}")
+            signInRequired = GoogleCalendarHelper.is_sign_in_url(page.url)
+            logger.info(f"GoogleCalendarHelper init() signInRequired: {signInRequired}")
+
+            if signInRequired and not sign_in:
+                session_states[account_id] = "signed_out"
+
+                raise SignInRequiredError(
+                    f"GoogleCalendarHelper init() sign in required, account_id: {account_id}"
+                )
 
             if signInRequired:
+                session_states[account_id] = "signing_in"  # Not ready until someone signs in.
                 await page.wait_for_url(
-                    f"{calenaer_url}**", timeout=0
+                    f"{CALENDAR_URL}**", timeout=0
                 )  # 0 timeout means wait indefinitely
+                storage_state_path = StorageHelper.get_path("state", account_id)
+                os.makedirs(os.path.dirname(storage_state_path) or ".", exist_ok=True)
                 await context.storage_state(
-                    path=STORAGE_STATE_PATH
+                    path=storage_state_path
                 )  # Save state after signed in for reuse.
 
+            session_states[account_id] = "signed_in"
+
+        except SignInRequiredError:
+            raise
+
         except Exception as e:
-            print(f"initialize_google_calendar() e: {e}")
+            logger.warning(f"GoogleCalendarHelper init() e: {e}")
+
+            if session_states.get(account_id) == "signing_in":
+                session_states[account_id] = "signed_out"  # The window went away, try again later.
+                raise
 
         finally:
             await page.close()
 
-    async def check_conflict(
-        context: any, event_data: object, user_text: str, result_json: object
-    ):
-        print(
-            f"GoogleCalendarHelper check_conflict() event_data: {event_data}, user_text: {user_text}, result_json: {result_json}"
+    async def is_signed_in(context: any):
+        """
+        Whether the context's session is still valid, without rendering a page: a signed out
+        session is redirected from the calendar to the sign in page.
+        """
+        response = await context.request.get(
+            CALENDAR_URL, max_redirects=0, timeout=SESSION_CHECK_TIMEOUT_MS
         )
+        location = response.headers.get("location")
 
-        if context is None:
-            raise ValueError(
-                "GoogleCalendarHelper check_conflict() browser context is None."
-            )
-        elif event_data is None:
-            raise ValueError(
-                "GoogleCalendarHelper check_conflict() event_data is None."
-            )
+        if not 300 <= response.status < 400 or not location:
+            return response.ok
 
-        page = await context.new_page()
+        location = urllib.parse.urljoin(CALENDAR_URL, location)
 
-        try:
-            start_dt = datetime.fromisoformat(event_data.get("start_time"))
-            # Agenda view for the specific date
-            agenda_url = f"https://calendar.google.com/calendar/u/0/r/agenda/{start_dt.year}/{start_dt.month}/{start_dt.day}"
+        return not GoogleCalendarHelper.is_sign_in_url(location)
+
+    def get_session_state(account_id: str = DEFAULT_ACCOUNT):
+        # "signing_in", "signed_in", "signed_out", "expired", or None before the first check.
+        return session_states.get(account_id)
 
-            await page.goto(agenda_url)
-            await page.wait_for_load_state("domcontentloaded")
+    def set_session_state(account_id: str, state: str):
+        session_states[account_id] = state
 
-            # Wait for the main grid/list to appear
-            main_role = page.locator("div[role='main']")
-            await main_role.wait_for()
+    async def get_agenda(
+        context: any, day: date, refresh: bool = False, account_id: str = DEFAULT_ACCOUNT
+    ):
+        # Returns {"schedule_text": str, "rows": list, "index": IntervalIndex or None} of the date.
+        snapshot = None if refresh else AgendaCacheHelper.get(day, account_id)
 
-            # Extract text from the agenda view which usually contains times and titles of existing events.
-            schedule_text = await main_role.inner_text()
+        if snapshot is not None:
+            logger.debug(f"GoogleCalendarHelper get_agenda() cache hit, day: {day}")
 
-            OpenAIHelper.check_conflict(
-                schedule_text=schedule_text, event_data=event_data
-            )
+            return snapshot
 
-            print(
-                "GoogleCalendarHelper check_conflict() No conflict detected. Proceeding to create event."
-            )
+        generation = AgendaCacheHelper.generation(day, account_id)
+        # Agenda view for the specific date
+        agenda_url = f"{CALENDAR_URL}calendar/u/0/r/agenda/{day.year}/{day.month}/{day.day}"
 
-        except Exception as conflict_err:
-            print(f"GoogleCalendarHelper check_conflict() error: {conflict_err}")
-            raise conflict_err
+        async with PagePoolHelper.get(context).acquire() as page:
+            with MetricsHelper.span("agenda_navigation"):
+                await PagePoolHelper.navigate(page, agenda_url)
 
-        finally:
-            await page.close()
+                # Wait for the main grid/list to appear
+                main_role = page.locator("div[role='main']")
+                await main_role.wait_for()
+
+            with MetricsHelper.span("agenda_scrape"):
+                # Extract text from the agenda view which usually contains times and titles of existing events.
+                schedule_text = await main_role.inner_text()
+                # The same agenda row by row, for a compact conflict prompt.
+                rows = await main_role.evaluate(AGENDA_ROWS_SCRIPT)
 
-    async def append_event(context: any, event_data: object):
-        print(f"GoogleCalendarHelper append_event() event_data: {event_data}")
+        with MetricsHelper.span("agenda_parse"):
+            snapshot = {
+                "schedule_text": schedule_text,
+                "rows": rows,
+                "index": AgendaParserHelper.parse(schedule_text=schedule_text, day=day),
+            }
+        AgendaCacheHelper.put(day, snapshot, account_id=account_id, generation=generation)
+
+        return snapshot
+
+    async def append_event(
+        context: any, event_data: object, account_id: str = DEFAULT_ACCOUNT
+    ):
+        logger.debug("GoogleCalendarHelper append_event() event_data: %s", event_data)
 
         if context is None:
             raise ValueError(
@@ -109,21 +207,121 @@ class GoogleCalendarHelper:
         title = urllib.parse.quote(event_data.get("title", ""))
 
         calendar_url = (
-            f"https://calendar.google.com/calendar/u/0/r/eventedit?"
+            f"{CALENDAR_URL}calendar/u/0/r/eventedit?"
             f"text={title}"
             f"&dates={start_str}/{end_str}"
         )
 
-        page = await context.new_page()
+        async with PagePoolHelper.get(context).acquire() as page:
+            with MetricsHelper.span("eventedit_navigation"):
+                await PagePoolHelper.navigate(page, calendar_url)
 
-        await page.goto(calendar_url)
-        await page.wait_for_load_state("domcontentloaded")
+                save_button = page.get_by_role("button", name="Save")
 
-        save_button = page.get_by_role("button", name="Save")
+                await save_button.wait_for()  # Wait for it to be visible.
+                await expect(save_button).to_be_enabled(timeout=SAVE_TIMEOUT_MS)
 
-        await save_button.wait_for()  # Wait for it to be visible.
-        await asyncio.sleep(1)  # Small delay to ensure interactivity.
-        await save_button.click()
-        await asyncio.sleep(2)  # Wait for saving process completed.
+            with MetricsHelper.span("save_click"):
+                save_latency_ms = await GoogleCalendarHelper.click_save(page, save_button)
+
+        AgendaCacheHelper.record_event(event_data, account_id)  # Keep cached agendas in step with the save.
+        save_latencies_ms.append(save_latency_ms)
+
+        logger.info(
+            f"GoogleCalendarHelper append_event() Event added successfully in {save_latency_ms:.0f} ms."
+        )
 
-        print("GoogleCalendarHelper append_event() Event added successfully.")
+        return save_latency_ms
+
+    async def click_save(page: any, save_button: any):
+        """
+        Returns the time between the click and the first sign of the calendar saving, in ms.
+        The save is confirmed once the calendar accepted it, by its save request or by the
+        saved notice when SAVED_TOAST_TEXT is set, and closed the editor.
+        """
+        def is_save_request(response: any):
+            url = urllib.parse.urlparse(response.url)
+
+            return (
+                response.request.method == "POST"
+                and url.hostname == CALENDAR_HOSTNAME
+                and SAVE_REQUEST_PATTERN.search(url.path) is not None
+            )
+
+        save_response = asyncio.ensure_future(
+            page.wait_for_event("response", predicate=is_save_request, timeout=SAVE_TIMEOUT_MS)
+        )
+        accepted = [save_response]
+
+        if SAVED_TOAST_TEXT:  # Without the text any notice, an error too, would count.
+            await page.evaluate(MARK_TOASTS_SCRIPT, SAVED_TOAST_SELECTOR)
+            toast = page.locator(f"{SAVED_TOAST_SELECTOR}:not([{SEEN_ATTRIBUTE}])")
+            accepted.append(
+                asyncio.ensure_future(
+                    toast.filter(has_text=SAVED_TOAST_TEXT).first.wait_for(timeout=SAVE_TIMEOUT_MS)
+                )
+            )
+
+        left_editor = asyncio.ensure_future(
+            page.wait_for_url(lambda url: "eventedit" not in url, timeout=SAVE_TIMEOUT_MS)
+        )
+        confirmations = accepted + [left_editor]
+        started = time.perf_counter()
+
+        try:
+            await save_button.click()
+
+            # The clock stops at the first sign of the calendar accepting the save.
+            pending = set(accepted)
+            save_latency_ms = None
+
+            while pending and save_latency_ms is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    elif task is save_response and not task.result().ok:
+                        raise RuntimeError(
+                            f"GoogleCalendarHelper click_save() save failed, "
+                            f"status: {task.result().status}"
+                        )
+
+                    save_latency_ms = (time.perf_counter() - started) * 1000
+
+            if save_latency_ms is None:
+                raise TimeoutError(
+                    "GoogleCalendarHelper click_save() save was not confirmed in time."
+                )
+
+            try:
+                await left_editor  # The editor stays open when the save failed.
+
+            except Exception as e:
+                raise TimeoutError(
+                    "GoogleCalendarHelper click_save() editor still open, save not confirmed."
+                ) from e
+
+            return save_latency_ms
+
+        finally:
+            for task in confirmations:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # Mark as retrieved.
+
+    def stats():
+        latencies = sorted(save_latencies_ms)
+
+        def percentile(ratio: float):
+            if not latencies:
+                return None
+
+            return latencies[min(len(latencies) - 1, int(ratio * len(latencies)))]
+
+        return {
+            "count": len(latencies),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+        }
@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+from helpers.calendar_backend_helper import CalendarBackendHelper
+from helpers.transcription_helper import TranscriptionHelper
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.environ.get("HEALTH_CHECK_INTERVAL_SECONDS", "10"))
+# How often the sessions of the signed in accounts are saved to disk, 0 disables it.
+STORAGE_STATE_REFRESH_SECONDS = float(os.environ.get("STORAGE_STATE_REFRESH_SECONDS", "600"))
+
+started_at = time.monotonic()
+warm_up_task = None
+watchdog_task = None
+warm_up_error = None  # Why the latest warm-up failed, None once one succeeded.
+health_stats = {
+    "warm_ups": 0,
+    "warm_up_failures": 0,
+    "recoveries": 0,
+    "state_saves": 0,
+    "checks": 0,
+    "check_errors": 0,
+}
+last_check_at = None
+last_saved_at = time.monotonic()
+
+
+class HealthHelper:
+    def start():
+        # Returns at once, the calendar warms up in the background and /readyz tells when it is done.
+        global watchdog_task
+
+        HealthHelper.warm_up()
+
+        if watchdog_task is None or watchdog_task.done():
+            watchdog_task = asyncio.ensure_future(HealthHelper.run())
+
+    def warm_up():
+        global warm_up_task
+
+        if warm_up_task is not None and not warm_up_task.done():
+            return
+
+        warm_up_task = asyncio.ensure_future(HealthHelper.run_warm_up())
+
+    async def run_warm_up():
+        global warm_up_error
+
+        health_stats["warm_ups"] += 1
+        started = time.perf_counter()
+
+        try:
+            await CalendarBackendHelper.start()  # Waits for the sign in when it is needed.
+
+        except Exception as e:
+            health_stats["warm_up_failures"] += 1
+            warm_up_error = str(e)
+            logger.warning(f"HealthHelper run_warm_up() e: {e}")
+
+            return
+
+        warm_up_error = None
+        logger.info(
+            f"HealthHelper run_warm_up() elapsed_ms: {(time.perf_counter() - started) * 1000:.0f}"
+        )
+
+    def get_warm_up_state():
+        if warm_up_task is None:
+            return "pending"
+        elif not warm_up_task.done():
+            return "running"
+
+        return "failed" if warm_up_error is not None else "done"
+
+    async def stop():
+        global warm_up_task, watchdog_task
+
+        for task in (watchdog_task, warm_up_task):
+            if task is not None:
+                task.cancel()
+
+                try:
+                    await task
+
+                except asyncio.CancelledError:
+                    pass
+
+        warm_up_task = None
+        watchdog_task = None
+
+    async def run():
+        """
+        The watchdog: relaunches a dead browser, drops expired sessions, retries a failed
+        warm-up and saves the sessions of the signed in accounts every so often.
+        """
+        global last_check_at, last_saved_at
+
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL_SECONDS)
+
+            if HealthHelper.get_warm_up_state() == "running":
+                continue  # Possibly waiting for a sign in, leave the browser alone.
+
+            health_stats["checks"] += 1
+            last_check_at = time.monotonic()
+
+            try:
+                if await CalendarBackendHelper.check():
+                    health_stats["recoveries"] += 1
+                    HealthHelper.warm_up()
+                elif HealthHelper.get_warm_up_state() == "failed":
+                    HealthHelper.warm_up()
+
+                if (
+                    STORAGE_STATE_REFRESH_SECONDS > 0
+                    and time.monotonic() - last_saved_at >= STORAGE_STATE_REFRESH_SECONDS
+                ):
+                    health_stats["state_saves"] += await CalendarBackendHelper.save_states()
+                    last_saved_at = time.monotonic()
+
+            except Exception as e:
+                health_stats["check_errors"] += 1
+                logger.warning(f"HealthHelper run() e: {e}")
+
+    def is_ready():
+        return (
+            HealthHelper.get_warm_up_state() == "done"
+            and CalendarBackendHelper.is_ready()
+            and TranscriptionHelper.is_ready()  # The local model, when one is used.
+        )
+
+    def get_state():
+        # Browser, sessions, warm tabs and local model, as reported by /healthz and /readyz.
+        return {
+            "ready": HealthHelper.is_ready(),
+            "uptime_s": round(time.monotonic() - started_at),
+            "warm_up": {"state": HealthHelper.get_warm_up_state(), "error": warm_up_error},
+            "watchdog": {
+                "running": watchdog_task is not None and not watchdog_task.done(),
+                "last_check_s": (
+                    round(time.monotonic() - last_check_at) if last_check_at is not None else None
+                ),
+            },
+            "calendar": CalendarBackendHelper.get_health(),
+            "transcription": {
+                "ready": TranscriptionHelper.is_ready(),
+                "local_model": TranscriptionHelper.get_state(),
+            },
+        }
+
+    def stats():
+        return {**health_stats, "ready": HealthHelper.is_ready()}
@@ -0,0 +1,44 @@
+import bisect
+from collections import namedtuple
+from datetime import datetime
+
+
+AgendaEntry = namedtuple("AgendaEntry", ["start", "end", "title"])
+
+
+class IntervalIndex:
+    """Sorted intervals of one day, answering "does [start, end) overlap anything?" in O(log n)."""
+
+    def __init__(self, entries: list = None):
+        self.entries = sorted(entries or [], key=lambda entry: (entry.start, entry.end))
+        self.rebuild()
+
+    def rebuild(self):
+        self.starts = [entry.start for entry in self.entries]
+        # Position of the entry with the latest end among entries[0..i], for every i.
+        self.latest_end_positions = []
+
+        for position, entry in enumerate(self.entries):
+            if position == 0 or entry.end > self.entries[self.latest_end_positions[-1]].end:
+                self.latest_end_positions.append(position)
+            else:
+                self.latest_end_positions.append(self.latest_end_positions[-1])
+
+    def add(self, entry: AgendaEntry):
+        position = bisect.bisect_right(self.starts, entry.start)
+        self.entries.insert(position, entry)
+        self.rebuild()
+
+    def find_overlap(self, start: datetime, end: datetime):
+        # Only entries starting before the new end can overlap; of those, the one ending last decides.
+        count = bisect.bisect_left(self.starts, end)
+
+        if count == 0:
+            return None
+
+        candidate = self.entries[self.latest_end_positions[count - 1]]
+
+        return candidate if candidate.end > start else None
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,174 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict, deque
+from helpers.page_pool_helper import PAGE_POOL_SIZE
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+# One worker per warm page by default, more would only queue up on the page pool.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", str(PAGE_POOL_SIZE)))
+JOB_QUEUE_MAX_SIZE = int(os.environ.get("JOB_QUEUE_MAX_SIZE", "100"))
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", "600"))  # Finished jobs kept for polling.
+JOB_MAX_WAIT_SECONDS = 30  # Longest a poll may wait for a job to finish.
+
+jobs = OrderedDict()  # Job id -> job, oldest first.
+job_done_events = {}  # Job id -> asyncio.Event set when the job finishes.
+job_queue = None  # Created lazily so it binds to the running event loop.
+job_handler = None
+worker_tasks = []
+wait_times_ms = deque(maxlen=500)  # Latest queue wait times for the stats.
+job_stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueueHelper:
+    def start(handler: any):
+        # handler(**kwargs) is awaited by the workers, its return value is the job's result.
+        global job_queue, job_handler
+
+        if worker_tasks:
+            return
+
+        logger.info(f"JobQueueHelper start() workers: {JOB_WORKERS}")
+
+        job_queue = asyncio.Queue(maxsize=JOB_QUEUE_MAX_SIZE)
+        job_handler = handler
+
+        for number in range(JOB_WORKERS):
+            worker_tasks.append(asyncio.ensure_future(JobQueueHelper.work(number)))
+
+    async def stop():
+        for task in worker_tasks:
+            task.cancel()
+
+        await asyncio.gather(*worker_tasks, return_exceptions=True)
+        worker_tasks.clear()
+
+    def prune():
+        now = time.time()
+
+        while jobs:
+            job_id, job = next(iter(jobs.items()))
+
+            if job["finished_at"] is None or now - job["finished_at"] < JOB_TTL_SECONDS:
+                break  # Jobs finish roughly in order, the rest are younger.
+
+            jobs.pop(job_id)
+            job_done_events.pop(job_id, None)
+
+    def submit(**kwargs):
+        """Queue a job for the workers and return its id, raises QueueFullError when saturated."""
+        if job_queue is None:
+            raise RuntimeError("JobQueueHelper submit() workers are not started.")
+
+        JobQueueHelper.prune()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",  # queued -> running -> done
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+        }
+
+        try:
+            job_queue.put_nowait((job_id, kwargs))
+
+        except asyncio.QueueFull:
+            job_stats["rejected"] += 1
+
+            raise QueueFullError("Too many pending jobs, retry later.")
+
+        jobs[job_id] = job
+        job_done_events[job_id] = asyncio.Event()
+        job_stats["submitted"] += 1
+
+        return job_id
+
+    async def work(number: int):
+        while True:
+            job_id, kwargs = await job_queue.get()
+            job = jobs.get(job_id)
+
+            try:
+                if job is None:
+                    continue
+
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                wait_times_ms.append((job["started_at"] - job["created_at"]) * 1000)
+
+                try:
+                    job["result"] = await job_handler(**kwargs)
+                    job_stats["succeeded"] += 1
+
+                except Exception as e:
+                    logger.warning(f"JobQueueHelper work() worker: {number}, job_id: {job_id}, e: {e}")
+                    job["result"] = {"status": "error", "message": str(e)}
+                    job_stats["failed"] += 1
+
+                job["status"] = "done"
+                job["finished_at"] = time.time()
+                job_done_events[job_id].set()
+
+            finally:
+                job_queue.task_done()
+
+    def get(job_id: str):
+        job = jobs.get(job_id)
+
+        if job is None:
+            return None
+
+        return {
+            **job,
+            "position": JobQueueHelper.get_position(job_id) if job["status"] == "queued" else None,
+        }
+
+    async def wait(job_id: str, timeout: float):
+        # Long polling, returns the job once done or when the timeout elapses.
+        event = job_done_events.get(job_id)
+
+        if event is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(event.wait(), min(timeout, JOB_MAX_WAIT_SECONDS))
+
+            except asyncio.TimeoutError:
+                pass
+
+        return JobQueueHelper.get(job_id)
+
+    def get_position(job_id: str):
+        position = 0
+
+        for other_id, job in jobs.items():
+            if other_id == job_id:
+                return position
+
+            position += 1 if job["status"] == "queued" else 0
+
+        return None
+
+    def stats():
+        waits = sorted(wait_times_ms)
+
+        def percentile(ratio: float):
+            return round(waits[min(len(waits) - 1, int(ratio * len(waits)))]) if waits else None
+
+        return {
+            **job_stats,
+            "workers": len(worker_tasks),
+            "queue_depth": job_queue.qsize() if job_queue is not None else 0,
+            "queue_max_size": JOB_QUEUE_MAX_SIZE,
+            "running": sum(1 for job in jobs.values() if job["status"] == "running"),
+            "wait_p50_ms": percentile(0.5),
+            "wait_p95_ms": percentile(0.95),
+        }
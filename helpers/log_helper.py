@@ -0,0 +1,51 @@
+import os
+import json
+import logging
+
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "logfmt")  # "logfmt" or "json".
+
+configured = False
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record as key=value pairs (or JSON), easy to grep and to ship."""
+
+    def format(self, record: logging.LogRecord):
+        fields = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+
+        if LOG_FORMAT == "json":
+            return json.dumps(fields, ensure_ascii=False)
+
+        return " ".join(
+            f"{key}={json.dumps(value, ensure_ascii=False) if ' ' in str(value) or not str(value) else value}"
+            for key, value in fields.items()
+        )
+
+
+class LogHelper:
+    def get_logger(name: str):
+        global configured
+
+        if not configured:
+            handler = logging.StreamHandler()
+            handler.setFormatter(StructuredFormatter())
+
+            for root in ("main", "helpers", "benchmarks"):
+                logger = logging.getLogger(root)
+                logger.addHandler(handler)
+                logger.setLevel(LOG_LEVEL)
+                logger.propagate = False  # Keep uvicorn's own handlers out of it.
+
+            configured = True
+
+        return logging.getLogger(name)
@@ -0,0 +1,156 @@
+import time
+import bisect
+import contextvars
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+metrics = {}  # Name -> Counter or Histogram, in registration order.
+collectors = []  # Functions returning samples of values owned by other helpers.
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def escape_label(value: any):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: tuple):
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values = {}  # Sorted label pairs -> value.
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(labels)} {value}")
+
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # Sorted label pairs -> [bucket counts..., sum, count].
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        position = bisect.bisect_left(self.buckets, value)
+
+        if position < len(self.buckets):
+            series[position] += 1  # Cumulated when rendered.
+
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+
+        for labels, series in self.values.items():
+            cumulative = 0
+
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}"
+                )
+
+            lines.append(
+                f"{self.name}_bucket{format_labels(labels + (('le', '+Inf'),))} {series[-1]}"
+            )
+            lines.append(f"{self.name}_sum{format_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {series[-1]}")
+
+        return lines
+
+
+class MetricsHelper:
+    def counter(name: str, help: str):
+        if name not in metrics:
+            metrics[name] = Counter(name=name, help=help)
+
+        return metrics[name]
+
+    def histogram(name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        if name not in metrics:
+            metrics[name] = Histogram(name=name, help=help, buckets=buckets)
+
+        return metrics[name]
+
+    def register_collector(collector: any):
+        # collector() returns [(name, type, help, labels dict, value)], read at scrape time.
+        collectors.append(collector)
+
+    def begin_request():
+        # Stage timings of the current request, for its Server-Timing header.
+        timings = []
+        request_timings.set(timings)
+
+        return timings
+
+    @contextmanager
+    def span(stage: str):
+        """Time a pipeline stage into stage_duration_seconds and the request's Server-Timing."""
+        started = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+            elapsed = time.perf_counter() - started
+            stage_duration.observe(elapsed, stage=stage)
+            timings = request_timings.get()
+
+            if timings is not None:
+                timings.append((stage, elapsed))
+
+    def get_route(scope: dict):
+        # The matched route's template, e.g. "/jobs/{job_id}", so ids never become label values.
+        path = getattr(scope.get("route"), "path", None)
+
+        return path if path else "unmatched"
+
+    def get_server_timing(timings: list):
+        return ", ".join(
+            f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings
+        )
+
+    def render():
+        lines = []
+
+        for metric in metrics.values():
+            lines += metric.render()
+
+        families = {}  # Samples of one name must be rendered together.
+
+        for collector in collectors:
+            for name, type, help, labels, value in collector():
+                family = families.setdefault(name, (type, help, []))
+                family[2].append((tuple(sorted(labels.items())), value))
+
+        for name, (type, help, samples) in families.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+            lines += [f"{name}{format_labels(labels)} {value}" for labels, value in samples]
+
+        return "\n".join(lines) + "\n"
+
+
+stage_duration = MetricsHelper.histogram(
+    "stage_duration_seconds", "Duration of each pipeline stage in seconds."
+)
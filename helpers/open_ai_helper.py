@@ -1,65 +1,174 @@
 import os
 import json
-from openai import OpenAI
+import httpx
+from openai import APIConnectionError, AsyncOpenAI
 from dotenv import load_dotenv
 from helpers.prompt_helper import PromptHelper
+from helpers.log_helper import LogHelper
+from helpers.metrics_helper import MetricsHelper
+from helpers.upstream_helper import UpstreamHelper
 
+logger = LogHelper.get_logger(__name__)
 
 load_dotenv()  # Load environment variables from .env file
 
-openAIClient = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_TIMEOUT_SECONDS", "60"))
+# Transcriptions upload audio and run longer, they get their own, smaller limit.
+OPENAI_TRANSCRIPTION_CONCURRENCY = int(os.environ.get("OPENAI_TRANSCRIPTION_CONCURRENCY", "4"))
+OPENAI_CHAT_CONCURRENCY = int(
+    os.environ.get("OPENAI_CHAT_CONCURRENCY", str(OPENAI_MAX_CONCURRENCY))
+)
+# Requests per second, 0 leaves the rate to the concurrency limits.
+OPENAI_TRANSCRIPTION_RATE = float(os.environ.get("OPENAI_TRANSCRIPTION_RATE", "0"))
+OPENAI_CHAT_RATE = float(os.environ.get("OPENAI_CHAT_RATE", "0"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "3"))
+OPENAI_BACKOFF_BASE_SECONDS = float(os.environ.get("OPENAI_BACKOFF_BASE_SECONDS", "0.5"))
+OPENAI_BACKOFF_MAX_SECONDS = float(os.environ.get("OPENAI_BACKOFF_MAX_SECONDS", "8"))
+OPENAI_BREAKER_FAILURES = int(os.environ.get("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_COOLDOWN_SECONDS = float(os.environ.get("OPENAI_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# One pooled keep-alive HTTP client shared by every request, so concurrent calls reuse connections.
+openAIHttpClient = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+    ),
+    timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=10.0),
+)
+openAIClient = AsyncOpenAI(
+    api_key=os.environ.get("OPENAI_API_KEY"),
+    http_client=openAIHttpClient,
+    max_retries=0,  # Retried by the upstream layer, within the request's deadline.
+)
 openAIModel = "gpt-5.1-2025-11-13"
 whisperModel = "whisper-1"
 open_ai_response_format = {"type": "json_object"}
 
+upstream_settings = {
+    "max_retries": OPENAI_MAX_RETRIES,
+    "backoff_base": OPENAI_BACKOFF_BASE_SECONDS,
+    "backoff_max": OPENAI_BACKOFF_MAX_SECONDS,
+    "breaker_failures": OPENAI_BREAKER_FAILURES,
+    "breaker_cooldown": OPENAI_BREAKER_COOLDOWN_SECONDS,
+    "timeout": OPENAI_TIMEOUT_SECONDS,
+    "transient_errors": (APIConnectionError, httpx.TransportError),  # Timeouts included.
+}
+transcription_upstream = UpstreamHelper.create(
+    "openai_transcription",
+    max_concurrency=OPENAI_TRANSCRIPTION_CONCURRENCY,
+    rate=OPENAI_TRANSCRIPTION_RATE,
+    **upstream_settings,
+)
+chat_upstream = UpstreamHelper.create(
+    "openai_chat",
+    max_concurrency=OPENAI_CHAT_CONCURRENCY,
+    rate=OPENAI_CHAT_RATE,
+    **upstream_settings,
+)
+
 
 class OpenAIHelper:
-    def audio_to_text(filename: str):
-        print(f"audio_to_text() filename: {filename}")
+    async def audio_to_text(filename: str, audio_bytes: bytes):
+        logger.info(f"OpenAIHelper audio_to_text() filename: {filename}, size: {len(audio_bytes)}")
+
+        async def attempt(timeout: float):
+            return await openAIClient.audio.transcriptions.create(
+                model=whisperModel, file=(filename, audio_bytes), timeout=timeout
+            )  # Transcribe audio straight from memory using OpenAI Whisper.
 
-        with open(filename, "rb") as audio_file:
-            transcription = openAIClient.audio.transcriptions.create(
-                model=whisperModel, file=audio_file
-            )  # Transcribe audio using OpenAI Whisper.
-        print(f"audio_to_text() transcription.text: {transcription.text}")
+        with MetricsHelper.span("transcription"):
+            transcription = await transcription_upstream.call(attempt)
+        logger.debug("OpenAIHelper audio_to_text() transcription.text: %s", transcription.text)
 
         return transcription.text
 
-    def text_to_event(text: str):
+    async def text_to_event(text: str, on_token: any = None):
+        # With on_token(delta), the completion is streamed and each token reported as it comes.
         system_prompt = PromptHelper.get_prompt_transcription_to_json()
-        print(f"receive_audio() system_prompt: {system_prompt}")
-
-        response = openAIClient.chat.completions.create(
-            model=openAIModel,
-            response_format=open_ai_response_format,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text},
-            ],
-        )
+        logger.debug("OpenAIHelper text_to_event() system_prompt: %s", system_prompt)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text},
+        ]
+
+        content = []
+
+        async def attempt(timeout: float):
+            if on_token is None:
+                response = await openAIClient.chat.completions.create(
+                    model=openAIModel,
+                    response_format=open_ai_response_format,
+                    messages=messages,
+                    timeout=timeout,
+                )
+
+                return response.choices[0].message.content
+
+            stream = await openAIClient.chat.completions.create(
+                model=openAIModel,
+                response_format=open_ai_response_format,
+                messages=messages,
+                stream=True,
+                timeout=timeout,
+            )
 
-        return response.choices[0].message.content
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
 
-    def check_conflict(schedule_text: str, event_data: object):
+                if delta:
+                    content.append(delta)
+                    on_token(delta)
+
+            return "".join(content)
+
+        with MetricsHelper.span("extraction_llm"):
+            # Tokens already handed out cannot be taken back, a broken stream is not retried.
+            return await chat_upstream.call(attempt, can_retry=lambda: not content)
+
+    async def get_conflict(schedule_text: str, event_data: object):
+        # Returns {"conflict": bool, "reason": str} as judged by the model.
         prompt = PromptHelper.get_prompt_check_conflict(
             schedule_text=schedule_text, event_data=event_data
         )
 
-        conflict_response = openAIClient.chat.completions.create(
-            model=openAIModel,
-            response_format=open_ai_response_format,
-            messages=[{"role": "user", "content": prompt}],
-        )
+        async def attempt(timeout: float):
+            return await openAIClient.chat.completions.create(
+                model=openAIModel,
+                response_format=open_ai_response_format,
+                messages=[{"role": "user", "content": prompt}],
+                timeout=timeout,
+            )
+
+        with MetricsHelper.span("conflict_llm"):
+            conflict_response = await chat_upstream.call(attempt)
 
         conflict_data = json.loads(conflict_response.choices[0].message.content)
 
-        print(
-            f"OpenAIHelper check_conflict() conflict_data: {json.dumps(conflict_data)}"
-        )
+        logger.debug("OpenAIHelper get_conflict() conflict_data: %s", conflict_data)
+
+        return conflict_data
 
-        if conflict_data.get("conflict"):
-            print(
-                f"OpenAIHelper check_conflict() conflict reason: {conflict_data.get('reason')}"
+    async def text_to_events(text: str):
+        system_prompt = PromptHelper.get_prompt_transcription_to_json_list()
+        logger.debug("OpenAIHelper text_to_events() system_prompt: %s", system_prompt)
+
+        async def attempt(timeout: float):
+            return await openAIClient.chat.completions.create(
+                model=openAIModel,
+                response_format=open_ai_response_format,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": text},
+                ],
+                timeout=timeout,
             )
 
-            raise Exception("Conflict with existing agendas.")
+        with MetricsHelper.span("extraction_llm"):
+            response = await chat_upstream.call(attempt)
+
+        return response.choices[0].message.content
+
+    async def close():
+        await openAIClient.close()  # Also closes the shared HTTP client.
@@ -0,0 +1,293 @@
+import os
+import time
+import asyncio
+import urllib.parse
+from contextlib import asynccontextmanager
+from helpers.playwright_helper import PlaywrightHelper
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+# Overridable to drive a local stand-in, see benchmarks/end_to_end.py.
+CALENDAR_URL = os.environ.get("GOOGLE_CALENDAR_URL", "https://calendar.google.com").rstrip("/") + "/"
+CALENDAR_HOSTNAME = urllib.parse.urlparse(CALENDAR_URL).hostname
+PAGE_POOL_SIZE = int(os.environ.get("PAGE_POOL_SIZE", "3"))
+PAGE_POOL_MAX_USES = int(os.environ.get("PAGE_POOL_MAX_USES", "50"))
+PAGE_NAVIGATION_TIMEOUT_MS = int(os.environ.get("PAGE_NAVIGATION_TIMEOUT_MS", "3000"))
+IN_APP_NAVIGATION_MAX_FAILURES = 3  # Pause in-app navigation after this many misses in a row.
+IN_APP_NAVIGATION_RETRY_SECONDS = float(os.environ.get("IN_APP_NAVIGATION_RETRY_SECONDS", "300"))
+
+STALE_ATTRIBUTE = "data-pool-stale"
+READY_SELECTOR = f"div[role='main']:not([{STALE_ATTRIBUTE}])"
+
+# Mark the current view as stale, then let the calendar's own router render the new route.
+IN_APP_NAVIGATION_SCRIPT = f"""
+url => {{
+    document.querySelectorAll("div[role='main']").forEach(main => {{
+        main.setAttribute("{STALE_ATTRIBUTE}", "");
+    }});
+    window.history.pushState({{}}, "", url);
+    window.dispatchEvent(new PopStateEvent("popstate", {{ state: {{}} }}));
+}}
+"""
+
+page_pools = {}  # Page pool per browser context.
+in_app_navigation_failures = 0
+in_app_navigation_paused_until = 0.0  # Monotonic time of the next in-app navigation try.
+navigation_stats = {}  # Route -> totals of the navigations to it.
+
+
+class PagePool:
+    """Keeps warm calendar tabs of one browser context and leases each to a single request."""
+
+    def __init__(
+        self, context: any, size: int = PAGE_POOL_SIZE, max_uses: int = PAGE_POOL_MAX_USES
+    ):
+        self.context = context
+        self.size = size
+        self.max_uses = max_uses
+        self.idle_pages = []
+        self.uses = {}  # Number of leases served by each open page.
+        self.leased = 0
+        self.warming = 0
+        self.semaphore = None  # Created lazily so it binds to the running event loop.
+
+    def get_semaphore(self):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.size)
+
+        return self.semaphore
+
+    async def warm_up(self):
+        logger.info(f"PagePool warm_up() size: {self.size}")
+
+        await asyncio.gather(
+            *(self.replenish() for _ in range(self.size - len(self.idle_pages)))
+        )
+
+    async def new_page(self):
+        page = await self.context.new_page()
+
+        try:
+            await PlaywrightHelper.prepare_page(page)
+            await page.goto(CALENDAR_URL)
+            await page.wait_for_load_state("domcontentloaded")
+
+        except Exception:
+            await page.close()
+            raise
+
+        self.uses[page] = 0
+
+        return page
+
+    async def replenish(self):
+        if len(self.idle_pages) + self.leased + self.warming >= self.size:
+            return
+
+        self.warming += 1
+
+        try:
+            self.idle_pages.append(await self.new_page())
+
+        except Exception as e:
+            logger.warning(f"PagePool replenish() e: {e}")
+
+        finally:
+            self.warming -= 1
+
+    async def is_healthy(self, page: any):
+        if page.is_closed():
+            return False
+
+        try:
+            await page.evaluate("1")  # Round trip to the renderer to detect crashed tabs.
+
+            return urllib.parse.urlparse(page.url).hostname == CALENDAR_HOSTNAME
+
+        except Exception:
+            return False
+
+    async def discard(self, page: any):
+        self.uses.pop(page, None)
+
+        try:
+            await page.close()
+
+        except Exception as e:
+            logger.warning(f"PagePool discard() e: {e}")
+
+    async def take(self):
+        while self.idle_pages:
+            page = self.idle_pages.pop()
+
+            if await self.is_healthy(page):
+                return page
+
+            logger.warning("PagePool take() Discarding unhealthy page.")
+            await self.discard(page)
+
+        return await self.new_page()  # Cold page only when no warm one is left.
+
+    async def release(self, page: any):
+        self.uses[page] = self.uses.get(page, 0) + 1
+
+        if page.is_closed() or self.uses[page] >= self.max_uses:
+            logger.info(f"PagePool release() Recycling page after {self.uses[page]} uses.")
+            await self.discard(page)
+            asyncio.ensure_future(self.replenish())  # Warm the replacement off the request path.
+        else:
+            self.idle_pages.append(page)
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self.get_semaphore():
+            page = await self.take()
+            self.leased += 1
+
+            try:
+                yield page
+
+            finally:
+                self.leased -= 1
+                await self.release(page)
+
+    async def close(self):
+        pages = list(self.uses.keys())
+        self.idle_pages = []
+
+        for page in pages:
+            await self.discard(page)
+
+
+class PagePoolHelper:
+    def get(context: any):
+        if context is None:
+            raise ValueError("PagePoolHelper get() browser context is None.")
+
+        pool = page_pools.get(id(context))
+
+        if pool is None or pool.context is not context:
+            pool = PagePool(context=context)
+            page_pools[id(context)] = pool
+
+        return pool
+
+    async def init(context: any):
+        logger.info(f"PagePoolHelper init()")
+
+        await PagePoolHelper.get(context).warm_up()
+
+    def get_route(url: str):
+        path = urllib.parse.urlparse(url).path
+
+        for route in ("agenda", "eventedit"):
+            if f"/r/{route}" in path:
+                return route
+
+        return "other"
+
+    async def navigate(page: any, url: str):
+        started = time.perf_counter()
+        counters = PlaywrightHelper.get_network_counters(page)
+        in_app = await PagePoolHelper.change_route(page, url)
+
+        PagePoolHelper.record_navigation(
+            route=PagePoolHelper.get_route(url),
+            in_app=in_app,
+            elapsed_ms=(time.perf_counter() - started) * 1000,
+            before=counters,
+            after=PlaywrightHelper.get_network_counters(page),
+        )
+
+    async def change_route(page: any, url: str):
+        # Returns True when the route changed in-app, False after a full page load.
+        global in_app_navigation_failures, in_app_navigation_paused_until
+
+        current = urllib.parse.urlparse(page.url)
+        target = urllib.parse.urlparse(url)
+        in_app = (
+            current.hostname == target.hostname
+            and time.monotonic() >= in_app_navigation_paused_until
+        )
+
+        if in_app:
+            try:
+                await page.evaluate(IN_APP_NAVIGATION_SCRIPT, url)
+                await page.wait_for_selector(
+                    READY_SELECTOR, timeout=PAGE_NAVIGATION_TIMEOUT_MS
+                )
+                in_app_navigation_failures = 0
+
+                return True
+
+            except Exception as e:
+                in_app_navigation_failures += 1
+                logger.warning(f"PagePoolHelper change_route() in-app navigation failed, e: {e}")
+
+                if in_app_navigation_failures >= IN_APP_NAVIGATION_MAX_FAILURES:
+                    # Full page loads for a while, then one try again, e.g. after a calendar update.
+                    in_app_navigation_paused_until = (
+                        time.monotonic() + IN_APP_NAVIGATION_RETRY_SECONDS
+                    )
+                    logger.warning(
+                        f"PagePoolHelper change_route() in-app navigation paused for "
+                        f"{IN_APP_NAVIGATION_RETRY_SECONDS:.0f} s"
+                    )
+
+        await page.goto(url)  # Full page load as the fallback.
+        await page.wait_for_load_state("domcontentloaded")
+
+        return False
+
+    def record_navigation(
+        route: str, in_app: bool, elapsed_ms: float, before: dict, after: dict
+    ):
+        totals = navigation_stats.setdefault(
+            route,
+            {"count": 0, "in_app": 0, "total_ms": 0.0, "bytes": 0, "cached": 0, "blocked": 0},
+        )
+        totals["count"] += 1
+        totals["in_app"] += 1 if in_app else 0
+        totals["total_ms"] += elapsed_ms
+        deltas = {}
+
+        if before is not None and after is not None:
+            for key in ("bytes", "cached", "blocked"):
+                deltas[key] = after[key] - before[key]
+                totals[key] += deltas[key]
+
+        logger.debug(
+            f"PagePoolHelper navigate() route: {route}, in_app: {in_app}, elapsed_ms: {elapsed_ms:.0f}, network: {deltas}"
+        )
+
+    def stats():
+        # Compare BROWSER_PROFILE=default against performance to see the bytes and time saved.
+        return {
+            route: {
+                **totals,
+                "avg_ms": totals["total_ms"] / totals["count"],
+                "avg_bytes": totals["bytes"] / totals["count"],
+            }
+            for route, totals in navigation_stats.items()
+        }
+
+    def get_state():
+        # Warm tabs of every browser context, for the health endpoints.
+        pools = list(page_pools.values())
+
+        return {
+            "pools": len(pools),
+            "size": sum(pool.size for pool in pools),
+            "idle": sum(len(pool.idle_pages) for pool in pools),
+            "leased": sum(pool.leased for pool in pools),
+            "warming": sum(pool.warming for pool in pools),
+        }
+
+    async def close(context: any = None):
+        contexts = [context] if context is not None else None
+
+        for key, pool in list(page_pools.items()):
+            if contexts is None or pool.context in contexts:
+                await pool.close()
+                page_pools.pop(key, None)
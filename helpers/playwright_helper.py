@@ -1,29 +1,74 @@
 import os
+import asyncio
 from playwright.async_api import async_playwright
-from helpers.storage_helper import StorageHelper
+from helpers.storage_helper import DEFAULT_ACCOUNT, StorageHelper
+from helpers.log_helper import LogHelper
 
+logger = LogHelper.get_logger(__name__)
 
 STORAGE_STATE_PATH = f"{StorageHelper.get_path('state')}"
+# "default" loads everything, "performance" blocks what the calendar pages do not need.
+BROWSER_PROFILE = os.environ.get("BROWSER_PROFILE", "default")
+# "false", "true", or "auto" to go headless once a signed-in session has been saved.
+BROWSER_HEADLESS = os.environ.get("BROWSER_HEADLESS", "false").lower()
+# Empty uses Playwright's bundled Chromium, e.g. on machines without Chrome installed.
+BROWSER_CHANNEL = os.environ.get("BROWSER_CHANNEL", "chrome")
+
+BLOCKED_RESOURCE_TYPES = ["Image", "Font", "Media"]
+BLOCKED_URL_PATTERNS = [
+    "*://*.googleusercontent.com/*",  # Avatars and attachments previews.
+    "*://fonts.gstatic.com/*",
+    "*://play.google.com/log*",  # Telemetry.
+    "*://*.google-analytics.com/*",
+    "*://*.googletagmanager.com/*",
+    "*://*.doubleclick.net/*",
+    "*://ogs.google.com/*",  # Account and apps switcher.
+] + [
+    pattern.strip()
+    for pattern in os.environ.get("BROWSER_BLOCKED_URLS", "").split(",")
+    if pattern.strip()
+]
+
+playwright = None  # The driver, kept across browser relaunches.
+network_counters = {}  # Page -> network counters, only with the performance profile.
 
 
 class PlaywrightHelper:
-    async def init():
-        print(f"PlaywrightHelper init()")
+    def is_headless():
+        if BROWSER_HEADLESS == "auto":
+            return os.path.exists(STORAGE_STATE_PATH)
+
+        return BROWSER_HEADLESS == "true"
+
+    async def launch():
+        # One Chromium process, shared by the contexts of every account.
+        global playwright
+
+        logger.info(f"PlaywrightHelper launch() BROWSER_PROFILE: {BROWSER_PROFILE}")
+
+        if playwright is None:
+            playwright = await async_playwright().start()
 
-        playwright = await async_playwright().start()
         browser = await playwright.chromium.launch(
-            headless=False,
-            channel="chrome",
+            headless=PlaywrightHelper.is_headless(),
+            channel=BROWSER_CHANNEL or None,
             args=[
                 "--disable-blink-features=AutomationControlled"
             ],  # Hide the feature of automation or Chrome will see this as a robot.
         )
-        sessionExists = os.path.exists(STORAGE_STATE_PATH)
-        print(f"PlaywrightHelper init() sessionExists: {sessionExists}")
+
+        return browser
+
+    async def new_context(browser: any, account_id: str = DEFAULT_ACCOUNT):
+        storage_state_path = StorageHelper.get_path("state", account_id)
+        sessionExists = os.path.exists(storage_state_path)
+        logger.info(
+            f"PlaywrightHelper new_context() account_id: {account_id}, sessionExists: {sessionExists}"
+        )
 
         if sessionExists:
             browser_context = await browser.new_context(
-                storage_state=STORAGE_STATE_PATH
+                storage_state=storage_state_path
             )  # Bypass the sign in process with the existing state.
         else:
             browser_context = await browser.new_context()
@@ -33,3 +78,60 @@ class PlaywrightHelper:
         )  # Disable webdriver detection for avoiding the anti-scraping.
 
         return browser_context
+
+    async def prepare_page(page: any):
+        """
+        Apply the browser profile to a new page.
+        Blocking goes through the DevTools protocol rather than page.route(), because routing
+        disables the HTTP cache that the pages of one context share.
+        """
+        if BROWSER_PROFILE != "performance":
+            return
+
+        counters = {"bytes": 0, "requests": 0, "cached": 0, "blocked": 0}
+        network_counters[page] = counters
+        page.on("close", lambda _: network_counters.pop(page, None))
+
+        cdp = await page.context.new_cdp_session(page)
+
+        def on_request_paused(event: dict):
+            counters["blocked"] += 1
+            asyncio.ensure_future(
+                cdp.send(
+                    "Fetch.failRequest",
+                    {"requestId": event["requestId"], "errorReason": "BlockedByClient"},
+                )
+            )
+
+        def on_loading_finished(event: dict):
+            counters["requests"] += 1
+            counters["bytes"] += int(event.get("encodedDataLength", 0))
+
+        def on_loading_failed(event: dict):
+            if event.get("blockedReason"):
+                counters["blocked"] += 1
+
+        def on_served_from_cache(_: dict):
+            counters["cached"] += 1
+
+        cdp.on("Fetch.requestPaused", on_request_paused)
+        cdp.on("Network.loadingFinished", on_loading_finished)
+        cdp.on("Network.loadingFailed", on_loading_failed)
+        cdp.on("Network.requestServedFromCache", on_served_from_cache)
+
+        await cdp.send("Network.enable")
+        await cdp.send("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        await cdp.send(
+            "Fetch.enable",
+            {
+                "patterns": [
+                    {"resourceType": resource_type, "requestStage": "Request"}
+                    for resource_type in BLOCKED_RESOURCE_TYPES
+                ]
+            },
+        )
+
+    def get_network_counters(page: any):
+        counters = network_counters.get(page)
+
+        return dict(counters) if counters is not None else None
@@ -2,8 +2,12 @@ from datetime import datetime
 
 
 class PromptHelper:
+    def get_current_date():
+        # The date the extraction prompts are based on, also part of their cache key.
+        return datetime.now().strftime("%Y-%m-%d %A")
+
     def get_prompt_transcription_to_json():
-        current_date = datetime.now().strftime("%Y-%m-%d %A")
+        current_date = PromptHelper.get_current_date()
 
         return f"""
         You are a effective calendar assistant.
@@ -19,6 +23,23 @@ class PromptHelper:
         If you cannot understand user's input or cannot extract available information to generate the JSON object, please guide user to provide useful and detailed information politely.
         """
 
+    def get_prompt_transcription_to_json_list():
+        current_date = PromptHelper.get_current_date()
+
+        return f"""
+        You are a effective calendar assistant.
+        Today is {current_date}.
+        The user's input may describe one or several events. Extract every event.
+        Return ONLY a JSON object with the key "events", a list of objects with the following keys:
+        - title (string): Title of the event
+        - start_time (string): ISO 8601 format (e.g., 2023-10-27T10:00:00)
+        - end_time (string): ISO 8601 format
+
+        If the date is relative (like "tomorrow", "next Monday", however, user might speak in English or Mandarin), calculate the exact date based on today ({current_date}). An event without its own date happens on the date of the event mentioned before it.
+
+        If you cannot understand user's input or cannot extract available information to generate the JSON object, return {{ "message": "..." }} to guide user to provide useful and detailed information politely.
+        """
+
     def get_prompt_check_conflict(schedule_text: str, event_data: object):
         if schedule_text is None:
             raise ValueError(
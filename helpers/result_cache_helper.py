@@ -0,0 +1,79 @@
+import os
+import re
+import hashlib
+import unicodedata
+from helpers.audio_helper import AudioHelper
+from helpers.cache_helper import TTLCache
+from helpers.open_ai_helper import OpenAIHelper
+from helpers.prompt_helper import PromptHelper
+from helpers.transcription_helper import TranscriptionHelper
+
+
+TRANSCRIPTION_CACHE_MAX_ENTRIES = int(
+    os.environ.get("TRANSCRIPTION_CACHE_MAX_ENTRIES", "512")
+)
+TRANSCRIPTION_CACHE_TTL_SECONDS = float(
+    os.environ.get("TRANSCRIPTION_CACHE_TTL_SECONDS", "3600")
+)
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get("EXTRACTION_CACHE_MAX_ENTRIES", "1024"))
+EXTRACTION_CACHE_TTL_SECONDS = float(
+    os.environ.get("EXTRACTION_CACHE_TTL_SECONDS", "3600")
+)
+
+transcription_cache = TTLCache(
+    max_size=TRANSCRIPTION_CACHE_MAX_ENTRIES, ttl_seconds=TRANSCRIPTION_CACHE_TTL_SECONDS
+)
+extraction_cache = TTLCache(
+    max_size=EXTRACTION_CACHE_MAX_ENTRIES, ttl_seconds=EXTRACTION_CACHE_TTL_SECONDS
+)
+
+
+class ResultCacheHelper:
+    """Caches upstream results by content, so client retries do not pay for the same calls."""
+
+    def get_audio_key(audio_bytes: bytes):
+        return hashlib.sha256(audio_bytes).hexdigest()
+
+    def normalize_text(text: str):
+        text = unicodedata.normalize("NFKC", text or "").lower()  # Full-width to half-width too.
+        text = re.sub(r"\s+", " ", text)
+
+        return text.strip(" ,.!?;:，。！？；：、")
+
+    def get_text_key(kind: str, text: str):
+        # Relative dates are resolved against the prompt's date, so it is part of the key.
+        return (kind, ResultCacheHelper.normalize_text(text), PromptHelper.get_current_date())
+
+    async def audio_to_text(filename: str, audio_bytes: bytes):
+        async def transcribe():
+            # Keyed by the upload, so repeated recordings skip the preprocessing too.
+            upload_filename, upload_bytes, duration_ms = await AudioHelper.preprocess(
+                filename, audio_bytes
+            )
+
+            return await TranscriptionHelper.transcribe(
+                filename=upload_filename, audio_bytes=upload_bytes, duration_ms=duration_ms
+            )
+
+        return await transcription_cache.get_or_load(
+            ResultCacheHelper.get_audio_key(audio_bytes), transcribe
+        )
+
+    async def text_to_event(text: str, on_token: any = None):
+        # Only the caller that starts the load gets the tokens, others get the whole result.
+        return await extraction_cache.get_or_load(
+            ResultCacheHelper.get_text_key("event", text),
+            lambda: OpenAIHelper.text_to_event(text=text, on_token=on_token),
+        )
+
+    async def text_to_events(text: str):
+        return await extraction_cache.get_or_load(
+            ResultCacheHelper.get_text_key("events", text),
+            lambda: OpenAIHelper.text_to_events(text=text),
+        )
+
+    def stats():
+        return {
+            "transcription": transcription_cache.stats(),
+            "extraction": extraction_cache.stats(),
+        }
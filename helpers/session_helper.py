@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from helpers.cache_helper import TTLCache
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")  # "memory" or "sqlite".
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", "300"))
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", "10000"))
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_COOKIE = "session_id"
+
+session_store = None
+
+
+class SessionStore(ABC):
+    """Pending conflict state per client session. Values are JSON-serializable dicts."""
+
+    @abstractmethod
+    async def get(self, session_id: str):
+        pass
+
+    @abstractmethod
+    async def set(self, session_id: str, value: dict):
+        pass
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store, fine for a single uvicorn worker."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.cache = TTLCache(max_size=max_entries, ttl_seconds=ttl_seconds)
+
+    async def get(self, session_id: str):
+        return self.cache.get(session_id)
+
+    async def set(self, session_id: str, value: dict):
+        self.cache.put(session_id, value)
+
+    async def delete(self, session_id: str):
+        self.cache.invalidate(session_id)
+
+
+class SqliteSessionStore(SessionStore):
+    """Store shared by every worker on the host through one SQLite file."""
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")  # Readers do not block writers.
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)"
+            )
+
+    async def run(self, function: any, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def get_sync(self, session_id: str):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM sessions WHERE session_id = ? AND expires_at > ?",
+                (session_id, time.time()),
+            ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def set_sync(self, session_id: str, value: dict):
+        now = time.time()
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, value, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(value), now + self.ttl_seconds),
+            )
+            self.connection.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            # Bound the table, sessions closest to expiry go first.
+            self.connection.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete_sync(self, session_id: str):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            )
+
+    async def get(self, session_id: str):
+        return await self.run(self.get_sync, session_id)
+
+    async def set(self, session_id: str, value: dict):
+        await self.run(self.set_sync, session_id, value)
+
+    async def delete(self, session_id: str):
+        await self.run(self.delete_sync, session_id)
+
+
+class SessionHelper:
+    def get_store():
+        global session_store
+
+        if session_store is None:
+            logger.info(f"SessionHelper get_store() SESSION_STORE: {SESSION_STORE}")
+
+            if SESSION_STORE == "sqlite":
+                session_store = SqliteSessionStore(
+                    path=SESSION_DB_PATH,
+                    ttl_seconds=SESSION_TTL_SECONDS,
+                    max_entries=SESSION_MAX_ENTRIES,
+                )
+            elif SESSION_STORE == "memory":
+                session_store = MemorySessionStore(
+                    ttl_seconds=SESSION_TTL_SECONDS, max_entries=SESSION_MAX_ENTRIES
+                )
+            else:
+                raise ValueError(
+                    f"SessionHelper get_store() unknown SESSION_STORE: {SESSION_STORE}"
+                )
+
+        return session_store
+
+    def get_session_id(request: any, session_id: str = None):
+        """
+        The X-Session-Id header, else the session cookie, else a new id handed back to the
+        client by set_session_id(). Never the address: clients behind one proxy share it.
+        """
+        session_id = session_id or request.cookies.get(SESSION_COOKIE)
+
+        if session_id:
+            return session_id
+
+        session_id = uuid.uuid4().hex
+        request.state.new_session_id = session_id
+
+        return session_id
+
+    def set_session_id(request: any, response: any):
+        # Returns a newly issued id as the X-Session-Id header and the session cookie.
+        session_id = getattr(request.state, "new_session_id", None)
+
+        if session_id is None:
+            return
+
+        response.headers["X-Session-Id"] = session_id
+        response.set_cookie(
+            SESSION_COOKIE,
+            session_id,
+            max_age=int(SESSION_TTL_SECONDS),
+            httponly=True,
+            samesite="lax",
+        )
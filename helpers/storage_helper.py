@@ -1,6 +1,58 @@
+import os
+import re
+import hashlib
+
+
+DEFAULT_ACCOUNT = "default"
+ACCOUNT_STATES_DIR = os.environ.get("ACCOUNT_STATES_DIR", "storage_states")
+# Accounts that may sign in for the first time, comma separated. Any other X-Account-Id needs
+# a saved session or credentials file.
+ACCOUNT_ALLOW_LIST = {
+    account_id.strip()
+    for account_id in os.environ.get("ACCOUNT_ALLOW_LIST", "").split(",")
+    if account_id.strip()
+}
+
+
+class UnknownAccountError(Exception):
+    pass
+
+
 class StorageHelper:
-    def get_path(type: str):
+    def get_filename(account_id: str):
+        # The id sanitized to a safe filename, plus a hash of it so that ids sanitized alike,
+        # e.g. "a/b" and "a_b", never share a file.
+        filename = re.sub(r"[^A-Za-z0-9_.@-]", "_", account_id)
+        digest = hashlib.sha1(account_id.encode("utf-8")).hexdigest()[:8]
+
+        return f"{filename}-{digest}"
+
+    def get_path(type: str, account_id: str = DEFAULT_ACCOUNT):
         if type == "state":
-            return "storage_state.json"
-        
+            if account_id is None or account_id == DEFAULT_ACCOUNT:
+                return "storage_state.json"
+
+            # One storage state file per account.
+            filename = StorageHelper.get_filename(account_id)
+
+            return os.path.join(ACCOUNT_STATES_DIR, f"{filename}.json")
+        elif type == "credentials":
+            # Calendar API credentials of an account other than the default, see CalendarApiHelper.
+            filename = StorageHelper.get_filename(account_id or DEFAULT_ACCOUNT)
+
+            return os.path.join(ACCOUNT_STATES_DIR, f"{filename}.credentials.json")
+
         return None
+
+    def is_known_account(account_id: str):
+        if account_id is None or account_id == DEFAULT_ACCOUNT or account_id in ACCOUNT_ALLOW_LIST:
+            return True
+
+        return os.path.exists(StorageHelper.get_path("state", account_id)) or os.path.exists(
+            StorageHelper.get_path("credentials", account_id)
+        )
+
+    def check_account(account_id: str):
+        # Fails fast on an account nobody set up, rather than opening a sign in for it.
+        if not StorageHelper.is_known_account(account_id):
+            raise UnknownAccountError(f"StorageHelper check_account() unknown account: {account_id}")
@@ -0,0 +1,53 @@
+import json
+import asyncio
+from helpers.log_helper import LogHelper
+
+logger = LogHelper.get_logger(__name__)
+
+STREAM_KEEPALIVE_SECONDS = 15  # Comment lines keep proxies from closing a quiet stream.
+
+running_tasks = set()  # Strong references, so a disconnected client does not lose its task.
+
+
+class StreamHelper:
+    def format_event(event: str, data: any):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def run(handler: any, **kwargs):
+        """
+        Run handler(on_progress=..., **kwargs) and yield its progress as Server-Sent Events.
+        handler calls on_progress(event, data) as its stages complete, its return value is sent
+        last as the "result" event. The handler keeps running if the client goes away, so an
+        event being saved is never cut in half.
+        """
+        queue = asyncio.Queue()
+
+        def on_progress(event: str, data: any):
+            queue.put_nowait((event, data))
+
+        async def work():
+            try:
+                result = await handler(on_progress=on_progress, **kwargs)
+
+            except Exception as e:
+                logger.warning(f"StreamHelper run() e: {e}")
+                result = {"status": "error", "message": str(e)}
+
+            queue.put_nowait(("result", result))
+
+        task = asyncio.ensure_future(work())
+        running_tasks.add(task)
+        task.add_done_callback(running_tasks.discard)
+
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_SECONDS)
+
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            yield StreamHelper.format_event(event, data)
+
+            if event == "result":
+                break
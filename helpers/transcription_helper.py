@@ -0,0 +1,270 @@
+import io
+import os
+import time
+import asyncio
+import importlib.util
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from helpers.open_ai_helper import OpenAIHelper
+from helpers.log_helper import LogHelper
+from helpers.metrics_helper import MetricsHelper
+
+logger = LogHelper.get_logger(__name__)
+
+# "openai", "local", "local_first" (remote when the local model fails) or "by_length"
+# (local for clips up to TRANSCRIPTION_LOCAL_MAX_SECONDS, remote for longer ones and on failure).
+TRANSCRIPTION_BACKEND = os.environ.get("TRANSCRIPTION_BACKEND", "openai").lower()
+TRANSCRIPTION_LOCAL_MODEL = os.environ.get("TRANSCRIPTION_LOCAL_MODEL", "base")
+TRANSCRIPTION_LOCAL_COMPUTE_TYPE = os.environ.get("TRANSCRIPTION_LOCAL_COMPUTE_TYPE", "int8")
+TRANSCRIPTION_LOCAL_WORKERS = int(os.environ.get("TRANSCRIPTION_LOCAL_WORKERS", "1"))
+TRANSCRIPTION_LOCAL_MAX_SECONDS = float(os.environ.get("TRANSCRIPTION_LOCAL_MAX_SECONDS", "8"))
+TRANSCRIPTION_LANGUAGE = os.environ.get("TRANSCRIPTION_LANGUAGE") or None  # None detects it.
+# Bits per second of a browser's Opus recording, to estimate the length when it is unknown.
+ESTIMATED_BITRATE = 32000
+LOCAL_BACKENDS = ("local", "local_first", "by_length")  # The settings using the local model.
+
+local_model = None  # Loaded once in each worker process of the local backend.
+backend_stats = {}  # Backend name -> counters and latest latencies.
+
+
+def load_local_model():
+    # Initializer of the worker processes, the model stays loaded for the process's lifetime.
+    global local_model
+
+    from faster_whisper import WhisperModel
+
+    cpu_threads = max(1, (os.cpu_count() or 1) // TRANSCRIPTION_LOCAL_WORKERS)
+    local_model = WhisperModel(
+        TRANSCRIPTION_LOCAL_MODEL,
+        device="cpu",
+        compute_type=TRANSCRIPTION_LOCAL_COMPUTE_TYPE,
+        cpu_threads=cpu_threads,
+    )
+
+
+def transcribe_locally(audio_bytes: bytes):
+    segments, _ = local_model.transcribe(
+        io.BytesIO(audio_bytes), language=TRANSCRIPTION_LANGUAGE, beam_size=1
+    )
+
+    return "".join(segment.text for segment in segments).strip()
+
+
+class OpenAITranscriptionBackend:
+    name = "openai"
+
+    def is_available(self):
+        return True
+
+    def start(self):
+        pass
+
+    def get_state(self):
+        return "loaded"
+
+    async def transcribe(self, filename: str, audio_bytes: bytes):
+        return await OpenAIHelper.audio_to_text(filename=filename, audio_bytes=audio_bytes)
+
+    def close(self):
+        pass
+
+
+class LocalTranscriptionBackend:
+    """A quantized Whisper model (faster-whisper) on the CPU, in its own worker processes."""
+
+    name = "local"
+
+    def __init__(self):
+        self.pool = None
+        self.load_task = None  # Spawns the workers, each loads the model.
+        self.load_error = None  # Why the model failed to load.
+
+    def is_available(self):
+        return importlib.util.find_spec("faster_whisper") is not None
+
+    def start(self):
+        # Returns at once, the workers load the model in the background, see get_state().
+        if self.pool is not None or not self.is_available():
+            return
+
+        logger.info(
+            f"LocalTranscriptionBackend start() model: {TRANSCRIPTION_LOCAL_MODEL}, "
+            f"workers: {TRANSCRIPTION_LOCAL_WORKERS}"
+        )
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=TRANSCRIPTION_LOCAL_WORKERS, initializer=load_local_model
+        )
+        self.load_error = None
+        self.load_task = asyncio.ensure_future(self.load())
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        try:
+            # Spawn every worker now, so the first request does not pay for loading the model.
+            await asyncio.gather(
+                *(
+                    loop.run_in_executor(self.pool, time.sleep, 0.1)
+                    for _ in range(TRANSCRIPTION_LOCAL_WORKERS)
+                )
+            )
+
+        except Exception as e:
+            self.load_error = str(e) or type(e).__name__
+            logger.warning(f"LocalTranscriptionBackend load() e: {self.load_error}")
+
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"LocalTranscriptionBackend load() elapsed_ms: {elapsed_ms:.0f}")
+
+    def get_state(self):
+        # "unavailable", "pending", "loading", "failed" or "loaded".
+        if not self.is_available():
+            return "unavailable"
+        elif self.load_task is None:
+            return "pending"
+        elif not self.load_task.done():
+            return "loading"
+
+        return "failed" if self.load_error is not None else "loaded"
+
+    async def transcribe(self, filename: str, audio_bytes: bytes):
+        if self.pool is None:
+            self.start()
+
+        if self.pool is None:
+            raise RuntimeError(
+                "LocalTranscriptionBackend transcribe() faster-whisper is not installed."
+            )
+
+        await asyncio.shield(self.load_task)  # Only with "local", the others skip it until loaded.
+
+        if self.load_error is not None:
+            raise RuntimeError(
+                f"LocalTranscriptionBackend transcribe() model failed to load: {self.load_error}"
+            )
+
+        with MetricsHelper.span("transcription_local"):
+            return await asyncio.get_running_loop().run_in_executor(
+                self.pool, transcribe_locally, audio_bytes
+            )
+
+    def close(self):
+        if self.load_task is not None:
+            self.load_task.cancel()
+            self.load_task = None
+
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+
+openai_backend = OpenAITranscriptionBackend()
+local_backend = LocalTranscriptionBackend()
+
+
+class TranscriptionHelper:
+    def get_duration_ms(audio_bytes: bytes, duration_ms: int = None):
+        if duration_ms is not None:
+            return duration_ms
+
+        return len(audio_bytes) * 8 * 1000 // ESTIMATED_BITRATE
+
+    def get_backends(audio_bytes: bytes, duration_ms: int = None):
+        # The backends to try in order. The local model is skipped while it loads when there is
+        # a fallback, only "local" waits for it.
+        local_backends = [local_backend] if local_backend.get_state() == "loaded" else []
+
+        if TRANSCRIPTION_BACKEND == "local":
+            return [local_backend]
+        elif TRANSCRIPTION_BACKEND == "local_first":
+            return local_backends + [openai_backend]
+        elif TRANSCRIPTION_BACKEND == "by_length":
+            duration_ms = TranscriptionHelper.get_duration_ms(audio_bytes, duration_ms)
+
+            if duration_ms <= TRANSCRIPTION_LOCAL_MAX_SECONDS * 1000:
+                return local_backends + [openai_backend]
+
+        return [openai_backend]
+
+    def start():
+        # Returns at once, the local model loads in the background, /readyz tells when it is done.
+        if TRANSCRIPTION_BACKEND in LOCAL_BACKENDS:
+            if not local_backend.is_available():
+                logger.warning(
+                    f"TranscriptionHelper start() faster-whisper is not installed, "
+                    f"TRANSCRIPTION_BACKEND: {TRANSCRIPTION_BACKEND}"
+                )
+
+            local_backend.start()
+
+    def get_state():
+        # State of the local model, None when it is not used.
+        if TRANSCRIPTION_BACKEND not in LOCAL_BACKENDS:
+            return None
+
+        return local_backend.get_state()
+
+    def is_ready():
+        # Ready once the local model is loaded, or for good when the remote backend stands in.
+        state = TranscriptionHelper.get_state()
+
+        if state is None or state == "loaded":
+            return True
+
+        return TRANSCRIPTION_BACKEND != "local" and state in ("unavailable", "failed")
+
+    async def transcribe(filename: str, audio_bytes: bytes, duration_ms: int = None):
+        backends = TranscriptionHelper.get_backends(audio_bytes, duration_ms)
+
+        for position, backend in enumerate(backends):
+            stats = backend_stats.setdefault(
+                backend.name,
+                {"requests": 0, "errors": 0, "fallbacks": 0, "latencies_ms": deque(maxlen=500)},
+            )
+            stats["requests"] += 1
+            started = time.perf_counter()
+
+            try:
+                text = await backend.transcribe(filename=filename, audio_bytes=audio_bytes)
+
+            except Exception as e:
+                stats["errors"] += 1
+
+                if position == len(backends) - 1:
+                    raise
+
+                stats["fallbacks"] += 1
+                logger.warning(f"TranscriptionHelper transcribe() backend: {backend.name}, e: {e}")
+                continue
+
+            stats["latencies_ms"].append((time.perf_counter() - started) * 1000)
+
+            return text
+
+    def stats():
+        def percentile(latencies: list, ratio: float):
+            if not latencies:
+                return None
+
+            return round(latencies[min(len(latencies) - 1, int(ratio * len(latencies)))])
+
+        summary = {"backend": TRANSCRIPTION_BACKEND, "ready": TranscriptionHelper.is_ready()}
+
+        for name, stats in backend_stats.items():
+            latencies = sorted(stats["latencies_ms"])
+            summary[name] = {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "fallbacks": stats["fallbacks"],
+                "p50_ms": percentile(latencies, 0.5),
+                "p95_ms": percentile(latencies, 0.95),
+            }
+
+        return summary
+
+    def close():
+        local_backend.close()
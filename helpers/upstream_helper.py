@@ -0,0 +1,404 @@
+import os
+import time
+import random
+import asyncio
+import contextvars
+from collections import deque
+from email.utils import parsedate_to_datetime
+from helpers.log_helper import LogHelper
+from helpers.metrics_helper import MetricsHelper
+
+logger = LogHelper.get_logger(__name__)
+
+# Time budget of one request for all of its upstream calls, queueing and retries included.
+UPSTREAM_DEADLINE_SECONDS = float(os.environ.get("UPSTREAM_DEADLINE_SECONDS", "60"))
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+deadline_var = contextvars.ContextVar("upstream_deadline", default=None)
+upstreams = {}  # Name -> Upstream, in creation order.
+queue_duration = MetricsHelper.histogram(
+    "upstream_queue_seconds", "Time upstream calls waited for the rate limiter and a free slot."
+)
+retries_total = MetricsHelper.counter("upstream_retries_total", "Retried upstream calls.")
+calls_total = MetricsHelper.counter("upstream_calls_total", "Upstream calls by outcome.")
+
+
+class UpstreamUnavailableError(Exception):
+    """The circuit breaker is open, the call was not even tried."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+class TokenBucket:
+    """At most `rate` calls per second on average, in bursts of up to `burst`. 0 disables it."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    async def take(self, timeout: float = None):
+        if self.rate <= 0:
+            return
+
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+
+                return
+
+            delay = (1 - self.tokens) / self.rate
+
+            if timeout is not None and delay > timeout:
+                raise DeadlineExceededError("TokenBucket take() deadline exceeded.")
+
+            await asyncio.sleep(delay)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted to what the upstream takes: one more slot after a full window
+    of successes, half of them after it pushed back with a 429 (additive increase,
+    multiplicative decrease).
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.waiting = 0
+        self.successes = 0
+        self.condition = None  # Created lazily so it binds to the running event loop.
+
+    def get_condition(self):
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+
+        return self.condition
+
+    async def acquire(self, timeout: float = None):
+        condition = self.get_condition()
+
+        async with condition:
+            self.waiting += 1
+
+            try:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self.in_flight < self.limit), timeout
+                )
+
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError("AdaptiveLimiter acquire() deadline exceeded.")
+
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+
+    async def release(self):
+        condition = self.get_condition()
+
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()  # The limit may have grown by more than one slot.
+
+    def on_success(self):
+        self.successes += 1
+
+        if self.successes >= self.limit:
+            self.successes = 0
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def on_overload(self):
+        self.successes = 0
+        self.limit = max(self.min_limit, self.limit // 2)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` transient failures in a row, then fails calls at once for
+    `cooldown` seconds. A single trial call is let through after that, closing it again.
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.trial_running = False
+
+    def get_retry_after(self):
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def before_call(self, name: str):
+        if self.state == "open":
+            if self.get_retry_after() > 0:
+                raise UpstreamUnavailableError(
+                    f"CircuitBreaker before_call() {name} is unavailable.", self.get_retry_after()
+                )
+
+            self.state = "half_open"
+
+        if self.state == "half_open":
+            if self.trial_running:
+                raise UpstreamUnavailableError(
+                    f"CircuitBreaker before_call() {name} is recovering.", 1.0
+                )
+
+            self.trial_running = True
+
+    def on_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.trial_running = False
+
+    def on_abandoned(self):
+        # The call was cancelled before an answer, e.g. the client went away: no verdict, let
+        # the next call be the trial.
+        self.trial_running = False
+
+    def on_failure(self):
+        self.failures += 1
+
+        if self.state == "half_open" or (self.threshold > 0 and self.failures >= self.threshold):
+            if self.state != "open":
+                self.opens += 1
+                logger.warning(f"CircuitBreaker on_failure() open, failures: {self.failures}")
+
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+        self.trial_running = False
+
+
+class Upstream:
+    """One upstream endpoint: its rate limit, concurrency limit, retries and circuit breaker."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        rate: float = 0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        breaker_failures: int = 5,
+        breaker_cooldown: float = 30.0,
+        timeout: float = 60.0,
+        transient_errors: tuple = (),
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst=max_concurrency)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_cooldown)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.transient_errors = transient_errors  # Exceptions without a status worth retrying.
+        self.queue_times_ms = deque(maxlen=500)
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    def get_retry_reason(self, e: Exception):
+        # None when retrying cannot help, e.g. a 400 or a cancelled request.
+        status_code = getattr(e, "status_code", None)
+
+        if status_code == 429:
+            return "rate_limited"
+        elif status_code in RETRYABLE_STATUS_CODES:
+            return "server_error"
+        elif status_code is None and isinstance(e, self.transient_errors):
+            return "connection"
+
+        return None
+
+    def get_retry_after(self, e: Exception):
+        # Seconds the upstream asked us to wait, from the Retry-After headers, or None.
+        response = getattr(e, "response", None)
+        headers = getattr(response, "headers", None) or {}
+
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+
+            value = headers.get("retry-after")
+
+            if not value:
+                return None
+
+            try:
+                return float(value)
+
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+
+        except (TypeError, ValueError):
+            return None
+
+    def get_delay(self, attempt: int, e: Exception):
+        retry_after = self.get_retry_after(e)
+
+        if retry_after is not None:
+            return retry_after
+
+        # Full jitter, so the retries of a burst do not come back all at once.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    async def acquire(self):
+        started = time.perf_counter()
+
+        await self.bucket.take(UpstreamHelper.get_remaining())
+        await self.limiter.acquire(UpstreamHelper.get_remaining())
+
+        waited = time.perf_counter() - started
+        queue_duration.observe(waited, upstream=self.name)
+        self.queue_times_ms.append(waited * 1000)
+
+    async def call(self, attempt: any, can_retry: any = None):
+        """
+        Returns await attempt(timeout). Transient failures are retried with backoff while the
+        request's deadline allows, unless can_retry() says otherwise, e.g. once a streamed
+        answer was partly handed out.
+        """
+        self.counters["calls"] += 1
+        attempts = 0
+
+        while True:
+            attempts += 1
+            remaining = UpstreamHelper.get_remaining()
+
+            if remaining is not None and remaining <= 0:
+                calls_total.inc(upstream=self.name, outcome="deadline")
+                raise DeadlineExceededError(f"Upstream call() {self.name} deadline exceeded.")
+
+            try:
+                self.breaker.before_call(self.name)
+
+            except UpstreamUnavailableError:
+                self.counters["rejected"] += 1
+                calls_total.inc(upstream=self.name, outcome="rejected")
+                raise
+
+            try:
+                await self.acquire()
+
+            except BaseException as e:
+                self.breaker.on_abandoned()
+
+                if isinstance(e, DeadlineExceededError):
+                    calls_total.inc(upstream=self.name, outcome="deadline")
+
+                raise
+
+            delay = None
+
+            try:
+                remaining = UpstreamHelper.get_remaining()
+                timeout = self.timeout if remaining is None else min(self.timeout, remaining)
+                result = await attempt(timeout)
+
+            except Exception as e:
+                reason = self.get_retry_reason(e)
+
+                if reason is None:
+                    self.breaker.on_success()  # The upstream answered, the request was at fault.
+                    calls_total.inc(upstream=self.name, outcome="error")
+                    raise
+
+                self.breaker.on_failure()
+
+                if reason == "rate_limited":
+                    self.limiter.on_overload()
+
+                delay = self.get_delay(attempts, e)
+                remaining = UpstreamHelper.get_remaining()
+
+                if (
+                    attempts > self.max_retries
+                    or (can_retry is not None and not can_retry())
+                    or (remaining is not None and delay >= remaining)
+                    or self.breaker.state == "open"
+                ):
+                    self.counters["failures"] += 1
+                    calls_total.inc(upstream=self.name, outcome="failed")
+                    logger.warning(
+                        f"Upstream call() {self.name} failed, attempts: {attempts}, e: {e}"
+                    )
+                    raise
+
+                self.counters["retries"] += 1
+                retries_total.inc(upstream=self.name, reason=reason)
+                logger.info(
+                    f"Upstream call() {self.name} retry in {delay:.2f}s, reason: {reason}, e: {e}"
+                )
+
+            except BaseException:
+                self.breaker.on_abandoned()  # Cancelled, CancelledError is no Exception.
+                raise
+
+            else:
+                self.breaker.on_success()
+                self.limiter.on_success()
+                calls_total.inc(upstream=self.name, outcome="ok")
+
+                return result
+
+            finally:
+                await self.limiter.release()
+
+            await asyncio.sleep(delay)  # The slot is free while waiting.
+
+    def stats(self):
+        latencies = sorted(self.queue_times_ms)
+
+        def percentile(ratio: float):
+            if not latencies:
+                return None
+
+            return round(latencies[min(len(latencies) - 1, int(ratio * len(latencies)))], 1)
+
+        return {
+            **self.counters,
+            "limit": self.limiter.limit,
+            "max_limit": self.limiter.max_limit,
+            "in_flight": self.limiter.in_flight,
+            "waiting": self.limiter.waiting,
+            "breaker": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+            "queue_p50_ms": percentile(0.5),
+            "queue_p95_ms": percentile(0.95),
+        }
+
+
+class UpstreamHelper:
+    def create(name: str, **kwargs):
+        upstreams[name] = Upstream(name, **kwargs)
+
+        return upstreams[name]
+
+    def set_deadline(seconds: float = UPSTREAM_DEADLINE_SECONDS):
+        # For the upstream calls of the current request, the tasks it starts included.
+        deadline_var.set(time.monotonic() + seconds if seconds > 0 else None)
+
+    def get_remaining():
+        # Seconds left before the current request's deadline, None without one.
+        deadline = deadline_var.get()
+
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def stats():
+        return {name: upstream.stats() for name, upstream in upstreams.items()}
@@ -1,17 +1,37 @@
-from fastapi import FastAPI, UploadFile, File
+from typing import Optional
+from fastapi import FastAPI, UploadFile, File, Header, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
 import json
+import time
+
+load_dotenv()  # Load environment variables from .env file, before the helpers read them.
+
 from helpers.extraction_helper import ExtractionHelper
 from helpers.open_ai_helper import OpenAIHelper
-from helpers.google_calendar_helper import GoogleCalendarHelper
-from helpers.playwright_helper import PlaywrightHelper
+from helpers.calendar_backend_helper import CalendarBackendHelper, ConflictError
+from helpers.google_calendar_helper import SignInRequiredError
 from helpers.file_helper import FileHelper
-
-
-load_dotenv()  # Load environment variables from .env file
+from helpers.agenda_cache_helper import AgendaCacheHelper
+from helpers.session_helper import SessionHelper
+from helpers.batch_helper import BatchHelper
+from helpers.agenda_prefetch_helper import AgendaPrefetchHelper
+from helpers.result_cache_helper import ResultCacheHelper
+from helpers.audio_helper import AudioHelper
+from helpers.transcription_helper import TranscriptionHelper
+from helpers.storage_helper import DEFAULT_ACCOUNT, StorageHelper, UnknownAccountError
+from helpers.job_queue_helper import JobQueueHelper, QueueFullError
+from helpers.stream_helper import StreamHelper
+from helpers.health_helper import HealthHelper
+from helpers.upstream_helper import DeadlineExceededError, UpstreamHelper, UpstreamUnavailableError
+from helpers.log_helper import LogHelper
+from helpers.metrics_helper import MetricsHelper
+
+
+logger = LogHelper.get_logger(__name__)
 
 app = FastAPI()
 
@@ -21,110 +41,478 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id"],  # Lets browsers read a newly issued session id.
 )
 
+request_duration = MetricsHelper.histogram(
+    "http_request_duration_seconds", "Duration of HTTP requests in seconds."
+)
+requests_total = MetricsHelper.counter("http_requests_total", "HTTP requests served.")
 
-browser_context = None
-pending_event_data = None  # Temporarily store the conflict agenda.
 
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    timings = MetricsHelper.begin_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
 
-@app.on_event("startup")
-async def startup():
-    global browser_context
+    path = MetricsHelper.get_route(request.scope)  # Set by the router once it matched.
+    request_duration.observe(elapsed, path=path)
+    requests_total.inc(path=path, status=response.status_code)
+    response.headers["Server-Timing"] = MetricsHelper.get_server_timing(
+        timings + [("total", elapsed)]
+    )
+    SessionHelper.set_session_id(request, response)  # When the request was given a new one.
 
-    browser_context = await PlaywrightHelper.init()
+    return response
 
+
+@app.on_event("startup")
+async def startup():
     try:
-        await GoogleCalendarHelper.init(context=browser_context)
+        HealthHelper.start()  # Warms the calendar up in the background, see /readyz.
+        AgendaPrefetchHelper.start()  # Keep upcoming agendas warm.
+        JobQueueHelper.start(handle_audio)  # Workers of /audio-recording/jobs.
+        TranscriptionHelper.start()  # Loads the local model in the background, if one is used.
 
     except Exception as e:
-        print(f"startup() e: {e}")
+        logger.exception(f"startup() e: {e}")
 
         return {"status": "error", "message": "Server start up failed."}
 
     return {
         "status": "initialized",
-        "message": "Google Calendar initialized.",
+        "message": "Server started, Google Calendar is warming up.",
     }
 
 
-@app.post("/audio-recording")
-async def receive_audio(audio_blob: UploadFile = File(...)):
-    global browser_context
+@app.on_event("shutdown")
+async def shutdown():
+    await HealthHelper.stop()
+    await AgendaPrefetchHelper.stop()
+    await JobQueueHelper.stop()
+    await CalendarBackendHelper.close()
+    await OpenAIHelper.close()
+    AudioHelper.close()
+    TranscriptionHelper.close()
+
+
+def get_stats():
+    return {
+        "agenda_cache": AgendaCacheHelper.stats(),
+        "extraction": ExtractionHelper.stats(),
+        "agenda_prefetch": AgendaPrefetchHelper.stats(),
+        "result_cache": ResultCacheHelper.stats(),
+        **CalendarBackendHelper.stats(),
+        "jobs": JobQueueHelper.stats(),
+        "audio": AudioHelper.stats(),
+        "transcription": TranscriptionHelper.stats(),
+        "health": HealthHelper.stats(),
+        "upstream": UpstreamHelper.stats(),
+    }
+
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness, the process answers. Whether it can serve requests is /readyz.
+    return {"status": "ok", **HealthHelper.get_state()}
+
+
+@app.get("/readyz")
+async def readyz():
+    state = HealthHelper.get_state()
+
+    return JSONResponse(
+        status_code=200 if state["ready"] else 503,
+        content={"status": "ready" if state["ready"] else "not_ready", **state},
+    )
+
+
+@app.get("/stats")
+async def stats():
+    return get_stats()
+
+
+def collect_stats():
+    # Exposes the numeric values of /stats as gauges, e.g. app_stat{key="agenda_cache.hits"}.
+    samples = []
+
+    def walk(prefix: str, value: any):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}.{key}" if prefix else str(key), child)
+        elif isinstance(value, (int, float)):  # Booleans included, as 0 or 1.
+            samples.append(
+                ("app_stat", "gauge", "Values reported by /stats.", {"key": prefix}, float(value))
+            )
+
+    walk("", get_stats())
+
+    return samples
+
 
-    print(
+MetricsHelper.register_collector(collect_stats)
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format.
+    return PlainTextResponse(
+        MetricsHelper.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.post("/audio-recording")
+async def receive_audio(
+    request: Request,
+    audio_blob: UploadFile = File(...),
+    x_session_id: Optional[str] = Header(default=None),
+    x_account_id: Optional[str] = Header(default=None),
+):
+    logger.info(
         f"receive_audio() audio_blob.filename: {audio_blob.filename}, audio_blob.size: {audio_blob.size}"
     )
 
-    temp_filename = FileHelper.save(audio_blob)
+    try:
+        filename, audio_bytes = await FileHelper.read(audio_blob)
+
+        return await handle_audio(
+            filename=filename,
+            audio_bytes=audio_bytes,
+            session_id=SessionHelper.get_session_id(request, x_session_id),
+            account_id=x_account_id or DEFAULT_ACCOUNT,
+        )
+
+    except (UpstreamUnavailableError, DeadlineExceededError) as e:
+        return get_upstream_error_response(e)
+
+    except (UnknownAccountError, SignInRequiredError) as e:
+        return get_account_error_response(e)
+
+    except Exception as e:
+        logger.warning(f"receive_audio() e: {e}")
+
+        return {"status": "error", "message": str(e)}
+
+
+def get_upstream_error_response(e: Exception):
+    # OpenAI is down or too slow: 503 with a hint of when to come back, or 504.
+    logger.warning(f"get_upstream_error_response() e: {e}")
+
+    if isinstance(e, UpstreamUnavailableError):
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "message": str(e)},
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
+
+    return JSONResponse(status_code=504, content={"status": "error", "message": str(e)})
+
+
+def get_account_error_response(e: Exception):
+    # 404 for an account nobody set up, 401 while the account waits for someone to sign in.
+    logger.warning(f"get_account_error_response() e: {e}")
+
+    return JSONResponse(
+        status_code=404 if isinstance(e, UnknownAccountError) else 401,
+        content={"status": "error", "message": str(e)},
+    )
+
 
+@app.post("/audio-recording/stream")
+async def stream_audio(
+    request: Request,
+    audio_blob: UploadFile = File(...),
+    x_session_id: Optional[str] = Header(default=None),
+    x_account_id: Optional[str] = Header(default=None),
+):
+    # Server-Sent Events: transcription, token..., event, conflict, saved, then result.
     try:
-        return await handle_audio(temp_filename)
+        StorageHelper.check_account(x_account_id or DEFAULT_ACCOUNT)
+        filename, audio_bytes = await FileHelper.read(audio_blob)
+
+    except UnknownAccountError as e:
+        return get_account_error_response(e)
 
     except Exception as e:
-        print(f"receive_audio() e: {e}")
+        logger.warning(f"stream_audio() e: {e}")
 
         return {"status": "error", "message": str(e)}
 
-    finally:
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)  # Clean up.
+    return StreamingResponse(
+        StreamHelper.run(
+            handle_audio,
+            filename=filename,
+            audio_bytes=audio_bytes,
+            session_id=SessionHelper.get_session_id(request, x_session_id),
+            account_id=x_account_id or DEFAULT_ACCOUNT,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # No proxy buffering.
+    )
 
 
-async def handle_audio(filename: str):
-    global pending_event_data
+@app.post("/audio-recording/jobs")
+async def submit_audio_job(
+    request: Request,
+    audio_blob: UploadFile = File(...),
+    x_session_id: Optional[str] = Header(default=None),
+    x_account_id: Optional[str] = Header(default=None),
+):
+    # Returns a job id right away, the recording is handled by a worker when one is free.
+    try:
+        StorageHelper.check_account(x_account_id or DEFAULT_ACCOUNT)
+        filename, audio_bytes = await FileHelper.read(audio_blob)
+        job_id = JobQueueHelper.submit(
+            filename=filename,
+            audio_bytes=audio_bytes,
+            session_id=SessionHelper.get_session_id(request, x_session_id),
+            account_id=x_account_id or DEFAULT_ACCOUNT,
+        )
+
+    except UnknownAccountError as e:
+        return get_account_error_response(e)
+
+    except QueueFullError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "message": str(e)},
+            headers={"Retry-After": "5"},
+        )
 
-    print(f"handle_audio() filename: {filename}")
+    except Exception as e:
+        logger.warning(f"submit_audio_job() e: {e}")
 
-    user_text = OpenAIHelper.audio_to_text(filename=filename)
+        return {"status": "error", "message": str(e)}
+
+    logger.info(f"submit_audio_job() job_id: {job_id}")
 
-    # demoResult = ExtractionHelper.parse_text_to_event(user_text=user_text) # Demo purpose ONLY.
-    # print(f"receive_audio() demoResult: ${json.dumps(demoResult)}"")
+    return JSONResponse(
+        status_code=202, content=JobQueueHelper.get(job_id)
+    )
 
-    result_json = OpenAIHelper.text_to_event(text=user_text)
-    print(f"receive_audio() result_json: {result_json}")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    # With ?wait=N the request is held until the job is done, for up to N seconds.
+    job = await JobQueueHelper.wait(job_id, timeout=wait)
+
+    if job is None:
+        return JSONResponse(
+            status_code=404, content={"status": "error", "message": "Job not found."}
+        )
+
+    return job
+
+
+async def handle_audio(
+    filename: str,
+    audio_bytes: bytes,
+    session_id: str,
+    account_id: str = DEFAULT_ACCOUNT,
+    on_progress: any = None,
+):
+    # on_progress(event, data) is told about each stage as it completes, see /audio-recording/stream.
+    logger.info(
+        f"handle_audio() filename: {filename}, size: {len(audio_bytes)}, session_id: {session_id}, account_id: {account_id}"
+    )
+    StorageHelper.check_account(account_id)  # Before any OpenAI call is spent on it.
+    session_id = f"{account_id}:{session_id}"  # Pending conflicts never cross accounts.
+    UpstreamHelper.set_deadline()  # One time budget for every OpenAI call of this recording.
+
+    streaming = on_progress is not None
+    on_progress = on_progress or (lambda event, data: None)
+
+    user_text = await ResultCacheHelper.audio_to_text(
+        filename=filename, audio_bytes=audio_bytes
+    )
+    on_progress("transcription", {"text": user_text})
+
+    with MetricsHelper.span("extraction_rules"):
+        event = ExtractionHelper.parse_text_to_event(user_text=user_text)  # Rule-based fast path.
+    logger.info(f"handle_audio() fast path confidence: {event.get('confidence')}")
+    fast_path = ExtractionHelper.is_confident(event)
+
+    if fast_path:
+        ExtractionHelper.record(fast_path=True)
+        result_json = ExtractionHelper.to_result_json(event)
+    else:
+        ExtractionHelper.record(fast_path=False)  # Ambiguous, let the model decide.
+        result_json = await ResultCacheHelper.text_to_event(
+            text=user_text,
+            on_token=(lambda delta: on_progress("token", {"text": delta})) if streaming else None,
+        )
+
+    logger.debug("handle_audio() result_json: %s", result_json)
 
     event_data = None
 
     try:
         event_data = json.loads(result_json)  # Parse JSON string to dict
-        print(f"receive_audio() event_data: {event_data}")
     except json.JSONDecodeError:
-        print("receive_audio() error: Failed to parse JSON from AI response")
+        logger.warning("handle_audio() error: Failed to parse JSON from AI response")
 
         return {"status": "error", "message": "Invalid JSON from AI"}
 
-    print(f"receive_audio() event_data: {event_data}")
+    logger.debug("handle_audio() event_data: %s", event_data)
+
+    session_store = SessionHelper.get_store()
+    pending_event_data = await session_store.get(session_id)  # Conflict agenda of this client.
 
     if "message" in event_data:
         return {"status": "error", "message": event_data["message"]}
-    elif "start_time" in event_data:
-        try:
-            await GoogleCalendarHelper.check_conflict(
-                context=browser_context,
-                event_data=event_data,
-                user_text=user_text,
-                result_json=result_json,
+
+    on_progress("event", {"data": event_data, "fast_path": fast_path})
+
+    async with CalendarBackendHelper.acquire(account_id) as context:
+        if "start_time" in event_data:
+            try:
+                await CalendarBackendHelper.check_conflict(
+                    context=context,
+                    event_data=event_data,
+                    user_text=user_text,
+                    result_json=result_json,
+                    account_id=account_id,
+                )
+
+            except ConflictError as e:
+                if pending_event_data is None:
+                    await session_store.set(session_id, event_data)
+
+                on_progress("conflict", {"conflict": True, "message": str(e)})
+
+                return {"status": "conflict", "message": str(e)}
+
+            on_progress("conflict", {"conflict": False})
+
+        if (
+            pending_event_data is not None
+            and "start_time" in event_data
+            and "end_time" in event_data
+        ):
+            logger.debug("handle_audio() pending_event_data: %s", pending_event_data)
+            event_data["title"] = pending_event_data.get("title")
+
+        save_latency_ms = await CalendarBackendHelper.append_event(
+            context=context, event_data=event_data, account_id=account_id
+        )
+
+    on_progress(
+        "saved",
+        {"title": event_data.get("title"), "save_latency_ms": round(save_latency_ms)},
+    )
+    await session_store.delete(session_id)
+
+    return {
+        "status": "success",
+        "transcription": user_text,
+        "data": result_json,
+        "save_latency_ms": round(save_latency_ms),
+    }
+
+
+@app.post("/audio-recording/batch")
+async def receive_audio_batch(
+    audio_blob: UploadFile = File(...),
+    x_account_id: Optional[str] = Header(default=None),
+):
+    logger.info(
+        f"receive_audio_batch() audio_blob.filename: {audio_blob.filename}, audio_blob.size: {audio_blob.size}"
+    )
+
+    try:
+        filename, audio_bytes = await FileHelper.read(audio_blob)
+
+        return await handle_audio_batch(
+            filename=filename,
+            audio_bytes=audio_bytes,
+            account_id=x_account_id or DEFAULT_ACCOUNT,
+        )
+
+    except (UpstreamUnavailableError, DeadlineExceededError) as e:
+        return get_upstream_error_response(e)
+
+    except (UnknownAccountError, SignInRequiredError) as e:
+        return get_account_error_response(e)
+
+    except Exception as e:
+        logger.warning(f"receive_audio_batch() e: {e}")
+
+        return {"status": "error", "message": str(e)}
+
+
+@app.post("/events/batch")
+async def create_events_batch(
+    payload: dict = Body(...), x_account_id: Optional[str] = Header(default=None)
+):
+    events = payload.get("events")
+
+    if not isinstance(events, list) or not events:
+        return {"status": "error", "message": "Expected a non-empty list of events."}
+
+    try:
+        account_id = x_account_id or DEFAULT_ACCOUNT
+
+        async with CalendarBackendHelper.acquire(account_id) as context:
+            results = await BatchHelper.process_events(
+                context=context, events=events, account_id=account_id
             )
 
-        except Exception as e:
-            if pending_event_data is None:
-                pending_event_data = event_data
+    except (UnknownAccountError, SignInRequiredError) as e:
+        return get_account_error_response(e)
 
-            return {"status": "conflict", "message": str(e)}
+    except Exception as e:
+        logger.warning(f"create_events_batch() e: {e}")
+
+        return {"status": "error", "message": str(e)}
+
+    return {"status": BatchHelper.get_status(results), "results": results}
 
-    if (
-        pending_event_data is not None
-        and "start_time" in event_data
-        and "end_time" in event_data
-    ):
-        print(f"receive_audio() pending_event_data: {pending_event_data}")
-        event_data["title"] = pending_event_data.get("title")
 
-    await GoogleCalendarHelper.append_event(
-        context=browser_context, event_data=event_data
+async def handle_audio_batch(
+    filename: str, audio_bytes: bytes, account_id: str = DEFAULT_ACCOUNT
+):
+    # Several events from one utterance, e.g. "Monday 10-11 standup, Tuesday 2-3 review".
+    StorageHelper.check_account(account_id)
+    UpstreamHelper.set_deadline()
+    user_text = await ResultCacheHelper.audio_to_text(
+        filename=filename, audio_bytes=audio_bytes
     )
 
-    pending_event_data = None
+    with MetricsHelper.span("extraction_rules"):
+        events = ExtractionHelper.parse_text_to_events(user_text=user_text)
+
+    if ExtractionHelper.are_confident(events):
+        ExtractionHelper.record(fast_path=True)
+        events = [ExtractionHelper.to_event_data(event) for event in events]
+    else:
+        ExtractionHelper.record(fast_path=False)
+        result_json = await ResultCacheHelper.text_to_events(text=user_text)
+
+        try:
+            result_data = json.loads(result_json)
+
+        except json.JSONDecodeError:
+            logger.warning("handle_audio_batch() error: Failed to parse JSON from AI response")
 
-    return {"status": "success", "transcription": user_text, "data": result_json}
+            return {"status": "error", "message": "Invalid JSON from AI"}
+
+        if "message" in result_data:
+            return {"status": "error", "message": result_data["message"]}
+
+        events = result_data.get("events") or []
+
+    if not events:
+        return {"status": "error", "message": "No event found.", "transcription": user_text}
+
+    async with CalendarBackendHelper.acquire(account_id) as context:
+        results = await BatchHelper.process_events(
+            context=context, events=events, account_id=account_id
+        )
+
+    return {
+        "status": BatchHelper.get_status(results),
+        "transcription": user_text,
+        "results": results,
+    }
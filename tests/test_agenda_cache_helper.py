@@ -0,0 +1,32 @@
+from datetime import date, datetime
+
+from helpers.agenda_cache_helper import AgendaCacheHelper
+from helpers.interval_index_helper import AgendaEntry, IntervalIndex
+
+DAY = date(2026, 10, 19)
+
+
+def test_saved_event_is_written_to_the_cached_agenda():
+    AgendaCacheHelper.put(DAY, {"index": IntervalIndex([])}, account_id="test")
+
+    event_data = {
+        "title": "Standup",
+        "start_time": "2026-10-19T10:00:00",
+        "end_time": "2026-10-19T10:30:00",
+    }
+
+    AgendaCacheHelper.record_event(event_data, account_id="test")
+    index = AgendaCacheHelper.get(DAY, account_id="test")["index"]
+
+    assert index.entries == [
+        AgendaEntry(datetime(2026, 10, 19, 10), datetime(2026, 10, 19, 10, 30), "Standup")
+    ]
+
+
+def test_events_without_usable_times_leave_the_cache_alone():
+    AgendaCacheHelper.put(DAY, {"index": IntervalIndex([])}, account_id="test")
+
+    AgendaCacheHelper.record_event({"title": "Standup"}, account_id="test")
+    AgendaCacheHelper.record_event({"title": "Standup", "start_time": "tomorrow"}, account_id="test")
+
+    assert len(AgendaCacheHelper.get(DAY, account_id="test")["index"]) == 0
@@ -0,0 +1,84 @@
+from datetime import date, datetime
+
+from helpers.agenda_parser_helper import AgendaParserHelper
+from helpers.interval_index_helper import AgendaEntry, IntervalIndex
+
+DAY = date(2026, 10, 19)
+
+AGENDA = """
+Monday, October 19
+10am – 11am
+Standup
+2 – 3:30pm, Design review
+11pm – 1am
+Release
+Tuesday, October 20
+9am – 10am
+Planning
+"""
+
+
+def at(hour: int, minute: int = 0, day: int = 19):
+    return datetime(2026, 10, day, hour, minute)
+
+
+def test_parses_the_entries_of_the_day():
+    index = AgendaParserHelper.parse(AGENDA, DAY)
+
+    assert [(entry.start, entry.end, entry.title) for entry in index.entries] == [
+        (at(10), at(11), "Standup"),
+        (at(14), at(15, 30), "Design review"),
+        (at(23), at(1, day=20), "Release"),
+    ]
+
+
+def test_unreadable_agendas_go_to_the_model():
+    assert AgendaParserHelper.parse("10am – 11am\nStandup", DAY) is None  # No day header.
+    assert AgendaParserHelper.parse("Monday, October 19\nat 10:30 Standup", DAY) is None
+    assert AgendaParserHelper.parse(None, DAY) is None
+
+
+def test_empty_day_has_no_entries():
+    index = AgendaParserHelper.parse("Monday, October 19\nNo events", DAY)
+
+    assert index is not None and len(index) == 0
+
+
+def test_interval_index_finds_overlaps():
+    index = IntervalIndex(
+        [
+            AgendaEntry(at(9), at(17), "Offsite"),
+            AgendaEntry(at(10), at(11), "Standup"),
+            AgendaEntry(at(18), at(19), "Dinner"),
+        ]
+    )
+
+    assert index.find_overlap(at(16), at(16, 30)).title == "Offsite"  # Inside a long entry.
+    assert index.find_overlap(at(17), at(18)) is None  # Touching ends do not overlap.
+    assert index.find_overlap(at(8), at(9)) is None
+    assert index.find_overlap(at(18, 30), at(20)).title == "Dinner"
+
+    index.add(AgendaEntry(at(17, 30), at(18), "Call"))
+
+    assert index.find_overlap(at(17), at(18)).title == "Call"
+
+
+def test_prompt_window_keeps_nearby_rows():
+    rows = [
+        {"heading": "Monday, October 19"},
+        {"text": "8am – 9am Gym"},
+        {"text": "2pm – 3pm Review"},
+        {"text": "Heads down"},
+        {"heading": "Tuesday, October 20"},
+        {"text": "2pm – 3pm Other day"},
+    ]
+
+    window = AgendaParserHelper.get_window(rows, DAY, at(15), at(16))
+
+    assert window == "Monday, October 19, 2026\n2pm – 3pm Review\nHeads down"
+
+
+def test_number_ranges_in_titles_go_to_the_model():
+    # Read as 01:00 to 01:00, the title used to block the whole day.
+    assert AgendaParserHelper.parse("Monday, October 19\n10am – 11am\n1-1 with Bob", DAY) is None
+    assert AgendaParserHelper.parse("Monday, October 19\n10:00 – 10:00\nStandup", DAY) is None
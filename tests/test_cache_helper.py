@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from helpers.cache_helper import TTLCache
+
+
+def test_get_or_load_shares_one_load():
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+
+        return "text"
+
+    async def main():
+        values = await asyncio.gather(*(cache.get_or_load("audio", loader) for _ in range(5)))
+
+        return values, await cache.get_or_load("audio", loader)
+
+    values, cached = asyncio.run(main())
+
+    assert values == ["text"] * 5
+    assert cached == "text"
+    assert len(loads) == 1
+    assert cache.joins == 4
+    assert cache.hits == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_load():
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+
+    async def loader():
+        await asyncio.sleep(0.02)
+
+        return "text"
+
+    async def main():
+        first = asyncio.ensure_future(cache.get_or_load("audio", loader))
+        second = asyncio.ensure_future(cache.get_or_load("audio", loader))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        return await second
+
+    assert asyncio.run(main()) == "text"
+    assert cache.peek("audio") == "text"
+
+
+def test_failed_load_is_not_cached():
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+
+    async def loader():
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_or_load("audio", loader))
+
+    assert cache.peek("audio") is None
+    assert cache.inflight == {}
+
+
+def test_invalidation_drops_the_load_in_flight():
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+
+    async def loader():
+        await asyncio.sleep(0.01)
+
+        return "stale"
+
+    async def main():
+        task = asyncio.ensure_future(cache.get_or_load("agenda", loader))
+        await asyncio.sleep(0)
+        cache.invalidate("agenda")
+
+        return await task
+
+    assert asyncio.run(main()) == "stale"  # The caller still gets it, the cache does not.
+    assert cache.peek("agenda") is None
+
+
+def test_least_recently_used_goes_first():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert (cache.peek("a"), cache.peek("b"), cache.peek("c")) == (1, None, 3)
+    assert cache.evictions == 1
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import pytest
+
+from helpers.extraction_helper import ExtractionHelper
+
+NOW = datetime(2026, 10, 18, 9, 0)  # A Sunday.
+
+
+def parse(text: str):
+    return ExtractionHelper.parse_text_to_event(text, now=NOW)
+
+
+@pytest.mark.parametrize(
+    "text, start_time, end_time, title",
+    [
+        ("明天下午2点到4点 开会", "2026-10-19T14:00:00", "2026-10-19T16:00:00", "开会"),
+        ("明天上午11点到下午1点 聚餐", "2026-10-19T11:00:00", "2026-10-19T13:00:00", "聚餐"),
+        ("明天上午10点到下午3点 培训", "2026-10-19T10:00:00", "2026-10-19T15:00:00", "培训"),
+        ("周一上午10点到11点站会", "2026-10-19T10:00:00", "2026-10-19T11:00:00", "站会"),
+        ("明天下午3点开会一个半小时", "2026-10-19T15:00:00", "2026-10-19T16:30:00", "开会"),
+        ("Tomorrow 2-3pm dentist", "2026-10-19T14:00:00", "2026-10-19T15:00:00", "dentist"),
+    ],
+)
+def test_confident_ranges(text, start_time, end_time, title):
+    event = parse(text)
+
+    assert (event["start_time"], event["end_time"], event["title"]) == (start_time, end_time, title)
+    assert ExtractionHelper.is_confident(event)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "明天下午两点开会到四点",  # The end is after the title.
+        "明天十点开会，开到十二点",  # The end is in another clause.
+    ],
+)
+def test_unused_time_goes_to_the_model(text):
+    assert not ExtractionHelper.is_confident(parse(text))
+
+
+def test_night_twelve_is_midnight():
+    event = parse("明天晚上12点 发布")
+
+    assert event["start_time"] == "2026-10-20T00:00:00"
+    assert event["end_time"] == "2026-10-20T01:00:00"
+
+
+def test_range_ending_at_midnight():
+    event = parse("明天晚上11点到12点 值班")
+
+    assert (event["start_time"], event["end_time"]) == ("2026-10-19T23:00:00", "2026-10-20T00:00:00")
+    assert ExtractionHelper.is_confident(event)
+
+
+def test_noon_twelve_stays_noon():
+    assert parse("明天中午12点 午饭")["start_time"] == "2026-10-19T12:00:00"
+
+
+def test_no_time_is_not_confident():
+    assert parse("明天开会")["confidence"] == 0.0
+
+
+@pytest.mark.parametrize(
+    "text, start_time, end_time, title",
+    [
+        ("standup at 10:30 tomorrow", "2026-10-19T10:30:00", "2026-10-19T11:30:00", "standup"),
+        ("Tomorrow at 9:45am review", "2026-10-19T09:45:00", "2026-10-19T10:45:00", "review"),
+        ("tomorrow 2:15-3:45pm sync", "2026-10-19T14:15:00", "2026-10-19T15:45:00", "sync"),
+        ("lunch at 12 tomorrow", "2026-10-19T12:00:00", "2026-10-19T13:00:00", "lunch"),
+    ],
+)
+def test_english_times_keep_their_minutes(text, start_time, end_time, title):
+    event = parse(text)
+
+    assert (event["start_time"], event["end_time"], event["title"]) == (start_time, end_time, title)
+
+
+def test_unreadable_english_time_is_not_confident():
+    assert not ExtractionHelper.is_confident(parse("call at 3.30 tomorrow"))
+
+
+def test_spaced_number_is_not_the_minutes():
+    event = parse("明天下午3点 2个人开会")
+
+    assert event["start_time"] == "2026-10-19T15:00:00"
+
+
+@pytest.mark.parametrize(
+    "text, start_time, confident",
+    [
+        ("明天下午三点十五分开会", "2026-10-19T15:15:00", True),
+        ("明天下午3点半开会", "2026-10-19T15:30:00", True),
+        ("明天下午3点2个人开会", "2026-10-19T15:02:00", False),  # Minutes without 分.
+    ],
+)
+def test_chinese_minutes(text, start_time, confident):
+    event = parse(text)
+
+    assert event["start_time"] == start_time
+    assert ExtractionHelper.is_confident(event) == confident
+
+
+@pytest.mark.parametrize(
+    "text, end_time",
+    [
+        ("明天开会从十点到十二点", "2026-10-19T12:00:00"),
+        ("明天下午三点开会，大概两个小时", "2026-10-19T17:00:00"),
+        ("明天下午三点开会，开两个半小时", "2026-10-19T17:30:00"),
+    ],
+)
+def test_connectors_stay_out_of_the_title(text, end_time):
+    event = parse(text)
+
+    assert (event["title"], event["end_time"]) == ("开会", end_time)
+    assert ExtractionHelper.is_confident(event)
+
+
+def test_range_and_other_duration_go_to_the_model():
+    event = parse("明天十点到十二点开会，开一个半小时")
+
+    assert event["title"] == "开会"
+    assert not ExtractionHelper.is_confident(event)
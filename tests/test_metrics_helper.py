@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from helpers.metrics_helper import MetricsHelper
+
+
+def test_route_label_is_the_route_template():
+    scope = {"path": "/audio-recording", "route": SimpleNamespace(path="/audio-recording")}
+
+    assert MetricsHelper.get_route(scope) == "/audio-recording"
+
+
+def test_job_polls_share_the_route_label():
+    route = SimpleNamespace(path="/jobs/{job_id}")
+    labels = {
+        MetricsHelper.get_route({"path": f"/jobs/{job_id}", "route": route})
+        for job_id in ("3f2a", "9c1d", "unknown")
+    }
+
+    assert labels == {"/jobs/{job_id}"}
+
+
+def test_unmatched_paths_share_one_label():
+    assert MetricsHelper.get_route({"path": "/wp-login.php"}) == "unmatched"
+    assert MetricsHelper.get_route({"path": "/x", "route": None}) == "unmatched"
+
+
+def test_histogram_renders_labelled_series():
+    histogram = MetricsHelper.histogram("test_route_seconds", "Test.", buckets=(0.1, 1))
+    histogram.observe(0.05, path="/readyz")
+    histogram.observe(2, path="/readyz")
+
+    lines = histogram.render()
+
+    assert 'test_route_seconds_bucket{path="/readyz",le="0.1"} 1' in lines
+    assert 'test_route_seconds_bucket{path="/readyz",le="+Inf"} 2' in lines
+    assert 'test_route_seconds_count{path="/readyz"} 2' in lines
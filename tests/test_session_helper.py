@@ -0,0 +1,116 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from helpers.session_helper import (
+    MemorySessionStore,
+    SessionHelper,
+    SessionStore,
+    SqliteSessionStore,
+)
+
+
+class PartialStore(SessionStore):
+    async def get(self, session_id: str):
+        return None
+
+
+def test_stores_must_implement_every_method():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore(ttl_seconds=60, max_entries=2)
+
+    return SqliteSessionStore(
+        path=str(tmp_path / "sessions.sqlite3"), ttl_seconds=60, max_entries=2
+    )
+
+
+def test_set_get_delete(store):
+    async def main():
+        assert await store.get("a") is None
+
+        await store.set("a", {"title": "开会"})
+        assert await store.get("a") == {"title": "开会"}
+
+        await store.delete("a")
+        assert await store.get("a") is None
+
+    asyncio.run(main())
+
+
+def test_oldest_sessions_go_past_max_entries(store):
+    async def main():
+        for session_id in ("a", "b", "c"):
+            await store.set(session_id, {"id": session_id})
+            await asyncio.sleep(0.01)  # Distinct expiry times.
+
+        return [await store.get(session_id) for session_id in ("a", "b", "c")]
+
+    assert asyncio.run(main()) == [None, {"id": "b"}, {"id": "c"}]
+
+
+def test_expired_sessions_are_gone(tmp_path):
+    store = SqliteSessionStore(
+        path=str(tmp_path / "sessions.sqlite3"), ttl_seconds=0, max_entries=10
+    )
+
+    async def main():
+        await store.set("a", {"id": "a"})
+
+        return await store.get("a")
+
+    assert asyncio.run(main()) is None
+
+
+class FakeResponse:
+    def __init__(self):
+        self.headers = {}
+        self.cookies = {}
+
+    def set_cookie(self, key: str, value: str, **kwargs):
+        self.cookies[key] = value
+
+
+def make_request(cookies: dict = None):
+    # Two clients behind the same proxy share the address.
+    return SimpleNamespace(
+        client=SimpleNamespace(host="10.0.0.1"), cookies=cookies or {}, state=SimpleNamespace()
+    )
+
+
+def test_clients_without_an_id_get_their_own():
+    first, second = make_request(), make_request()
+
+    assert SessionHelper.get_session_id(first) != SessionHelper.get_session_id(second)
+
+
+def test_new_session_id_goes_back_to_the_client():
+    request = make_request()
+    session_id = SessionHelper.get_session_id(request)
+    response = FakeResponse()
+
+    SessionHelper.set_session_id(request, response)
+
+    assert response.headers["X-Session-Id"] == session_id
+    assert SessionHelper.get_session_id(make_request(response.cookies)) == session_id
+
+
+def test_header_wins_and_is_not_reissued():
+    request = make_request({"session_id": "cookie"})
+    response = FakeResponse()
+
+    assert SessionHelper.get_session_id(request, "header") == "header"
+    assert SessionHelper.get_session_id(request) == "cookie"
+
+    SessionHelper.set_session_id(request, response)
+
+    assert response.headers == {}
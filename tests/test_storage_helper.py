@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from helpers import storage_helper
+from helpers.storage_helper import DEFAULT_ACCOUNT, StorageHelper, UnknownAccountError
+
+
+@pytest.fixture
+def states_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_helper, "ACCOUNT_STATES_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_helper, "ACCOUNT_ALLOW_LIST", {"invited"})
+
+    return tmp_path
+
+
+def test_default_account_keeps_its_path():
+    assert StorageHelper.get_path("state") == "storage_state.json"
+    assert StorageHelper.get_path("state", DEFAULT_ACCOUNT) == "storage_state.json"
+
+
+def test_ids_sanitized_alike_get_their_own_files(states_dir):
+    paths = {StorageHelper.get_path("state", account_id) for account_id in ("a/b", "a_b", "a:b")}
+
+    assert len(paths) == 3
+    assert all(os.path.basename(path).startswith("a_b-") for path in paths)
+    assert StorageHelper.get_path("credentials", "a/b") != StorageHelper.get_path(
+        "credentials", "a_b"
+    )
+
+
+def test_only_known_accounts_are_accepted(states_dir):
+    StorageHelper.check_account(DEFAULT_ACCOUNT)
+    StorageHelper.check_account("invited")
+
+    with pytest.raises(UnknownAccountError):
+        StorageHelper.check_account("stranger")
+
+    with open(StorageHelper.get_path("state", "returning"), "w") as file:
+        file.write("{}")
+
+    StorageHelper.check_account("returning")
+
+    with pytest.raises(UnknownAccountError):
+        StorageHelper.check_account("returning/")  # Same sanitized name, other account.
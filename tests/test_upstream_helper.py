@@ -0,0 +1,222 @@
+import asyncio
+
+import pytest
+
+from helpers.upstream_helper import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    DeadlineExceededError,
+    TokenBucket,
+    Upstream,
+    UpstreamUnavailableError,
+)
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def create_upstream(**kwargs):
+    options = {
+        "max_concurrency": 2,
+        "max_retries": 0,
+        "backoff_base": 0,
+        "breaker_failures": 2,
+        "breaker_cooldown": 60,
+        **kwargs,
+    }
+
+    return Upstream("test", **options)
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.threshold):
+        breaker.before_call("test")
+        breaker.on_failure()
+
+
+def test_breaker_opens_after_failures_in_a_row():
+    breaker = CircuitBreaker(failures=3, cooldown=60)
+
+    for _ in range(2):
+        breaker.before_call("test")
+        breaker.on_failure()
+
+    assert breaker.state == "closed"
+
+    breaker.before_call("test")
+    breaker.on_success()  # A success starts the count over.
+    open_breaker(breaker)
+
+    assert breaker.state == "open"
+    assert breaker.opens == 1
+
+    with pytest.raises(UpstreamUnavailableError) as error:
+        breaker.before_call("test")
+
+    assert 0 < error.value.retry_after <= 60
+
+
+def test_breaker_lets_a_single_trial_through_after_the_cooldown():
+    breaker = CircuitBreaker(failures=1, cooldown=0)
+    open_breaker(breaker)
+
+    breaker.before_call("test")
+
+    assert breaker.state == "half_open"
+    assert breaker.trial_running
+
+    with pytest.raises(UpstreamUnavailableError):
+        breaker.before_call("test")
+
+    breaker.on_success()
+
+    assert breaker.state == "closed"
+    assert not breaker.trial_running
+
+
+def test_breaker_reopens_when_the_trial_fails():
+    breaker = CircuitBreaker(failures=5, cooldown=0)
+
+    for _ in range(5):
+        breaker.before_call("test")
+        breaker.on_failure()
+
+    breaker.before_call("test")
+    breaker.on_failure()
+
+    assert breaker.state == "open"
+    assert breaker.opens == 2
+    assert not breaker.trial_running
+
+
+def test_call_retries_transient_failures():
+    upstream = create_upstream(max_retries=2, breaker_failures=5)
+    calls = []
+
+    async def attempt(timeout: float):
+        calls.append(timeout)
+
+        if len(calls) < 3:
+            raise FakeStatusError(503)
+
+        return "ok"
+
+    assert asyncio.run(upstream.call(attempt)) == "ok"
+    assert len(calls) == 3
+    assert upstream.counters["retries"] == 2
+    assert upstream.breaker.state == "closed"
+
+
+def test_call_does_not_retry_client_errors():
+    upstream = create_upstream(max_retries=2)
+    calls = []
+
+    async def attempt(timeout: float):
+        calls.append(timeout)
+        raise FakeStatusError(400)
+
+    with pytest.raises(FakeStatusError):
+        asyncio.run(upstream.call(attempt))
+
+    assert len(calls) == 1
+    assert upstream.breaker.failures == 0
+
+
+def test_call_is_rejected_while_the_breaker_is_open():
+    upstream = create_upstream()
+
+    async def attempt(timeout: float):
+        raise FakeStatusError(500)
+
+    for _ in range(2):
+        with pytest.raises(FakeStatusError):
+            asyncio.run(upstream.call(attempt))
+
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(upstream.call(attempt))
+
+    assert upstream.counters["rejected"] == 1
+
+
+def test_cancelled_trial_lets_the_next_call_try():
+    upstream = create_upstream(breaker_cooldown=0)
+    open_breaker(upstream.breaker)
+
+    async def main():
+        started = asyncio.Event()
+
+        async def hang(timeout: float):
+            started.set()
+            await asyncio.sleep(60)
+
+        async def answer(timeout: float):
+            return "ok"
+
+        trial = asyncio.ensure_future(upstream.call(hang))
+        await started.wait()
+
+        assert upstream.breaker.trial_running
+
+        trial.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        assert not upstream.breaker.trial_running
+        assert upstream.limiter.in_flight == 0
+
+        return await upstream.call(answer)
+
+    assert asyncio.run(main()) == "ok"
+    assert upstream.breaker.state == "closed"
+
+
+def test_adaptive_limiter_halves_on_overload_and_grows_back():
+    limiter = AdaptiveLimiter(max_limit=8)
+    limiter.on_overload()
+
+    assert limiter.limit == 4
+
+    for _ in range(4):
+        limiter.on_success()
+
+    assert limiter.limit == 5
+
+    for _ in range(10):
+        limiter.on_overload()
+
+    assert limiter.limit == limiter.min_limit
+
+
+def test_adaptive_limiter_times_out_when_full():
+    limiter = AdaptiveLimiter(max_limit=1)
+
+    async def main():
+        await limiter.acquire()
+
+        with pytest.raises(DeadlineExceededError):
+            await limiter.acquire(timeout=0.01)
+
+        await limiter.release()
+        await limiter.acquire(timeout=0.01)
+
+    asyncio.run(main())
+
+    assert limiter.in_flight == 1
+    assert limiter.waiting == 0
+
+
+def test_token_bucket_gives_up_past_the_timeout():
+    bucket = TokenBucket(rate=1, burst=2)
+
+    async def main():
+        await bucket.take()
+        await bucket.take()
+
+        with pytest.raises(DeadlineExceededError):
+            await bucket.take(timeout=0.1)
+
+    asyncio.run(main())